@@ -0,0 +1,533 @@
+"""
+This module contains the code used to persist information learned during a
+run so that it can be used by the next run; for example which credential was
+accepted by each host, or which hosts were backed up by an interrupted run.
+The cache files are stored in a state directory within the configs
+directory; the state directory includes a .gitignore file so that the cache
+files are not added to the vcs repository.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Optional, Dict, Tuple, Iterable, Iterator, Set, List
+from array import array
+from pathlib import Path
+import json
+import os
+import pickle
+import time
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from .config_model import AppConfig
+from .connectors import BasicSSHConnector
+from .filetypes import CommentedCsvReader
+from .storage import get_cache_dir
+from .logger import get_logger
+
+__all__ = [
+    "get_cache_dir",
+    "CredentialHints",
+    "setup_credential_hints",
+    "ReachabilityCache",
+    "setup_reachability",
+    "ChangeChecks",
+    "setup_change_checks",
+    "RunJournal",
+    "InventoryCache",
+]
+
+
+# -----------------------------------------------------------------------------
+#
+#                               CODE BEGINS
+#
+# -----------------------------------------------------------------------------
+
+
+def load_json(filepath: Path) -> Dict:
+    """ Returns the content of the JSON cache file, or empty if not usable """
+    try:
+        content = json.loads(filepath.read_text())
+
+    except FileNotFoundError:
+        return dict()
+
+    except (OSError, ValueError) as exc:
+        get_logger().warning(f"CACHE: ignoring {filepath.name}: {exc}")
+        return dict()
+
+    return content if isinstance(content, dict) else dict()
+
+
+def save_json(filepath: Path, content: Dict):
+    """ Saves the content to the JSON cache file, replacing it atomically """
+    tmp_filepath = filepath.with_name(f".{filepath.name}.tmp")
+    tmp_filepath.write_text(json.dumps(content))
+    os.replace(tmp_filepath, filepath)
+
+
+class CredentialHints(object):
+    """
+    The CredentialHints cache stores, for each host, the index and username
+    of the credential that was last accepted by the host so that it is tried
+    first by the next run.  The credential secrets are never stored.
+
+    A hint is used only when the credential at the index has the same
+    username; so that a change to the configured credentials invalidates the
+    hint rather than using a different credential.
+    """
+
+    FILENAME = "credentials.json"
+
+    def __init__(self, filepath: Path):
+        self.filepath = filepath
+        self.hints: Dict[str, Tuple[int, str]] = dict()
+        self.hits = 0
+        self.misses = 0
+        self.no_hint = 0
+
+    @classmethod
+    def load(cls, configs_dir) -> "CredentialHints":
+        """ Returns the credential hints loaded from the configs directory """
+        cred_hints = cls(get_cache_dir(configs_dir) / cls.FILENAME)
+
+        for host, hint in load_json(cred_hints.filepath).items():
+            try:
+                cred_hints.hints[host] = (int(hint["index"]), str(hint["username"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        return cred_hints
+
+    def save(self):
+        content = {
+            host: {"index": index, "username": username}
+            for host, (index, username) in self.hints.items()
+        }
+        save_json(self.filepath, content)
+
+    def get(self, host: str, usernames) -> Optional[int]:
+        """
+        Returns the index of the credential to try first for the host, or
+        None if there is no usable hint.
+
+        Parameters
+        ----------
+        host:
+            The host name
+
+        usernames:
+            The list of the credential usernames, in the configured order.
+        """
+        if not (hint := self.hints.get(host)):
+            self.no_hint += 1
+            return None
+
+        index, username = hint
+        if index < len(usernames) and usernames[index] == username:
+            return index
+
+        self.hints.pop(host)
+        self.no_hint += 1
+        return None
+
+    def record(self, host: str, hint: Optional[int], index: Optional[int], username):
+        """
+        Records the outcome of the login to the host.
+
+        Parameters
+        ----------
+        host:
+            The host name
+
+        hint:
+            The credential index returned by `get`, or None.
+
+        index:
+            The credential index accepted by the host, or None if all of the
+            credentials were denied; in which case the host hint is removed.
+
+        username:
+            The username of the accepted credential.
+        """
+        if hint is not None:
+            if index == hint:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if index is None:
+            self.hints.pop(host, None)
+        else:
+            self.hints[host] = (index, username)
+
+    def report(self) -> str:
+        """ returns the hint usage counts and hit rate for reporting """
+        hinted_n = self.hits + self.misses
+        rate = (self.hits / hinted_n * 100) if hinted_n else 0
+        return (
+            f"{self.hits}/{hinted_n} hits ({rate:.0f}%), "
+            f"{self.no_hint} without a hint"
+        )
+
+
+def setup_credential_hints(app_cfg: AppConfig) -> Optional[CredentialHints]:
+    """
+    Setup the connector use of the credential hints cache, if enabled by the
+    app config.  The Caller must `save` the returned cache when the run
+    completes.
+    """
+    if not app_cfg.cache.credentials:
+        BasicSSHConnector.set_credential_hints(None)
+        return None
+
+    cred_hints = CredentialHints.load(app_cfg.defaults.configs_dir)
+    BasicSSHConnector.set_credential_hints(cred_hints)
+    return cred_hints
+
+
+class ReachabilityCache(object):
+    """
+    The ReachabilityCache stores, for each host, the number of consecutive
+    runs in which the host was not reachable and the time of the last
+    attempt.  A host that was not reachable is skipped until its back-off
+    period expires; the back-off period starts at the TTL and doubles for
+    each consecutive failure, up to the max back-off.
+    """
+
+    FILENAME = "reachability.json"
+
+    def __init__(self, filepath: Path, ttl: int, max_backoff: int):
+        self.filepath = filepath
+        self.ttl = ttl
+        self.max_backoff = max_backoff
+        self.hosts: Dict[str, Dict] = dict()
+        self.skipped = 0
+
+    @classmethod
+    def load(cls, configs_dir, ttl: int, max_backoff: int) -> "ReachabilityCache":
+        """ Returns the reachability cache loaded from the configs directory """
+        reach = cls(get_cache_dir(configs_dir) / cls.FILENAME, ttl, max_backoff)
+        reach.hosts = load_json(reach.filepath)
+        return reach
+
+    def save(self):
+        save_json(self.filepath, self.hosts)
+
+    def retry_after(self, host: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        Returns the time after which the host should next be attempted, if the
+        host should be skipped now; otherwise returns None.
+        """
+        try:
+            failures = int(self.hosts[host]["failures"])
+            checked = float(self.hosts[host]["checked"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        if not failures:
+            return None
+
+        backoff = min(self.ttl * 2 ** (failures - 1), self.max_backoff)
+        retry_at = checked + backoff
+
+        return retry_at if (now or time.time()) < retry_at else None
+
+    def record(self, host: str, reachable: bool, now: Optional[float] = None):
+        """ Records the outcome of the attempt to reach the host """
+        if reachable:
+            self.hosts.pop(host, None)
+            return
+
+        failures = self.hosts.get(host, {}).get("failures", 0)
+        self.hosts[host] = {"failures": failures + 1, "checked": now or time.time()}
+
+    def filter(self, inventory_recs: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Yields the inventory records for the hosts that should be attempted,
+        skipping those within their back-off period.
+        """
+        log = get_logger()
+        now = time.time()
+
+        for rec in inventory_recs:
+            if retry_at := self.retry_after(rec["host"], now=now):
+                self.skipped += 1
+                retry_ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(retry_at))
+                log.info(f"SKIP: {rec['host']} unreachable, retry after {retry_ts}")
+                continue
+
+            yield rec
+
+
+def setup_reachability(app_cfg: AppConfig) -> Optional[ReachabilityCache]:
+    """
+    Returns the reachability cache if enabled by the app config, that is when
+    the `reachability_ttl` is defined; otherwise None.  The Caller must `save`
+    the returned cache when the run completes.
+    """
+    if not (ttl := app_cfg.cache.reachability_ttl):
+        return None
+
+    return ReachabilityCache.load(
+        app_cfg.defaults.configs_dir,
+        ttl=ttl,
+        max_backoff=app_cfg.cache.reachability_max_backoff,
+    )
+
+
+class ChangeChecks(object):
+    """
+    The ChangeChecks cache stores, for each host, the digest of the output of
+    the os-spec `change_check` command when the configuration was last saved.
+    When the digest is unchanged, the configuration is not retrieved.
+    """
+
+    FILENAME = "change-checks.json"
+
+    def __init__(self, filepath: Path):
+        self.filepath = filepath
+        self.digests: Dict[str, str] = dict()
+        self.skipped = 0
+
+    @classmethod
+    def load(cls, configs_dir) -> "ChangeChecks":
+        """ Returns the change-check digests loaded from the configs directory """
+        change_checks = cls(get_cache_dir(configs_dir) / cls.FILENAME)
+        change_checks.digests = load_json(change_checks.filepath)
+        return change_checks
+
+    def save(self):
+        save_json(self.filepath, self.digests)
+
+    def unchanged(self, host: str, digest: str) -> bool:
+        return self.digests.get(host) == digest
+
+    def record(self, host: str, digest: str):
+        self.digests[host] = digest
+
+    def forget(self, host: str):
+        """ forget the host digest, so that its configuration is retrieved """
+        self.digests.pop(host, None)
+
+
+def setup_change_checks(app_cfg: AppConfig) -> Optional[ChangeChecks]:
+    """
+    Setup the connector use of the change-checks cache, if any of the os-specs
+    define the `change_check` command.  The Caller must `save` the returned
+    cache when the run completes.
+    """
+    os_specs = (app_cfg.os_name or {}).values()
+    if not any(os_spec.change_check for os_spec in os_specs):
+        BasicSSHConnector.set_change_checks(None)
+        return None
+
+    change_checks = ChangeChecks.load(app_cfg.defaults.configs_dir)
+    BasicSSHConnector.set_change_checks(change_checks)
+    return change_checks
+
+
+class RunJournal(object):
+    """
+    The RunJournal records each host as its backup completes, so that a run
+    that is interrupted can be resumed; backing up only those hosts that were
+    not already backed up successfully.  The journal is appended one line per
+    host, and each line flushed, so that the journal is complete up to the
+    point the run was interrupted.
+    """
+
+    FILENAME = "backup-journal.jsonl"
+
+    def __init__(self, filepath: Path):
+        self.filepath = filepath
+        self.completed: Set[str] = set()
+        self.skipped = 0
+        self._ofile = None
+
+    @classmethod
+    def start(cls, configs_dir, resume: bool = False) -> "RunJournal":
+        """
+        Returns the journal for the run.  When resuming, the hosts completed
+        successfully by the prior run are loaded and the journal is appended;
+        otherwise a new journal is started.
+        """
+        journal = cls(get_cache_dir(configs_dir) / cls.FILENAME)
+
+        if resume:
+            journal.completed = journal.load_completed()
+
+        journal._ofile = journal.filepath.open(mode="a" if resume else "w")
+
+        # start on a new line, following any partial last line.
+
+        if journal._ofile.tell():
+            journal._ofile.write("\n")
+
+        return journal
+
+    def load_completed(self) -> Set[str]:
+        """ Returns the hosts recorded as completed successfully """
+        completed = set()
+
+        try:
+            lines = self.filepath.read_text().splitlines()
+        except FileNotFoundError:
+            return completed
+
+        for line in lines:
+            # the last line may be partial if the run was interrupted while
+            # it was being written.
+
+            try:
+                entry = json.loads(line)
+                host, ok = entry["host"], entry["ok"]
+            except (ValueError, KeyError, TypeError):
+                continue
+
+            if ok:
+                completed.add(host)
+            else:
+                completed.discard(host)
+
+        return completed
+
+    def record(self, host: str, ok: bool):
+        """ Records the outcome of the host backup """
+        self._ofile.write(json.dumps({"host": host, "ok": ok}) + "\n")
+        self._ofile.flush()
+
+    def filter(self, inventory_recs: Iterable[Dict]) -> Iterator[Dict]:
+        """ Yields the inventory records for the hosts not yet completed """
+        for rec in inventory_recs:
+            if rec["host"] in self.completed:
+                self.skipped += 1
+                continue
+
+            yield rec
+
+    def close(self):
+        if self._ofile:
+            self._ofile.close()
+            self._ofile = None
+
+
+class InventoryCache(object):
+    """
+    The InventoryCache stores the inventory CSV file in a compiled form, so
+    that repeated commands do not re-parse the CSV file.  The cache is keyed
+    on the inventory file path, modification time, and size; a change to the
+    inventory file invalidates the cache.
+
+    The field values are stored by column, together with an index for each
+    field: the row numbers sorted by the lower-cased field value.  The index
+    is used to find the rows whose field value starts with a given text,
+    without scanning every row.
+    """
+
+    FILENAME = "inventory.pickle"
+    VERSION = 1
+
+    def __init__(self, fieldnames: List[str], columns: List[List[str]]):
+        self.fieldnames = fieldnames
+        self.columns = columns
+        self.indexes: Dict[str, array] = dict()
+
+        for fieldname, column in zip(fieldnames, columns):
+            values = [(value or "").lower() for value in column]
+            self.indexes[fieldname] = array(
+                "L", sorted(range(len(values)), key=values.__getitem__)
+            )
+
+    @staticmethod
+    def file_key(inventory_file: Path) -> Tuple:
+        st = inventory_file.stat()
+        return str(inventory_file.resolve()), st.st_mtime_ns, st.st_size
+
+    @classmethod
+    def build(cls, inventory_file: Path) -> "InventoryCache":
+        """ Returns the inventory cache built from the inventory CSV file """
+        with inventory_file.open() as ifile:
+            csv_reader = CommentedCsvReader(ifile)
+            fieldnames = csv_reader.fieldnames or []
+            rows = [[rec[fieldn] for fieldn in fieldnames] for rec in csv_reader]
+
+        return cls(fieldnames, [list(column) for column in zip(*rows)] or [])
+
+    @classmethod
+    def load(cls, configs_dir, inventory_file: Path) -> "InventoryCache":
+        """
+        Returns the inventory cache for the inventory file from the configs
+        directory when it is valid; otherwise builds and saves the inventory
+        cache.
+        """
+        filepath = get_cache_dir(configs_dir) / cls.FILENAME
+        key = (cls.VERSION, cls.file_key(inventory_file))
+
+        try:
+            with filepath.open("rb") as ifile:
+                cache_key, inv_cache = pickle.load(ifile)
+            if cache_key == key:
+                return inv_cache
+
+        except FileNotFoundError:
+            pass
+
+        except Exception as exc:
+            get_logger().warning(f"CACHE: ignoring {filepath.name}: {exc}")
+
+        inv_cache = cls.build(inventory_file)
+
+        tmp_filepath = filepath.with_name(f".{filepath.name}.tmp")
+        with tmp_filepath.open("wb") as ofile:
+            pickle.dump((key, inv_cache), ofile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filepath, filepath)
+
+        return inv_cache
+
+    def find_prefix(self, fieldname: str, prefix: str) -> List[int]:
+        """
+        Returns the row numbers, in inventory order, of the records whose field
+        value starts with the prefix, ignoring case.
+        """
+        column = self.columns[self.fieldnames.index(fieldname)]
+        order = self.indexes[fieldname]
+        prefix = prefix.lower()
+
+        def value_at(pos):
+            return (column[order[pos]] or "").lower()
+
+        # binary search for the first value not less than the prefix.
+
+        low, high = 0, len(order)
+        while low < high:
+            mid = (low + high) // 2
+            if value_at(mid) < prefix:
+                low = mid + 1
+            else:
+                high = mid
+
+        found = list()
+        for pos in range(low, len(order)):
+            if not value_at(pos).startswith(prefix):
+                break
+            found.append(order[pos])
+
+        return sorted(found)
+
+    def records(self, row_numbers: Optional[Iterable[int]] = None) -> Iterator[Dict]:
+        """ Yields the inventory records, for the row numbers if provided """
+        fieldnames = self.fieldnames
+
+        if row_numbers is None:
+            return (dict(zip(fieldnames, row)) for row in zip(*self.columns))
+
+        columns = self.columns
+        return (
+            {fieldn: column[row_i] for fieldn, column in zip(fieldnames, columns)}
+            for row_i in row_numbers
+        )
@@ -1,10 +1,23 @@
 import asyncio
+from functools import partial
 
 import click
 
-from netcfgbu.os_specs import make_host_connector
+from netcfgbu.os_specs import make_host_connector, get_os_spec
 from netcfgbu.logger import get_logger, stop_aiologging
-from netcfgbu.aiofut import as_completed
+from netcfgbu.scheduler import as_completed
+from netcfgbu.concurrency import setup_startups_limiter, make_session_limits
+from netcfgbu.probe import probe, probe_fd_budget
+from netcfgbu.consts import DEFAULT_PROBE_TIMEOUT
+from netcfgbu.cache import (
+    setup_credential_hints,
+    setup_reachability,
+    setup_change_checks,
+    RunJournal,
+)
+from netcfgbu.config_model import AppConfig
+from netcfgbu.retry import make_retry
+from netcfgbu import storage
 from netcfgbu import jumphosts
 
 from .root import (
@@ -13,36 +26,174 @@ from .root import (
     opt_config_file,
     opts_inventory,
     opt_batch,
+    opt_max_startups,
     opt_debug_ssh,
+    apply_concurrency_opts,
 )
 
 
-from .report import Report
+from .report import Report, err_reason
+
+
+async def reachable_hosts(
+    app_cfg: AppConfig, inventory_recs, report: Report, reachability=None
+):
+    """
+    Async generator that probes the inventory hosts and yields the records of
+    the reachable hosts as they are found.  The unreachable hosts are added to
+    the report as UNREACHABLE.  The hosts that use a jump host are not probed,
+    since they are not directly reachable, and are yielded as they are pulled
+    from the inventory.
+    """
+    log = get_logger()
+
+    def probe_port(rec):
+        os_spec = get_os_spec(rec, app_cfg)
+        ssh_configs = {**(app_cfg.ssh_configs or {}), **(os_spec.ssh_configs or {})}
+        return ssh_configs.get("port", 22)
+
+    async def probe_host(rec):
+        if jumphosts.get_jumphost(rec):
+            return
+
+        host = rec.get("ipaddr") or rec.get("host")
+        await probe(
+            host, timeout=DEFAULT_PROBE_TIMEOUT, port=probe_port(rec), raise_exc=True
+        )
+
+    # the number of concurrent probes is limited by the fd budget; the extra
+    # workers pass the jump host records through while the probes are busy, so
+    # that the jump host devices do not wait on the probes.
+
+    probes_n = probe_fd_budget(app_cfg.concurrency.max_probes)
+
+    def probe_limit(rec):
+        return None if jumphosts.get_jumphost(rec) else ("probe", probes_n)
+
+    report.metrics["UNREACHABLE"] = 0
+
+    async for rec, task in as_completed(
+        inventory_recs, probe_host, workers=probes_n * 2, limits=[probe_limit]
+    ):
+        try:
+            task.result()
+            yield rec
+
+        except (asyncio.TimeoutError, OSError) as exc:
+            if reachability:
+                reachability.record(rec["host"], reachable=False)
 
+            reason = f"UNREACHABLE: {err_reason(exc)}"
+            log.warning(f"PROBE: {rec['host']} {reason}")
+            report.task_results[False].append((rec, reason))
+            report.metrics["UNREACHABLE"] += 1
 
-def exec_backup(app_cfg, inventory_recs):
-    backup_tasks = dict()
+        except Exception as exc:
+            log.error(f"PROBE: {rec['host']} FAILURE: {str(exc)}")
+            report.task_results[False].append((rec, exc))
 
+
+def exec_backup(
+    app_cfg: AppConfig,
+    inventory_recs,
+    probe_first=False,
+    ignore_reachability=False,
+    resume=False,
+):
     log = get_logger()
 
-    backup_tasks = {
-        make_host_connector(rec, app_cfg).backup_config(): rec for rec in inventory_recs
-    }
+    # the number of concurrent SSH logins is controlled by the connector
+    # startup semaphore; the number of devices concurrently logged in and
+    # retrieving their configuration is controlled by the number of scheduler
+    # workers.
+
+    concurrency = app_cfg.concurrency
+    startups_limiter = setup_startups_limiter(concurrency)
+    cred_hints = setup_credential_hints(app_cfg)
+    reachability = setup_reachability(app_cfg)
+    change_checks = setup_change_checks(app_cfg)
+    session_limits = make_session_limits(concurrency)
+
+    # the hosts whose last attempt failed to connect, that is the connection
+    # was refused or timed out.  Only these hosts are recorded as not
+    # reachable; a host that fails after it is connected, for example a reset
+    # during the get-config, is alive.
+
+    connect_failed = set()
+
+    # the save-file of each host backed up successfully, for which the config
+    # file may still be waiting to be written.
+
+    save_files = dict()
+
+    async def backup_host(rec):
+        connector = make_host_connector(rec, app_cfg)
+        connect_failed.discard(rec["host"])
+        try:
+            res = await connector.backup_config()
+
+        except (asyncio.TimeoutError, OSError):
+            if connector.conn is None:
+                connect_failed.add(rec["host"])
+            raise
+
+        # the connector returns, rather than raises, the get-config errors;
+        # raise them so that the retry policy is applied.
+
+        if isinstance(res, Exception):
+            raise res
+
+        save_files[rec["host"]] = connector.save_file
+        return res
+
+    # each host is recorded in the run journal as its backup completes, and
+    # a host backed up successfully only once its config file is written;
+    # when resuming, the hosts already backed up successfully are skipped.
+
+    journal = RunJournal.start(app_cfg.defaults.configs_dir, resume=resume)
+    inventory_recs = list(journal.filter(inventory_recs))
+
+    # the hosts that were recently not reachable are skipped, unless the
+    # Caller has chosen to ignore the reachability cache.
+
+    if reachability and not ignore_reachability:
+        inventory_recs = list(reachability.filter(inventory_recs))
 
-    total = len(backup_tasks)
+    total = len(inventory_recs)
     report = Report()
+    retry = make_retry(app_cfg, report.attempts)
     done = 0
+    storage.save_counts.clear()
+    if removed_n := storage.setup_storage(
+        app_cfg.storage, app_cfg.defaults.configs_dir
+    ):
+        log.info(f"CLEANUP: removed {removed_n} temporary config files")
 
     async def process_batch():
         nonlocal done
 
+        # the jump hosts are connected concurrently with the device tasks; a
+        # device that requires a jump host waits for it to connect.
+
         if app_cfg.jumphost:
-            await jumphosts.connect_jumphosts()
+            jumphosts.start_jumphosts()
+
+        # when the probe first option is used, only the hosts found reachable
+        # are backed up, as they are found.
+
+        backup_recs = inventory_recs
+
+        if probe_first:
+            backup_recs = reachable_hosts(app_cfg, backup_recs, report, reachability)
 
-        async for task in as_completed(backup_tasks):
+        async for rec, task in as_completed(
+            backup_recs,
+            backup_host,
+            workers=concurrency.max_getconfigs,
+            limits=session_limits,
+            retry=retry,
+        ):
             done += 1
-            coro = task.get_coro()
-            rec = backup_tasks[coro]
             msg = f"DONE ({done}/{total}): {rec['host']} "
 
             try:
@@ -59,12 +210,87 @@ def exec_backup(app_cfg, inventory_recs):
                 log.error(msg + f"FAILURE: {str(exc)}")
                 report.task_results[False].append((rec, exc))
 
+            if reachability:
+                reachable = rec["host"] not in connect_failed
+                reachability.record(rec["host"], reachable=reachable)
+
+            save_file = save_files.pop(rec["host"], None)
+            if ok and save_file:
+                storage.when_saved(save_file, partial(journal_saved, rec["host"]))
+            else:
+                journal.record(rec["host"], ok=ok)
+
+            if attempts := report.attempts.get(rec["host"]):
+                msg += f"after {attempts} attempts "
+
             log.info(msg + ("PASS" if ok else "FALSE"))
 
+    def journal_saved(host, exc):
+        journal.record(host, ok=exc is None)
+
+    def fail_saves(save_errors):
+        """
+        The config files are written after the device tasks complete; a host
+        whose config file could not be written is moved to the failures.
+        """
+        failed = dict()
+        for save_file, exc in save_errors:
+            log.error(f"SAVE: {save_file} FAILURE: {str(exc)}")
+            failed[save_file.stem] = exc
+
+        passed = report.task_results[True]
+        report.task_results[True] = list()
+
+        for rec, res in passed:
+            if (exc := failed.get(rec.get("host") or rec.get("ipaddr"))) is None:
+                report.task_results[True].append((rec, res))
+                continue
+
+            report.task_results[False].append((rec, exc))
+            if change_checks:
+                change_checks.forget(rec.get("host") or rec.get("ipaddr"))
+
     loop = asyncio.get_event_loop()
     report.start_timing()
-    loop.run_until_complete(process_batch())
+
+    try:
+        loop.run_until_complete(process_batch())
+    finally:
+        if app_cfg.jumphost:
+            loop.run_until_complete(jumphosts.close_jumphosts())
+
+        if writer := loop.run_until_complete(storage.close_writer()):
+            fail_saves(writer.errors)
+            report.metrics["WRITE_QUEUE"] = writer.report()
+
+        journal.close()
+
+    if synced_n := storage.sync_configs():
+        log.info(f"SYNC: {synced_n} config files")
+
     report.stop_timing()
+
+    report.metrics["CHANGED"] = storage.save_counts["changed"]
+    report.metrics["UNCHANGED"] = storage.save_counts["unchanged"]
+
+    if resume:
+        report.metrics["RESUMED"] = journal.skipped
+
+    if startups_limiter:
+        report.metrics["STARTUPS_LIMIT"] = startups_limiter.report()
+
+    if cred_hints:
+        cred_hints.save()
+        report.metrics["CREDENTIAL_HINTS"] = cred_hints.report()
+
+    if reachability:
+        reachability.save()
+        report.metrics["SKIPPED"] = reachability.skipped
+
+    if change_checks:
+        change_checks.save()
+        report.metrics["CHANGE_CHECK_SKIPPED"] = change_checks.skipped
+
     stop_aiologging()
     report.print_report()
 
@@ -74,9 +300,33 @@ def exec_backup(app_cfg, inventory_recs):
 @opts_inventory
 @opt_debug_ssh
 @opt_batch
+@opt_max_startups
+@click.option(
+    "--probe-first",
+    is_flag=True,
+    help="probe each device, and backup only the reachable devices",
+)
+@click.option(
+    "--ignore-reachability",
+    is_flag=True,
+    help="backup the devices that were recently not reachable",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    help="resume the prior run, skipping the devices already backed up",
+)
 @click.pass_context
-def cli_backup(ctx, **_cli_opts):
+def cli_backup(ctx, **cli_opts):
     """
     Backup network configurations.
     """
-    exec_backup(app_cfg=ctx.obj["app_cfg"], inventory_recs=ctx.obj["inventory_recs"])
+    apply_concurrency_opts(ctx.obj["app_cfg"], cli_opts)
+
+    exec_backup(
+        app_cfg=ctx.obj["app_cfg"],
+        inventory_recs=ctx.obj["inventory_recs"],
+        probe_first=cli_opts["probe_first"],
+        ignore_reachability=cli_opts["ignore_reachability"],
+        resume=cli_opts["resume"],
+    )
@@ -3,9 +3,10 @@ import asyncio
 import click
 
 from netcfgbu.logger import get_logger, stop_aiologging
-from netcfgbu.aiofut import as_completed
+from netcfgbu.scheduler import as_completed
 from netcfgbu.os_specs import make_host_connector
-from netcfgbu.connectors import set_max_startups
+from netcfgbu.concurrency import setup_startups_limiter, make_session_limits
+from netcfgbu.cache import setup_credential_hints
 
 
 from .root import (
@@ -14,8 +15,10 @@ from .root import (
     opt_config_file,
     opts_inventory,
     opt_batch,
+    opt_max_startups,
     opt_debug_ssh,
     opt_timeout,
+    apply_concurrency_opts,
 )
 
 from .report import Report, err_reason
@@ -28,15 +31,13 @@ def exec_test_login(app_cfg: AppConfig, inventory_recs, cli_opts):
 
     timeout = cli_opts["timeout"] or DEFAULT_LOGIN_TIMEOUT
 
-    login_tasks = {
-        make_host_connector(rec, app_cfg).test_login(timeout=timeout): rec
-        for rec in inventory_recs
-    }
+    def login_host(rec):
+        return make_host_connector(rec, app_cfg).test_login(timeout=timeout)
 
-    if (batch_n := cli_opts["batch"]) is not None:
-        set_max_startups(batch_n)
+    startups_limiter = setup_startups_limiter(app_cfg.concurrency)
+    cred_hints = setup_credential_hints(app_cfg)
 
-    total = len(login_tasks)
+    total = len(inventory_recs)
 
     report = Report()
     done = 0
@@ -45,13 +46,19 @@ def exec_test_login(app_cfg: AppConfig, inventory_recs, cli_opts):
     async def process_batch():
         nonlocal done
 
-        if app_cfg.jumphost:
-            await jumphosts.connect_jumphosts()
+        # the jump hosts are connected concurrently with the device tasks; a
+        # device that requires a jump host waits for it to connect.
 
-        async for task in as_completed(login_tasks):
+        if app_cfg.jumphost:
+            jumphosts.start_jumphosts()
+
+        async for rec, task in as_completed(
+            inventory_recs,
+            login_host,
+            workers=app_cfg.concurrency.max_getconfigs,
+            limits=make_session_limits(app_cfg.concurrency),
+        ):
             done += 1
-            coro = task.get_coro()
-            rec = login_tasks[coro]
             msg = f"DONE ({done}/{total}): {rec['host']} "
 
             try:
@@ -73,8 +80,22 @@ def exec_test_login(app_cfg: AppConfig, inventory_recs, cli_opts):
 
     loop = asyncio.get_event_loop()
     report.start_timing()
-    loop.run_until_complete(process_batch())
+
+    try:
+        loop.run_until_complete(process_batch())
+    finally:
+        if app_cfg.jumphost:
+            loop.run_until_complete(jumphosts.close_jumphosts())
+
     report.stop_timing()
+
+    if startups_limiter:
+        report.metrics["STARTUPS_LIMIT"] = startups_limiter.report()
+
+    if cred_hints:
+        cred_hints.save()
+        report.metrics["CREDENTIAL_HINTS"] = cred_hints.report()
+
     stop_aiologging()
     report.print_report()
 
@@ -84,11 +105,13 @@ def exec_test_login(app_cfg: AppConfig, inventory_recs, cli_opts):
 @opts_inventory
 @opt_timeout
 @opt_batch
+@opt_max_startups
 @opt_debug_ssh
 @click.pass_context
 def cli_login(ctx, **cli_opts):
     """
     Verify SSH login to devices.
     """
+    apply_concurrency_opts(ctx.obj["app_cfg"], cli_opts)
 
     exec_test_login(ctx.obj["app_cfg"], ctx.obj["inventory_recs"], cli_opts)
@@ -1,10 +1,12 @@
 import asyncio
+import csv
 
 import click
 
 from netcfgbu.logger import get_logger, stop_aiologging
-from netcfgbu.aiofut import as_completed
-from netcfgbu.probe import probe
+from netcfgbu.scheduler import as_completed
+from netcfgbu.probe import probe, probe_ssh_banner, probe_fd_budget
+from netcfgbu.cache import setup_reachability
 
 from .root import (
     cli,
@@ -15,44 +17,73 @@ from .root import (
 )
 
 from .report import Report
-from netcfgbu.consts import DEFAULT_PROBE_TIMEOUT
+from netcfgbu.consts import DEFAULT_PROBE_TIMEOUT, DEFAULT_MAX_PROBES
 
 
-def exec_probe(inventory, timeout=None):
+BANNERS_FILENAME = "ssh-banners.csv"
+
+
+def save_banners(report: Report):
+    """ save the SSH server software of each host that passed the probe """
+    with open(BANNERS_FILENAME, "w+") as ofile:
+        wr_csv = csv.writer(ofile)
+        wr_csv.writerow(["host", "os_name", "ssh_software"])
+        wr_csv.writerows(
+            [rec["host"], rec["os_name"], software]
+            for rec, software in report.task_results[True]
+        )
+
+
+def exec_probe(
+    inventory, timeout=None, max_probes=None, banner=False, reachability=None
+):
     inv_n = len(inventory)
     log = get_logger()
-    log.info(f"Checking SSH reachability on {inv_n} devices ...")
+
+    # each probe in progress uses a file descriptor, so the number of
+    # concurrent probes is limited by the process open files limit.
+
+    workers = probe_fd_budget(max_probes or DEFAULT_MAX_PROBES)
+    log.info(f"Checking SSH reachability on {inv_n} devices, {workers} at a time ...")
     timeout = timeout or DEFAULT_PROBE_TIMEOUT
 
     loop = asyncio.get_event_loop()
 
-    tasks = {
-        probe(
-            rec.get("ipaddr") or rec.get("host"), timeout=timeout, raise_exc=True
-        ): rec
-        for rec in inventory
-    }
+    def probe_host(rec):
+        host = rec.get("ipaddr") or rec.get("host")
+        if banner:
+            return probe_ssh_banner(host, timeout=timeout)
 
-    total = len(tasks)
+        return probe(host, timeout=timeout, raise_exc=True)
+
+    total = inv_n
     done = 0
     report = Report()
 
     async def proces_check():
         nonlocal done
 
-        async for probe_task in as_completed(tasks):
+        async for rec, probe_task in as_completed(
+            inventory, probe_host, workers=workers
+        ):
             done += 1
-            task_coro = probe_task.get_coro()
-            rec = tasks[task_coro]
             msg = f"DONE ({done}/{total}): {rec['host']} "
 
             try:
-                probe_ok = probe_task.result()
-                report.task_results[probe_ok].append((rec, probe_ok))
+                probe_res = probe_task.result()
+                probe_ok = bool(probe_res)
+                report.task_results[probe_ok].append((rec, probe_res))
+                if banner:
+                    msg += f"{probe_res} "
+
+                if reachability:
+                    reachability.record(rec["host"], reachable=probe_ok)
 
             except (asyncio.TimeoutError, OSError) as exc:
                 probe_ok = False
                 report.task_results[False].append((rec, exc))
+                if reachability:
+                    reachability.record(rec["host"], reachable=False)
 
             except Exception as exc:
                 probe_ok = False
@@ -63,6 +94,13 @@ def exec_probe(inventory, timeout=None):
     report.start_timing()
     loop.run_until_complete(proces_check())
     report.stop_timing()
+
+    if banner:
+        save_banners(report)
+
+    if reachability:
+        reachability.save()
+
     stop_aiologging()
     report.print_report()
 
@@ -71,12 +109,24 @@ def exec_probe(inventory, timeout=None):
 @opt_config_file
 @opts_inventory
 @opt_timeout
+@click.option(
+    "--banner",
+    is_flag=True,
+    help=f"check for the SSH server identification, saved to {BANNERS_FILENAME}",
+)
 @click.pass_context
 def cli_check(ctx, **cli_opts):
     """
     Probe device for SSH reachablility.
 
     The probe check determines if the device is reachable and the SSH port
-    is available to receive connections.
+    is available to receive connections.  With the --banner option the probe
+    also checks that the SSH server sends its identification.
     """
-    exec_probe(ctx.obj["inventory_recs"], timeout=cli_opts["timeout"])
+    exec_probe(
+        ctx.obj["inventory_recs"],
+        timeout=cli_opts["timeout"],
+        max_probes=ctx.obj["app_cfg"].concurrency.max_probes,
+        banner=cli_opts["banner"],
+        reachability=setup_reachability(ctx.obj["app_cfg"]),
+    )
@@ -16,7 +16,7 @@ def err_reason(exc):
     return {
         str: lambda: exc,
         asyncio.TimeoutError: lambda: "TIMEOUT%s" % (str(exc.args or "")),
-        OSError: lambda: errorcode[exc.errno],
+        OSError: lambda: errorcode.get(exc.errno, str(exc)),
     }.get(exc.__class__, lambda: "%s: %s" % (str(exc.__class__.__name__), str(exc)))()
 
 
@@ -31,6 +31,12 @@ class Report(object):
         self.stop_tm = 0
 
         self.task_results = defaultdict(list)
+        self.metrics = dict()
+
+        # the number of attempts made for each host that was retried; hosts
+        # not included made a single attempt.
+
+        self.attempts = dict()
 
     def start_timing(self):
         self.start_ts = datetime.now()
@@ -69,10 +75,18 @@ class Report(object):
             f"         DURATION={self.duration:.3f}s"
         )
 
-        headers = ["host", "os_name", "reason"]
+        for name, value in self.metrics.items():
+            print(f"         {name}={value}")
+
+        headers = ["host", "os_name", "reason", "attempts"]
 
         failure_tabular_data = [
-            [rec["host"], rec["os_name"], err_reason(exc)]
+            [
+                rec["host"],
+                rec["os_name"],
+                err_reason(exc),
+                self.attempts.get(rec["host"], 1),
+            ]
             for rec, exc in self.task_results[False]
         ]
 
@@ -128,10 +128,32 @@ def opts_inventory(in_fn_deco):
 opt_batch = click.option(
     "--batch",
     "-b",
-    type=click.IntRange(1, 500),
-    help="inevntory record processing batch size",
+    type=click.IntRange(min=1),
+    help="maximum number of devices processed concurrently",
 )
 
+opt_max_startups = click.option(
+    "--max-startups",
+    type=click.IntRange(min=1),
+    help="maximum number of concurrent SSH logins",
+)
+
+
+def apply_concurrency_opts(app_cfg, cli_opts):
+    """
+    Override the concurrency limits with the --batch and --max-startups
+    options, when given; --batch is the max_getconfigs limit, the number of
+    devices processed concurrently, for each command.
+    """
+    concurrency = app_cfg.concurrency
+
+    if (batch_n := cli_opts.get("batch")) is not None:
+        concurrency.max_getconfigs = batch_n
+
+    if (max_startups := cli_opts.get("max_startups")) is not None:
+        concurrency.max_startups = max_startups
+
+
 opt_timeout = click.option(
     "--timeout", "-t", help="timeout(s)", type=click.IntRange(0, 5 * 60)
 )
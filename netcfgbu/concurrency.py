@@ -0,0 +1,232 @@
+"""
+This module contains the code used to control the number of concurrent SSH
+login attempts.  The adaptive limiter adjusts the number of concurrent logins
+based on the observed login latency and failures, using an additive-increase,
+multiplicative-decrease (AIMD) approach.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Optional, Tuple, Type, List
+from collections import deque
+from time import monotonic
+import asyncio
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+import asyncssh
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from .config_model import ConcurrencySpec
+from .connectors import BasicSSHConnector
+from .scheduler import KeyLimitFn
+from .logger import get_logger
+from . import jumphosts
+
+__all__ = ["AdaptiveLimiter", "setup_startups_limiter", "make_session_limits"]
+
+
+# -----------------------------------------------------------------------------
+#
+#                               CODE BEGINS
+#
+# -----------------------------------------------------------------------------
+
+
+class AdaptiveLimiter(object):
+    """
+    An AdaptiveLimiter is used in place of an asyncio.Semaphore, as an async
+    context manager, to limit the number of concurrent operations.  The limit,
+    or window, is adjusted based on the outcome of each operation:
+
+        * When the operation completes within the latency threshold the window
+          is increased by 1/window; that is by one once a full window of
+          operations completed successfully.
+
+        * When the rate of failed operations, those raising one of the failure
+          exceptions or exceeding the latency threshold, in the recent outcomes
+          exceeds the failure rate threshold, then the window is halved.
+
+    The window is bounded by the min and max limit values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency: float,
+        failure_rate: float,
+        failure_exc: Tuple[Type[BaseException], ...] = (asyncio.TimeoutError,),
+        sample_size: int = 20,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_exc = failure_exc
+
+        self.window = float(min(max(initial, min_limit), max_limit))
+        self.lowest = self.highest = self.limit
+
+        self.in_flight = 0
+        self._waiters = deque()
+        self._started = dict()
+        self._outcomes = deque(maxlen=sample_size)
+        self._since_decrease = 0
+        self.log = get_logger()
+
+    @property
+    def limit(self) -> int:
+        return int(self.window)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+
+        while self.in_flight >= self.limit:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+
+            except asyncio.CancelledError:
+                if waiter.done():
+                    # pass along the wakeup to the next waiter.
+                    self._wakeup()
+                else:
+                    self._waiters.remove(waiter)
+                raise
+
+        self.in_flight += 1
+        self._started[asyncio.current_task()] = monotonic()
+
+    def release(self, exc: Optional[BaseException] = None):
+        self.in_flight -= 1
+        started = self._started.pop(asyncio.current_task(), None)
+
+        if isinstance(exc, self.failure_exc):
+            self._record(ok=False)
+        elif exc is None and started is not None:
+            self._record(ok=(monotonic() - started) <= self.latency)
+
+        self._wakeup()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release(exc_val)
+
+    def report(self) -> str:
+        """ returns the current, lowest and highest limit for reporting """
+        return f"{self.limit} (lowest={self.lowest}, highest={self.highest})"
+
+    def _wakeup(self):
+        for _ in range(self.limit - self.in_flight):
+            while self._waiters:
+                if not (waiter := self._waiters.popleft()).done():
+                    waiter.set_result(True)
+                    break
+
+    def _record(self, ok: bool):
+        self._outcomes.append(ok)
+        self._since_decrease += 1
+
+        failed_n = self._outcomes.count(False)
+        failed_rate = failed_n / self._outcomes.maxlen
+
+        # only decrease once per window of outcomes so that the failures
+        # already in-flight do not cause repeated decreases.
+
+        if failed_rate > self.failure_rate and self._since_decrease >= self.limit:
+            self._set_window(self.window / 2)
+            self._outcomes.clear()
+            self._since_decrease = 0
+
+        elif ok:
+            self._set_window(self.window + 1 / self.window)
+
+    def _set_window(self, window: float):
+        orig_limit = self.limit
+        self.window = min(max(window, self.min_limit), self.max_limit)
+
+        if (new_limit := self.limit) == orig_limit:
+            return
+
+        self.lowest = min(self.lowest, new_limit)
+        self.highest = max(self.highest, new_limit)
+        self.log.info(f"{self.name}: limit changed {orig_limit} -> {new_limit}")
+
+
+def setup_startups_limiter(
+    concurrency: ConcurrencySpec, max_startups: Optional[int] = None
+) -> Optional[AdaptiveLimiter]:
+    """
+    Setup the connector limit for the number of concurrent SSH logins.  When
+    the concurrency spec defines the adaptive section, an AdaptiveLimiter is
+    used and returned; otherwise a fixed limit is used and None is returned.
+
+    Parameters
+    ----------
+    concurrency:
+        The concurrency section of the app config.
+
+    max_startups:
+        When provided, overrides the concurrency `max_startups` value.
+    """
+    max_startups = max_startups or concurrency.max_startups
+
+    if not (adaptive := concurrency.adaptive):
+        BasicSSHConnector.set_max_startups(max_startups)
+        return None
+
+    limiter = AdaptiveLimiter(
+        name="STARTUPS",
+        initial=max_startups,
+        min_limit=adaptive.min_startups,
+        max_limit=adaptive.max_startups,
+        latency=adaptive.latency,
+        failure_rate=adaptive.failure_rate,
+        failure_exc=(asyncio.TimeoutError, asyncssh.PermissionDenied),
+    )
+
+    BasicSSHConnector.set_startups_limiter(limiter)
+    return limiter
+
+
+def make_session_limits(concurrency: ConcurrencySpec) -> List[KeyLimitFn]:
+    """
+    Returns the list of scheduler key limit functions used to limit the number
+    of concurrent device sessions through each jump host that defines
+    `max_sessions`, and to each site when the concurrency spec defines the
+    `site_field`.
+    """
+    limits = list()
+
+    if any(jh.max_sessions for jh in jumphosts.JumpHost.available):
+
+        def jumphost_limit(rec):
+            if (jh := jumphosts.get_jumphost(rec)) and jh.max_sessions:
+                return ("jumphost", jh.name), jh.max_sessions
+
+        limits.append(jumphost_limit)
+
+    if site_field := concurrency.site_field:
+        max_site_n = concurrency.max_site_getconfigs
+
+        def site_limit(rec):
+            if site := rec.get(site_field):
+                return ("site", site), max_site_n
+
+        limits.append(site_limit)
+
+    return limits
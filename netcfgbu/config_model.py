@@ -1,6 +1,8 @@
 import re
 import os
-from typing import Optional, Union, List, Dict
+import asyncio
+import builtins
+from typing import Optional, Union, List, Dict, Type
 from os.path import expandvars
 from itertools import chain
 from pathlib import Path
@@ -10,11 +12,14 @@ from pydantic import (
     SecretStr,
     BaseSettings,
     PositiveInt,
+    PositiveFloat,
+    confloat,
     FilePath,
     Field,
     validator,
     root_validator,
 )
+import asyncssh
 
 
 from . import consts
@@ -24,9 +29,14 @@ __all__ = [
     "Credential",
     "InventorySpec",
     "OSNameSpec",
+    "RetrySpec",
     "LinterSpec",
     "GitSpec",
     "JumphostSpec",
+    "StorageSpec",
+    "ConcurrencySpec",
+    "CacheSpec",
+    "get_error_class",
 ]
 
 _var_re = re.compile(
@@ -151,15 +161,49 @@ class GitSpec(NoExtraBaseModel):
         return values
 
 
+# the modules in which the retry error names are found, in order; so that
+# "TimeoutError" is the asyncio.TimeoutError raised by the connector.
+
+_ERROR_MODULES = (asyncio, asyncssh, builtins)
+
+
+def get_error_class(name: str) -> Type[Exception]:
+    """
+    Returns the exception class for the retry error name, for example
+    "TimeoutError", "ConnectionResetError", or "ConnectionLost".
+    """
+    for mod in _ERROR_MODULES:
+        err_cls = getattr(mod, name, None)
+        if isinstance(err_cls, type) and issubclass(err_cls, Exception):
+            return err_cls
+
+    raise ValueError(f"Unknown error class: {name}")
+
+
+class RetrySpec(NoExtraBaseModel):
+    attempts: PositiveInt = Field(consts.DEFAULT_RETRY_ATTEMPTS)
+    backoff: PositiveFloat = Field(consts.DEFAULT_RETRY_BACKOFF)
+    max_backoff: PositiveFloat = Field(consts.DEFAULT_RETRY_MAX_BACKOFF)
+    jitter: confloat(ge=0, le=1) = Field(consts.DEFAULT_RETRY_JITTER)
+    errors: List[str] = Field(default_factory=lambda: list(consts.DEFAULT_RETRY_ERRORS))
+
+    @validator("errors", each_item=True)
+    def _known_errors(cls, value):  # noqa
+        get_error_class(value)
+        return value
+
+
 class OSNameSpec(NoExtraBaseModel):
     credentials: Optional[List[Credential]]
     pre_get_config: Optional[Union[str, List[str]]]
     get_config: Optional[str]
+    change_check: Optional[str]
     connection: Optional[str]
     linter: Optional[str]
     timeout: PositiveInt = Field(consts.DEFAULT_GETCONFIG_TIMEOUT)
     ssh_configs: Optional[Dict]
     prompt_pattern: Optional[str]
+    retry: RetrySpec = RetrySpec()
 
 
 class LinterSpec(NoExtraBaseModel):
@@ -189,12 +233,67 @@ class JumphostSpec(NoExtraBaseModel):
     include: Optional[List[str]]
     exclude: Optional[List[str]]
     timeout: PositiveInt = Field(consts.DEFAULT_LOGIN_TIMEOUT)
+    max_startups: Optional[PositiveInt]
+    max_sessions: Optional[PositiveInt]
+    connections: PositiveInt = Field(consts.DEFAULT_JUMPHOST_CONNECTIONS)
 
     @validator("name", always=True)
     def _default_name(cls, value, values):  # noqa
         return values["proxy"] if not value else value
 
 
+class StorageSpec(NoExtraBaseModel):
+    streaming: bool = False
+    durability: str = Field(consts.DEFAULT_STORAGE_DURABILITY)
+    write_queue: PositiveInt = Field(consts.DEFAULT_STORAGE_WRITE_QUEUE)
+
+    @validator("durability")
+    def _durability(cls, value):  # noqa
+        if value not in consts.STORAGE_DURABILITY:
+            raise ValueError(
+                f"{value} not one of: {', '.join(consts.STORAGE_DURABILITY)}"
+            )
+        return value
+
+
+class CacheSpec(NoExtraBaseModel):
+    credentials: bool = False
+    inventory: bool = False
+    reachability_ttl: Optional[PositiveInt]
+    reachability_max_backoff: PositiveInt = Field(
+        consts.DEFAULT_REACHABILITY_MAX_BACKOFF
+    )
+
+
+class AdaptiveConcurrencySpec(NoExtraBaseModel):
+    min_startups: PositiveInt = Field(consts.DEFAULT_ADAPTIVE_MIN_STARTUPS)
+    max_startups: PositiveInt = Field(consts.DEFAULT_ADAPTIVE_MAX_STARTUPS)
+    latency: PositiveFloat = Field(consts.DEFAULT_ADAPTIVE_LATENCY)
+    failure_rate: confloat(gt=0, le=1) = Field(consts.DEFAULT_ADAPTIVE_FAILURE_RATE)
+
+    @root_validator
+    def _min_max(cls, values):  # noqa
+        min_n, max_n = values.get("min_startups"), values.get("max_startups")
+        if min_n and max_n and min_n > max_n:
+            raise ValueError("min_startups must not be greater than max_startups")
+        return values
+
+
+class ConcurrencySpec(NoExtraBaseModel):
+    max_startups: PositiveInt = Field(consts.DEFAULT_MAX_STARTUPS)
+    max_getconfigs: PositiveInt = Field(consts.DEFAULT_MAX_GETCONFIGS)
+    max_probes: PositiveInt = Field(consts.DEFAULT_MAX_PROBES)
+    adaptive: Optional[AdaptiveConcurrencySpec]
+    site_field: Optional[str]
+    max_site_getconfigs: Optional[PositiveInt]
+
+    @root_validator
+    def _site_limit(cls, values):  # noqa
+        if bool(values.get("site_field")) != bool(values.get("max_site_getconfigs")):
+            raise ValueError("site_field and max_site_getconfigs used together")
+        return values
+
+
 class AppConfig(NoExtraBaseModel):
     defaults: Defaults
     credentials: Optional[List[Credential]]
@@ -205,6 +304,9 @@ class AppConfig(NoExtraBaseModel):
     ssh_configs: Optional[Dict]
     git: Optional[List[GitSpec]]
     jumphost: Optional[List[JumphostSpec]]
+    storage: StorageSpec = StorageSpec()
+    concurrency: ConcurrencySpec = ConcurrencySpec()
+    cache: CacheSpec = CacheSpec()
 
     @validator("os_name")
     def _linters(cls, v, values):  # noqa
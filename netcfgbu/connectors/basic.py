@@ -1,11 +1,12 @@
 from typing import Optional
 import asyncio
+import hashlib
 import io
 from pathlib import Path
 import re
 from copy import copy
+from contextlib import asynccontextmanager, AsyncExitStack
 
-import aiofiles
 import asyncssh
 
 
@@ -14,6 +15,7 @@ from netcfgbu.logger import get_logger
 from netcfgbu import consts
 from netcfgbu import linter
 from netcfgbu import jumphosts
+from netcfgbu.storage import ConfigStreamWriter, save_content
 
 
 __all__ = ["BasicSSHConnector", "set_max_startups"]
@@ -63,6 +65,8 @@ class BasicSSHConnector(object):
     pre_get_config = None
 
     _max_startups_sem4 = asyncio.Semaphore(consts.DEFAULT_MAX_STARTUPS)
+    _credential_hints = None
+    _change_checks = None
 
     def __init__(self, host_cfg: dict, os_spec: OSNameSpec, app_cfg: AppConfig):
         """
@@ -108,6 +112,7 @@ class BasicSSHConnector(object):
 
         self._cur_prompt: Optional[str] = None
         self.config = None
+        self.change_digest = None
         self.save_file = None
         self.failed = None
 
@@ -122,6 +127,30 @@ class BasicSSHConnector(object):
     def set_max_startups(cls, max_startups):
         cls._max_startups_sem4 = asyncio.Semaphore(value=max_startups)
 
+    @classmethod
+    def set_startups_limiter(cls, limiter):
+        """
+        Use the given limiter, for example the concurrency.AdaptiveLimiter, in
+        place of the fixed max-startups semaphore.
+        """
+        cls._max_startups_sem4 = limiter
+
+    @classmethod
+    def set_credential_hints(cls, cred_hints):
+        """
+        Use the given cache.CredentialHints so that each host first tries the
+        credential that it last accepted.
+        """
+        cls._credential_hints = cred_hints
+
+    @classmethod
+    def set_change_checks(cls, change_checks):
+        """
+        Use the given cache.ChangeChecks so that the configuration is only
+        retrieved from a host when its change-check output has changed.
+        """
+        cls._change_checks = change_checks
+
     # -------------------------------------------------------------------------
     #
     #                       Backup Config Coroutine Task
@@ -154,6 +183,12 @@ class BasicSSHConnector(object):
         if self.config:
             await self.save_config()
 
+        # once the configuration has been saved, store the change-check
+        # output digest for use by the next backup.
+
+        if retval is True and self.change_digest:
+            self.__class__._change_checks.record(self.name, self.change_digest)
+
         return retval
 
     # -------------------------------------------------------------------------
@@ -182,12 +217,31 @@ class BasicSSHConnector(object):
     # -------------------------------------------------------------------------
 
     async def get_running_config(self):
+        """
+        This coroutine is used to execute the `get_config` command on the
+        device.  By default the output is stored into the `config` attribute
+        for later use by `save_config`.  When the storage streaming option is
+        enabled the output is instead written to the save-file as it arrives,
+        and the `config` attribute remains None.
+        """
         command = self.os_spec.get_config
         timeout = self.os_spec.timeout
         log_msg = f"GET-CONFIG: {self.name} timeout={timeout}"
+        streaming = self.app_cfg.storage.streaming
 
         if not self.process:
+            if not await self.check_config_changed():
+                self.conn.close()
+                return
+
             self.log.info(log_msg)
+
+            if streaming:
+                async with self.open_config_stream() as ostream:
+                    await self.stream_exec_command(command, ostream)
+                self.conn.close()
+                return
+
             res = await self.conn.run(command)
             self.conn.close()
             ln_at = res.stdout.find(command) + len(command) + 1
@@ -206,7 +260,18 @@ class BasicSSHConnector(object):
             paging_disabled = True
             self.log.debug(f"AFTER-PRE-GET-RUNNING: {res}")
 
+            if not await self.check_config_changed():
+                return
+
             self.log.info(log_msg)
+
+            if streaming:
+                async with self.open_config_stream() as ostream:
+                    await asyncio.wait_for(
+                        self.run_command(command, ostream=ostream), timeout=timeout
+                    )
+                return
+
             self.config = await asyncio.wait_for(
                 self.run_command(command), timeout=timeout
             )
@@ -221,6 +286,40 @@ class BasicSSHConnector(object):
 
             raise asyncio.TimeoutError(msg)
 
+    async def check_config_changed(self) -> bool:
+        """
+        This coroutine is used to execute the os-spec `change_check` command,
+        if defined, and compare the digest of the output to the digest stored
+        by the previous backup.  Returns False if the configuration has not
+        changed, and the config file exists, so that the `get_config` command
+        need not be run; otherwise returns True.
+        """
+        change_checks = self.__class__._change_checks
+        if not (change_checks and (command := self.os_spec.change_check)):
+            return True
+
+        self.log.info(f"CHANGE-CHECK: {self.name}")
+
+        if self.process:
+            output = await asyncio.wait_for(
+                self.run_command(command), timeout=self.os_spec.timeout
+            )
+        else:
+            output = (await self.conn.run(command)).stdout.encode("utf-8")
+
+        self.change_digest = hashlib.sha256(output).hexdigest()
+        config_file = Path(self.app_cfg.defaults.configs_dir) / f"{self.name}.cfg"
+
+        if (
+            change_checks.unchanged(self.name, self.change_digest)
+            and config_file.exists()
+        ):
+            change_checks.skipped += 1
+            self.log.info(f"UNCHANGED: {self.name}, skipping get-config")
+            return False
+
+        return True
+
     # -------------------------------------------------------------------------
     #
     #                                  Login
@@ -258,7 +357,8 @@ class BasicSSHConnector(object):
         This coroutine is used to execute the SSH login process to the target device.
         Each of the `credentials` provided in the app-configure are tried in the order
         they were provided in the configuration file.  If the host configuraiton included
-        credentials, these will be used first.
+        credentials, these will be used first.  When the credential hints cache
+        is used, the credential last accepted by the host is tried first.
 
         When this coroutine completes successfully the `conn` attribute is
         initialized to the SSHClientConnection.  If this SSHSpec requires the
@@ -283,17 +383,32 @@ class BasicSSHConnector(object):
 
         timeout: int = self.os_spec.timeout
 
-        # if this host requires the use of a JumpHost, then configure the
-        # connection args to include the supporting jumphost tunnel connection.
+        # if this host requires the use of a JumpHost, then wait for it to
+        # connect and configure the connection args to include the supporting
+        # jumphost tunnel connection.
 
         if jh := jumphosts.get_jumphost(self.host_cfg):
+            await jh.wait_connected()
             self.conn_args["tunnel"] = jh.tunnel
 
+        # if the host has a credential hint, then try that credential first.
+
+        cred_order = list(range(len(self.creds)))
+        cred_hint = None
+
+        if cred_hints := self.__class__._credential_hints:
+            usernames = [cred.username for cred in self.creds]
+            if (cred_hint := cred_hints.get(self.name, usernames)) is not None:
+                cred_order.remove(cred_hint)
+                cred_order.insert(0, cred_hint)
+
         # interate through all of the credential options until one is accepted.
         # the number of max setup connections is controlled by a semaphore
-        # instance so that the server running this code is not overwhelmed.
+        # instance so that the server running this code, and any jump host, is
+        # not overwhelmed.
 
-        for try_cred in self.creds:
+        for cred_index in cred_order:
+            try_cred = self.creds[cred_index]
             try:
                 self.failed = None
                 self.conn_args.update(
@@ -302,7 +417,7 @@ class BasicSSHConnector(object):
                         "password": try_cred.password.get_secret_value(),
                     }
                 )
-                async with self.__class__._max_startups_sem4:
+                async with self.startup_limits(jh):
 
                     login_msg = (
                         f"LOGIN: {self.name} ({self.os_name}) timeout={timeout}s "
@@ -320,12 +435,20 @@ class BasicSSHConnector(object):
                             term_type="vt100", encoding=None
                         )
 
+                    if cred_hints:
+                        cred_hints.record(
+                            self.name, cred_hint, cred_index, try_cred.username
+                        )
+
                     return self.conn
 
             except asyncssh.PermissionDenied as exc:
                 self.failed = exc
                 continue
 
+        if cred_hints:
+            cred_hints.record(self.name, cred_hint, None, None)
+
         # Indicate that the login failed with the number of credential
         # attempts.
 
@@ -333,6 +456,20 @@ class BasicSSHConnector(object):
             reason=f"No valid username/password, attempted {len(self.creds)} credentials."
         )
 
+    @asynccontextmanager
+    async def startup_limits(self, jh: Optional[jumphosts.JumpHost] = None):
+        """
+        Async context manager used to limit the number of concurrent SSH
+        connection setups; through the given jump host, if it is limited, and
+        overall.
+        """
+        async with AsyncExitStack() as limits:
+            if jh and jh.startups_sem4:
+                await limits.enter_async_context(jh.startups_sem4)
+
+            await limits.enter_async_context(self.__class__._max_startups_sem4)
+            yield
+
     async def close(self):
         self.conn.close()
         await self.conn.wait_closed()
@@ -344,20 +481,82 @@ class BasicSSHConnector(object):
     #
     # -------------------------------------------------------------------------
 
-    async def read_until_prompt(self):
-        output = b""
+    async def read_until_prompt(self, skip=0, ostream=None):
+        """
+        Read the process output until the CLI prompt is found on the last
+        line.  The output is accumulated into a growable buffer and only the
+        newly arrived tail, that is the line after the last newline, is
+        examined for the prompt; so that the cost per byte remains constant
+        regardless of the size of the output.
+
+        Parameters
+        ----------
+        skip: int
+            The number of bytes to discard from the start of the output, for
+            example the echo of the command.
+
+        ostream: ConfigStreamWriter
+            When provided, the output is written to the stream as complete
+            lines arrive rather than being accumulated into memory.
+
+        Returns
+        -------
+        bytes - the output up to, but not including, the prompt line; or None
+        when the `ostream` is used.
+        """
+        output = bytearray()
+        line_at = 0
+
         while True:
+            chunk_at = len(output)
             output += await self.process.stdout.read(io.DEFAULT_BUFFER_SIZE)
-            nl_at = output.rfind(b"\n")
-            if mobj := self.PROMPT_PATTERN.match(output[nl_at + 1 :]):
+
+            # only search the new chunk for the start of the last line; any
+            # newline prior to the chunk has already been accounted for.
+
+            if (nl_at := output.rfind(b"\n", chunk_at)) >= 0:
+                line_at = nl_at + 1
+
+            if mobj := self.PROMPT_PATTERN.match(output, line_at):
                 self._cur_prompt = mobj.group(1)
-                return output[0:nl_at]
+                if ostream is None:
+                    return bytes(output[skip : line_at - 1])
+
+                await ostream.write(bytes(output[skip : line_at - 1]))
+                return None
+
+            # when streaming, write all but the newline preceding the last line
+            # since the last line may turn out to be the prompt.
 
-    async def run_command(self, command):
+            if ostream is not None and line_at - 1 > skip:
+                await ostream.write(bytes(output[skip : line_at - 1]))
+                del output[0 : line_at - 1]
+                line_at, skip = 1, 0
+
+    async def run_command(self, command, ostream=None):
         wr_cmd = command + "\n"
         self.process.stdin.write(wr_cmd.encode("utf-8"))
-        output = await self.read_until_prompt()
-        return output[len(wr_cmd) + 1 :]
+        return await self.read_until_prompt(skip=len(wr_cmd) + 1, ostream=ostream)
+
+    async def stream_exec_command(self, command, ostream):
+        """
+        This coroutine is used to execute the command on the SSH connection,
+        without an interactive CLI process, and write the output to the
+        `ostream` as it arrives.  The output up to and including the echo of
+        the command is discarded.
+        """
+        process = await self.conn.create_process(command, encoding=None)
+        read_size = io.DEFAULT_BUFFER_SIZE
+
+        head = bytearray()
+        while len(head) < read_size and (chunk := await process.stdout.read(read_size)):
+            head += chunk
+
+        command = command.encode("utf-8")
+        await ostream.write(bytes(head[head.find(command) + len(command) + 1 :]))
+
+        while chunk := await process.stdout.read(read_size):
+            await ostream.write(chunk)
 
     async def run_disable_paging(self):
         """
@@ -379,6 +578,18 @@ class BasicSSHConnector(object):
     #
     # -------------------------------------------------------------------------
 
+    def open_config_stream(self) -> ConfigStreamWriter:
+        """
+        Return the stream writer used to store the configuration content into
+        the save-file as the content arrives from the device.
+        """
+        lint_spec = None
+        if linter_name := self.os_spec.linter:
+            lint_spec = self.app_cfg.linters[linter_name]
+
+        self.save_file = Path(self.app_cfg.defaults.configs_dir) / f"{self.name}.cfg"
+        return ConfigStreamWriter(self.save_file, lint_spec=lint_spec)
+
     async def save_config(self):
         if isinstance(self.config, bytes):
             self.config = self.config.decode("utf-8", "ignore")
@@ -394,9 +605,8 @@ class BasicSSHConnector(object):
 
         self.save_file = Path(self.app_cfg.defaults.configs_dir) / f"{self.name}.cfg"
 
-        async with aiofiles.open(self.save_file, mode="w+") as ofile:
-            await ofile.write(config_content)
-            await ofile.write("\n")
+        content = (config_content + "\n").encode("utf-8")
+        await save_content(self.save_file, content)
 
 
 def set_max_startups(count, cls=BasicSSHConnector):
@@ -1,7 +1,25 @@
 DEFAULT_MAX_STARTUPS = 100
+DEFAULT_MAX_GETCONFIGS = 500
+DEFAULT_MAX_PROBES = 1000
+DEFAULT_ADAPTIVE_MIN_STARTUPS = 4
+DEFAULT_ADAPTIVE_MAX_STARTUPS = 500
+DEFAULT_ADAPTIVE_LATENCY = 10
+DEFAULT_ADAPTIVE_FAILURE_RATE = 0.5
 DEFAULT_LOGIN_TIMEOUT = 30
+DEFAULT_JUMPHOST_CONNECTIONS = 1
 DEFAULT_GETCONFIG_TIMEOUT = 60
 DEFAULT_PROBE_TIMEOUT = 10
+DEFAULT_PROBE_BANNER_TIMEOUT = 5
+DEFAULT_REACHABILITY_MAX_BACKOFF = 24 * 60 * 60
+DEFAULT_RETRY_ATTEMPTS = 1
+DEFAULT_RETRY_BACKOFF = 5
+DEFAULT_RETRY_MAX_BACKOFF = 60
+DEFAULT_RETRY_JITTER = 0.5
+DEFAULT_RETRY_ERRORS = ["TimeoutError", "OSError"]
+
+STORAGE_DURABILITY = ("none", "file", "batch")
+DEFAULT_STORAGE_DURABILITY = "none"
+DEFAULT_STORAGE_WRITE_QUEUE = 100
 
 # DEFAULT_CONFIG_STARTS_AFTER = "Current configuration"
 # DEFAULT_CONFIG_ENDS_WITH = "end"
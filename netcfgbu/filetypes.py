@@ -1,39 +1,41 @@
 import csv
+import re
 
 
 class CommentedCsvReader(csv.DictReader):
     def __next__(self):
-        value = super(CommentedCsvReader, self).__next__()
-
-        if value[self.fieldnames[0]].startswith("#"):
-            return self.__next__()
-
-        return value
-
-
-# TODO: not in use just yet.
-# class TextFileReader(object):
-#     wordsep_re = re.compile(r"\s+|,")
-#
-#     def __init__(self, fileio, index=0):
-#         self._index = index
-#         self._lines = fileio.readlines()
-#
-#     def __iter__(self):
-#         return self
-#
-#     def __next__(self):
-#         try:
-#             line_item = self._lines.pop(0)
-#         except IndexError:
-#             raise StopIteration
-#
-#         if line_item.startswith("#"):
-#             return self.__next__()
-#
-#         try:
-#             return self.wordsep_re.split(line_item)[self._index]
-#         except IndexError:
-#             pass
-#
-#         return self.__next__()
+        while True:
+            value = super(CommentedCsvReader, self).__next__()
+
+            if not value[self.fieldnames[0]].startswith("#"):
+                return value
+
+
+class TextFileReader(object):
+    """
+    Reads a plain text file containing one item per line, returning the first
+    word of each line.  Blank lines, and lines that begin with a hash (#), are
+    ignored.
+    """
+
+    wordsep_re = re.compile(r"\s+|,")
+
+    def __init__(self, fileio, index=0):
+        self._index = index
+        self._lines = iter(fileio)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for line_item in self._lines:
+            line_item = line_item.strip()
+            if not line_item or line_item.startswith("#"):
+                continue
+
+            try:
+                return self.wordsep_re.split(line_item)[self._index]
+            except IndexError:
+                continue
+
+        raise StopIteration
@@ -5,13 +5,15 @@ not specific to the netcfgbu inventory column names, can could be re-used for
 other CSV related tools and use-cases.
 """
 import ipaddress
-import operator
 import re
+import socket
 from abc import ABC, abstractmethod
+from collections import defaultdict
 from pathlib import Path
-from typing import List, AnyStr, Optional, Callable, Dict
+from ipaddress import IPv4Network, IPv6Network
+from typing import List, AnyStr, Optional, Callable, Dict, Iterable, Set, Tuple, Union
 
-from .filetypes import CommentedCsvReader
+from .filetypes import CommentedCsvReader, TextFileReader
 
 __all__ = ["create_filter"]
 
@@ -19,6 +21,8 @@ __all__ = ["create_filter"]
 value_pattern = r"(?P<value>\S+)$"
 file_reg = re.compile(r"@(?P<filename>.+)$")
 wordsep_re = re.compile(r"\s+|,")
+backref_re = re.compile(r"\\[1-9]|\(\?P=")
+regex_meta_chars = set(".^$*+?{}[]\\|()")
 
 
 class Filter(ABC):
@@ -42,8 +46,9 @@ class RegexFilter(Filter):
 
     def __init__(self, fieldname: str, expr: str) -> None:
         self.fieldname = fieldname
+        self.expr = expr
         try:
-            self.re = re.compile(f"^{expr}$", re.IGNORECASE)
+            self.re = re.compile(f"^(?:{expr})$", re.IGNORECASE)
         except re.error as exc:
             raise ValueError(
                 f"Invalid filter regular-expression: {expr!r}: {exc}"
@@ -82,30 +87,284 @@ class IPFilter(Filter):
         return f"IpFilter(fieldname={self.fieldname!r}, ip='{self.ip}')"
 
 
-def create_filter_function(op_filters, optest_fn):
-    def filter_fn(rec):
-        for op_fn in op_filters:
-            if optest_fn(op_fn(rec)):
-                return False
+def literal_prefix(expr: str) -> str:
+    """
+    Returns the literal text that any value matching the filter regular
+    expression must start with, ignoring case; or an empty string if there is
+    no such text.  For example "switch1" for the expression "switch1.nyc1".
+    """
+    if "|" in expr:
+        return ""
 
-        return True
+    prefix = list()
 
-    return filter_fn
+    for char in expr:
+        if char in regex_meta_chars:
+            # the last literal character is optional when it is followed by
+            # a zero-or-more quantifier.
+            if char in "*?{" and prefix:
+                prefix.pop()
+            break
 
+        prefix.append(char)
 
-def mk_file_filter(filepath, key):
+    return "".join(prefix)
 
-    if filepath.endswith(".csv"):
-        filter_hostnames = [rec[key] for rec in CommentedCsvReader(open(filepath))]
+
+def mk_regex_matcher(fieldname: str, regex_filters: List[RegexFilter], include):
+    """
+    Returns the function that matches the record field against all of the
+    regex filters when `include` is True, or against any of the regex filters
+    otherwise; using one regular-expression that merges the filter
+    expressions.  When the expressions cannot be merged, because they use
+    back-references or the same group names, the filters are used as-is.
+    """
+    exprs = [regex_filter.expr for regex_filter in regex_filters]
+
+    if len(exprs) == 1:
+        return regex_filters[0]
+
+    if any(backref_re.search(expr) for expr in exprs):
+        return mk_any_all_matcher(regex_filters, include)
+
+    # each filter expression is anchored at the start and the end of the
+    # value, as by RegexFilter; the all-of expression uses a lookahead for
+    # each filter expression.
+
+    if include:
+        pattern = "".join(f"(?=^(?:{expr})$)" for expr in exprs)
     else:
-        raise ValueError(
-            f"File '{filepath}' not a CSV file.  Only CSV files are supported at this time"
+        pattern = "(?:" + "|".join(f"^(?:{expr})$" for expr in exprs) + ")"
+
+    try:
+        match = re.compile(pattern, re.IGNORECASE).match
+    except re.error:
+        return mk_any_all_matcher(regex_filters, include)
+
+    def regex_matcher(rec):
+        return match(rec[fieldname]) is not None
+
+    return regex_matcher
+
+
+def parse_ip(value: str):
+    """
+    Returns the tuple (address-family, int) for the IP address value, parsed
+    without creating an ipaddress object.  Raises ValueError if the value is
+    not an IPv4 or IPv6 address.
+    """
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            return family, int.from_bytes(socket.inet_pton(family, value), "big")
+        except OSError:
+            continue
+
+    raise ValueError(f"{value!r} does not appear to be an IPv4 or IPv6 address")
+
+
+def find_ip(value) -> Optional[Tuple[int, int]]:
+    """
+    Returns the `parse_ip` tuple for the record IP address value, or None if
+    the value is not an IP address, for example empty; so that the record
+    does not match, as with the regex filters.
+    """
+    try:
+        return parse_ip(value)
+    except (ValueError, TypeError):
+        return None
+
+
+class PrefixIndex(object):
+    """
+    A PrefixIndex is built once from a list of IPv4 and IPv6 networks, and is
+    used to find the networks that contain an IP address.  The networks are
+    indexed by address family and prefix length, each prefix length holding
+    the set of network addresses as integers; so that a lookup costs one set
+    membership test for each distinct prefix length, rather than one test for
+    each network.  The prefix lengths are tested longest first.
+    """
+
+    FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+    def __init__(self, networks: Iterable[Union[IPv4Network, IPv6Network]]):
+        by_prefixlen = defaultdict(set)
+
+        for network in networks:
+            family = self.FAMILIES[network.version]
+            prefixlen_key = (family, network.prefixlen, int(network.netmask))
+            by_prefixlen[prefixlen_key].add(int(network.network_address))
+
+        self._index = defaultdict(list)
+        for (family, prefixlen, netmask), net_ints in sorted(
+            by_prefixlen.items(), key=lambda item: item[0][1], reverse=True
+        ):
+            self._index[family].append((netmask, net_ints))
+
+        # the number of distinct networks
+        self.count = sum(len(net_ints) for net_ints in by_prefixlen.values())
+
+    def contains(self, family: int, ip_int: int) -> bool:
+        """ Returns True if any of the networks contains the IP address """
+        for netmask, net_ints in self._index.get(family, ()):
+            if ip_int & netmask in net_ints:
+                return True
+        return False
+
+    def match_count(self, family: int, ip_int: int) -> int:
+        """ Returns the number of networks that contain the IP address """
+        return sum(
+            ip_int & netmask in net_ints
+            for netmask, net_ints in self._index.get(family, ())
         )
 
+
+def mk_ip_matcher(fieldname: str, ip_filters: List[IPFilter], include):
+    """
+    Returns the function that matches the record field IP address against all
+    of the IP filters when `include` is True, or against any of the IP filters
+    otherwise.  The record IP address is parsed once and looked up in the
+    PrefixIndex of the filter networks; a record whose field value is not an IP
+    address does not match.
+    """
+    index = PrefixIndex(ip_filter.ip for ip_filter in ip_filters)
+
+    if include:
+
+        def ip_matcher(rec):
+            if (ip := find_ip(rec[fieldname])) is None:
+                return False
+            return index.match_count(*ip) == index.count
+
+    else:
+
+        def ip_matcher(rec):
+            return (ip := find_ip(rec[fieldname])) is not None and index.contains(*ip)
+
+    return ip_matcher
+
+
+def mk_any_all_matcher(op_filters, include):
+    test_fn = all if include else any
+
+    def any_all_matcher(rec):
+        return test_fn(op_fn(rec) for op_fn in op_filters)
+
+    return any_all_matcher
+
+
+def compile_filters(op_filters, include) -> List[Callable[[Dict], bool]]:
+    """
+    Returns the list of matcher functions for the filters.  The regex filters
+    are grouped by field name into one matcher per field, as are the IP
+    filters; other filters are used as-is.
+    """
+    regex_filters = defaultdict(list)
+    ip_filters = defaultdict(list)
+    matchers = list()
+
+    for op_fn in op_filters:
+        if isinstance(op_fn, RegexFilter):
+            regex_filters[op_fn.fieldname].append(op_fn)
+        elif isinstance(op_fn, IPFilter):
+            ip_filters[op_fn.fieldname].append(op_fn)
+        else:
+            matchers.append(op_fn)
+
+    for fieldname, field_filters in regex_filters.items():
+        matchers.append(mk_regex_matcher(fieldname, field_filters, include))
+
+    for fieldname, field_filters in ip_filters.items():
+        matchers.append(mk_ip_matcher(fieldname, field_filters, include))
+
+    return matchers
+
+
+def create_filter_function(op_filters, include):
+    """
+    Returns the filter function that is True when all of the filters match
+    the record, when `include` is True; or when none of the filters match the
+    record otherwise.
+    """
+    matchers = compile_filters(op_filters, include)
+
+    if include:
+
+        def filter_fn(rec):
+            for matcher in matchers:
+                if not matcher(rec):
+                    return False
+            return True
+
+    else:
+
+        def filter_fn(rec):
+            for matcher in matchers:
+                if matcher(rec):
+                    return False
+            return True
+
+    return filter_fn
+
+
+def read_file_values(filepath, key) -> Set[str]:
+    """
+    Returns the set of values in the file.  A CSV file provides the values in
+    the `key` column; a text (.txt) file provides the first word of each line.
+    """
+    if filepath.endswith(".csv"):
+        with open(filepath) as ifile:
+            return {rec[key] for rec in CommentedCsvReader(ifile)}
+
+    if filepath.endswith(".txt"):
+        with open(filepath) as ifile:
+            return set(TextFileReader(ifile))
+
+    raise ValueError(
+        f"File '{filepath}' not a CSV file.  Only CSV and text (.txt) files are "
+        "supported at this time"
+    )
+
+
+def mk_prefix_filter(filter_values, key):
+    """
+    Returns the filter function that matches the record `key` field IP
+    address using a PrefixIndex of the filter values; or None if the filter
+    values are not all IP addresses or prefixes.
+    """
+    try:
+        index = PrefixIndex(ipaddress.ip_network(value) for value in filter_values)
+    except ValueError:
+        return None
+
     def op_filter(rec):
-        return rec[key] in filter_hostnames
+        return (ip := find_ip(rec[key])) is not None and index.contains(*ip)
+
+    op_filter.index = index
+    return op_filter
+
+
+def mk_file_filter(filepath, key):
+    """
+    Returns the filter function that matches the record `key` field against
+    the values in the file.  The values are stored in a set so that each match
+    costs the same regardless of the number of values in the file.
+
+    When the `key` is the ipaddr field, and the file values are IP addresses
+    or prefixes, the record IP address is matched using a PrefixIndex of the
+    file values; for example a text file of prefixes.
+    """
+    filter_values = read_file_values(filepath, key)
+    op_filter = None
+
+    if key.casefold() == "ipaddr" and filter_values:
+        op_filter = mk_prefix_filter(filter_values, key)
+
+    if not op_filter:
 
-    op_filter.hostnames = filter_hostnames
+        def op_filter(rec):
+            return rec[key] in filter_values
+
+    op_filter.values = filter_values
     op_filter.__doc__ = f"file: {filepath})"
     op_filter.__name__ = op_filter.__doc__
     op_filter.__qualname__ = op_filter.__doc__
@@ -113,6 +372,20 @@ def mk_file_filter(filepath, key):
     return op_filter
 
 
+def create_file_filter(filepath, key):
+    """ Returns the file filter, raising an error if the file is not usable """
+    if not Path(filepath).exists():
+        raise FileNotFoundError(filepath)
+
+    try:
+        return mk_file_filter(filepath, key=key)
+
+    except KeyError:
+        raise ValueError(
+            f"File '{filepath}' does not contain {key} content as expected"
+        )
+
+
 def create_filter(
     constraints: List[AnyStr], field_names: List[AnyStr], include: Optional[bool] = True
 ) -> Callable[[Dict], bool]:
@@ -122,7 +395,9 @@ def create_filter(
     Parameters
     ----------
     constraints:
-        A list of contraint expressions that are in the form "<field-name>=<value>".
+        A list of contraint expressions that are in the form "<field-name>=<value>",
+        "@<filename>" to match the host field against the file, or
+        "<field-name>=@<filename>" to match the field against the file.
 
     field_names:
         A list of known field names
@@ -151,18 +426,8 @@ def create_filter(
         # check for the '@<filename>' filtering use-case first.
 
         if mo := file_reg.match(filter_expr):
-            filepath = mo.group(1)
-            if not Path(filepath).exists():
-                raise FileNotFoundError(filepath)
-
-            try:
-                op_filters.append(mk_file_filter(filepath, key="host"))
-                continue
-
-            except KeyError:
-                raise ValueError(
-                    f"File '{filepath}' does not contain host content as expected"
-                )
+            op_filters.append(create_file_filter(mo.group(1), key="host"))
+            continue
 
         # next check for keyword=value filtering use-case
 
@@ -171,6 +436,12 @@ def create_filter(
 
         fieldn, value = mo.groupdict().values()
 
+        # then the keyword=@<filename> filtering use-case
+
+        if mo := file_reg.match(value):
+            op_filters.append(create_file_filter(mo.group(1), key=fieldn))
+            continue
+
         if fieldn.casefold() == "ipaddr":
             try:
                 value_filter = IPFilter(fieldn, value)
@@ -181,8 +452,7 @@ def create_filter(
 
         op_filters.append(value_filter)
 
-    optest_fn = operator.not_ if include else operator.truth
-    filter_fn = create_filter_function(op_filters, optest_fn)
+    filter_fn = create_filter_function(op_filters, include)
     filter_fn.op_filters = op_filters
     filter_fn.constraints = constraints
 
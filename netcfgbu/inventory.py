@@ -1,14 +1,105 @@
+from typing import Optional, Dict, Iterable, List, Tuple
+from collections.abc import Mapping
 from pathlib import Path
 import os
 
 
 from .logger import get_logger
-from .filtering import create_filter
+from .filtering import create_filter, literal_prefix
 from .filetypes import CommentedCsvReader
 from .config_model import AppConfig, InventorySpec
+from .cache import InventoryCache
 
 
-def load(app_cfg: AppConfig, limits=None, excludes=None):
+class InventoryRecord(Mapping):
+    """
+    An InventoryRecord is a compact, read-only, inventory record used in place
+    of a dict for each inventory row.  The record stores only the tuple of
+    field values, and shares the field name index with all of the other
+    records of the inventory; so that the memory used by each record does not
+    include the field names, nor the dict hash table.
+
+    The record supports the same read access as the dict, for example
+    `rec["host"]`, `rec.get("ipaddr")`, and `dict(rec)`, and compares equal to
+    a dict with the same items.
+    """
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: Dict[str, int], values: Tuple):
+        self._index = index
+        self._values = values
+
+    @staticmethod
+    def make_index(field_names: Iterable[str]) -> Dict[str, int]:
+        """ Returns the field name index to share between records """
+        return {fieldn: col_i for col_i, fieldn in enumerate(field_names)}
+
+    @classmethod
+    def from_dict(
+        cls, index: Dict[str, int], rec: Dict, shared: Optional[Dict] = None
+    ) -> "InventoryRecord":
+        """
+        Returns the record of the dict values.  When the shared dict is given,
+        equal values are stored once for all of the records; for example the
+        os_name value of each row.
+        """
+        values = (rec.get(fieldn) for fieldn in index)
+        if shared is not None:
+            values = (shared.setdefault(value, value) for value in values)
+
+        return cls(index, tuple(values))
+
+    def __getitem__(self, key):
+        return self._values[self._index[key]]
+
+    def get(self, key, default=None):
+        col_i = self._index.get(key)
+        return default if col_i is None else self._values[col_i]
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self)!r})"
+
+
+def select_rows(inv_cache: InventoryCache, limits):
+    """
+    Returns the row numbers of the inventory records that could match the
+    limits, using the inventory cache field indexes; or None if none of the
+    limits can use the indexes.  The limits must still be applied to the
+    returned records.
+    """
+    candidates = None
+
+    for constraint in limits or []:
+        fieldn, _, expr = constraint.partition("=")
+        if fieldn not in inv_cache.indexes or fieldn.casefold() == "ipaddr":
+            continue
+
+        if expr.startswith("@") or not (prefix := literal_prefix(expr)):
+            continue
+
+        rows = inv_cache.find_prefix(fieldn, prefix)
+        if candidates is None or len(rows) < len(candidates):
+            candidates = rows
+
+    return candidates
+
+
+def load(app_cfg: AppConfig, limits=None, excludes=None) -> List[InventoryRecord]:
+    """
+    Returns the list of inventory records, from the inventory file, that
+    match the limits and do not match the excludes.  Each record is an
+    InventoryRecord.
+    """
 
     inventory_file = Path(app_cfg.defaults.inventory)
     if not inventory_file.exists():
@@ -16,8 +107,13 @@ def load(app_cfg: AppConfig, limits=None, excludes=None):
             f"Inventory file does not exist: {inventory_file.absolute()}"
         )
 
-    iter_recs = CommentedCsvReader(inventory_file.open())
-    field_names = iter_recs.fieldnames
+    if app_cfg.cache.inventory:
+        inv_cache = InventoryCache.load(app_cfg.defaults.configs_dir, inventory_file)
+        iter_recs = inv_cache.records(select_rows(inv_cache, limits))
+        field_names = inv_cache.fieldnames
+    else:
+        iter_recs = CommentedCsvReader(inventory_file.open())
+        field_names = iter_recs.fieldnames
 
     if limits:
         filter_fn = create_filter(constraints=limits, field_names=field_names)
@@ -29,7 +125,9 @@ def load(app_cfg: AppConfig, limits=None, excludes=None):
         )
         iter_recs = filter(filter_fn, iter_recs)
 
-    return list(iter_recs)
+    index = InventoryRecord.make_index(field_names or [])
+    shared = dict()
+    return [InventoryRecord.from_dict(index, rec, shared) for rec in iter_recs]
 
 
 def build(inv_def: InventorySpec) -> int:
@@ -8,7 +8,7 @@ the netcfgbu tool.
 # System Imports
 # -----------------------------------------------------------------------------
 
-from typing import Optional, List, Dict, AnyStr
+from typing import Optional, List, Dict, AnyStr, Set, Tuple
 import asyncio
 from urllib.parse import urlparse
 
@@ -36,6 +36,12 @@ class JumpHost(object):
 
     available = list()
 
+    # the routing table of inventory record route key, see `route_key`, to the
+    # JumpHost instance, or None, built by init_jumphosts so that the filters
+    # are only run once.
+
+    routes: Dict[Tuple, Optional["JumpHost"]] = dict()
+
     def __init__(self, spec: JumphostSpec, field_names: List[AnyStr]):
         """
         Prepare a jump host instance for potential use.  This method
@@ -51,31 +57,49 @@ class JumpHost(object):
         """
         self._spec = spec
         self.filters = list()
-        self._conn = None
+        self._conn_args = None
+        self._conns: List[Optional[asyncssh.SSHClientConnection]] = list()
+        self._loads: List[int] = list()
+        self._reconnects: Dict[int, asyncio.Task] = dict()
+        self._tasks: Set[asyncio.Task] = set()
+        self._connected = False
+        self.connecting: Optional[asyncio.Future] = None
+        self.startups_sem4: Optional[asyncio.Semaphore] = None
         self._init_filters(field_names)
 
     @property
     def tunnel(self):
         """
-        Returns the SSH client connection of the jump-host for use as `tunnel` when
-        connecting to a target device.  If the SSH client does not exist, then raise
-        a RuntimeError.
+        Returns the jump-host for use as `tunnel` when connecting to a target
+        device; the tunnel connections are distributed across the jump-host
+        pool of SSH client connections.  If the jump-host was not connected,
+        then raise a RuntimeError.
         """
-        if not self.is_active:
+        if not self._connected:
             raise RuntimeError(
                 f"Attempting to use JumpHost {self.name}, but not connected"
             )
-        return self._conn
+        return self
 
     @property
     def name(self):
         """ Returns the string-name of the jump host"""
         return self._spec.name
 
+    @property
+    def max_sessions(self) -> Optional[int]:
+        """ Returns the maximum number of concurrent sessions, if limited """
+        return self._spec.max_sessions
+
     @property
     def is_active(self):
         """ Return True if the jumphost is connected, False otherwise """
-        return bool(self._conn)
+        return any(self._conns)
+
+    @property
+    def loads(self) -> List[int]:
+        """ Returns the number of open tunnels on each of the pool connections """
+        return list(self._loads)
 
     def _init_filters(self, field_names):
         """ Called only by init, prepares the jump host filter functions to later use """
@@ -97,7 +121,9 @@ class JumpHost(object):
     async def connect(self):
         """
         Connects to the jumphost system so that it can be used later as the
-        tunnel to connect to other devices.
+        tunnel to connect to other devices.  The jumphost `connections` pool
+        of SSH client connections are opened concurrently; the jumphost is
+        usable if any of them connect, the others are reconnected on use.
         """
         proxy_parts = urlparse("ssh://" + self._spec.proxy)
 
@@ -108,11 +134,153 @@ class JumpHost(object):
         if proxy_parts.port:
             conn_args["port"] = proxy_parts.port
 
-        async def connect_to_jh():
-            """ obtain the SSH client connection """
-            self._conn = await asyncssh.connect(**conn_args)
+        self._conn_args = conn_args
+        pool_size = self._spec.connections
+        self._conns = [None] * pool_size
+        self._loads = [0] * pool_size
+
+        # the number of concurrent tunnel connection setups through this jump
+        # host is limited so as not to exceed the jump host sshd MaxStartups.
+
+        if self._spec.max_startups:
+            self.startups_sem4 = asyncio.Semaphore(self._spec.max_startups)
+
+        results = await asyncio.gather(
+            *(self._connect_member(index) for index in range(pool_size)),
+            return_exceptions=True,
+        )
+
+        if not self.is_active:
+            raise results[0]
+
+        self._connected = True
+
+    async def _connect_member(self, index: int):
+        """ obtain the SSH client connection for the pool member at index """
+
+        conn = await asyncio.wait_for(
+            asyncssh.connect(**self._conn_args), timeout=self._spec.timeout
+        )
+        self._conns[index] = conn
+        self._loads[index] = 0
+        self._spawn(self._watch_member(index, conn))
+
+    async def _watch_member(self, index: int, conn):
+        """ marks the pool member as dead when the SSH client connection closes """
+        await conn.wait_closed()
+        if self._conns[index] is conn:
+            self._conns[index] = None
+            get_logger().warning(
+                f"JUMPHOST: {self.name} connection {index} closed, will reconnect"
+            )
+
+    async def _reconnect_member(self, index: int):
+        log = get_logger()
+        try:
+            await self._connect_member(index)
+            log.info(f"JUMPHOST: reconnected to {self.name}")
+
+        except (asyncio.TimeoutError, asyncssh.Error, OSError) as exc:
+            errmsg = str(exc) or exc.__class__.__name__
+            log.error(f"JUMPHOST: reconnect to {self.name} failed: {errmsg}")
+
+        finally:
+            del self._reconnects[index]
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """
+        Start the background task, keeping a reference to it until it is done
+        so that it can be cancelled by `close`, and its exception retrieved.
+        """
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and (exc := task.exception()):
+            get_logger().error(f"JUMPHOST: {self.name} task failed: {exc!r}")
+
+    def _reconnect_dead(self) -> List[asyncio.Task]:
+        """ starts, if not already started, reconnecting the dead pool members """
+        for index, conn in enumerate(self._conns):
+            if conn is None and index not in self._reconnects:
+                task = self._spawn(self._reconnect_member(index))
+                self._reconnects[index] = task
+
+        return list(self._reconnects.values())
+
+    async def _least_loaded(self) -> int:
+        """
+        Returns the index of the live pool member with the fewest open tunnels.
+        Dead members are reconnected in the background, unless all of the
+        members are dead, in which case the reconnects are awaited.
+        """
+        if reconnects := self._reconnect_dead():
+            if not self.is_active:
+                await asyncio.gather(*reconnects)
+
+        live = [index for index, conn in enumerate(self._conns) if conn]
+        if not live:
+            raise RuntimeError(
+                f"Attempting to use JumpHost {self.name}, but not connected"
+            )
+
+        return min(live, key=lambda index: self._loads[index])
+
+    async def create_connection(self, session_factory, remote_host, remote_port):
+        """
+        Implements the asyncssh tunnel interface used when connecting to a
+        target device.  The tunnel is opened on the least loaded of the pool
+        SSH client connections.
+        """
+        index = await self._least_loaded()
+        conn = self._conns[index]
+        chan, session = await conn.create_connection(
+            session_factory, remote_host, remote_port
+        )
+
+        self._loads[index] += 1
+
+        # the load is not released if the pool member has since reconnected,
+        # since the load of the new connection started at zero.
+
+        def on_closed(_fut):
+            if self._conns[index] is conn:
+                self._loads[index] -= 1
 
-        await asyncio.wait_for(connect_to_jh(), timeout=self._spec.timeout)
+        self._spawn(chan.wait_closed()).add_done_callback(on_closed)
+        return chan, session
+
+    async def close(self):
+        """
+        Close the pool of SSH client connections, and cancel the background
+        tasks watching and reconnecting them.
+        """
+        self._connected = False
+        if self.connecting and not self.connecting.done():
+            self.connecting.cancel()
+
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+
+        for index, conn in enumerate(self._conns):
+            self._conns[index] = None
+            if conn:
+                conn.close()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def wait_connected(self):
+        """
+        Waits for the jump host connect to complete, if in progress.  The
+        Caller then uses `tunnel`, which raises a RuntimeError if the jump
+        host did not connect.
+        """
+        if self.connecting and not self.connecting.done():
+            await asyncio.wait([self.connecting])
 
     def filter(self, inv_rec):
         """
@@ -143,7 +311,8 @@ def init_jumphosts(jumphost_specs: List[JumphostSpec], inventory: List[Dict]):
     inventory:
         List of inventory records; these are used to determine which, if any,
         of the configured jump hosts are actually required for use given any
-        provided inventory filtering.
+        provided inventory filtering.  The jump host used by each inventory
+        record is stored in the JumpHost.routes table for use by get_jumphost.
     """
     field_names = inventory[0].keys()
 
@@ -152,40 +321,76 @@ def init_jumphosts(jumphost_specs: List[JumphostSpec], inventory: List[Dict]):
 
     jh_list = [JumpHost(spec, field_names=field_names) for spec in jumphost_specs]
 
-    req_jh = {
-        use_jh
+    JumpHost.routes = {
+        route_key(rec): first(jh for jh in jh_list if jh.filter(rec))
         for rec in inventory
-        if (use_jh := first(jh for jh in jh_list if jh.filter(rec)))
     }
 
-    JumpHost.available = list(req_jh)
+    # the jump hosts that are required, in the configured order.
 
+    req_jh = set(JumpHost.routes.values())
+    JumpHost.available = [jh for jh in jh_list if jh in req_jh]
 
-async def connect_jumphosts():
+
+def start_jumphosts() -> asyncio.Future:
     """
-    This coroutine is used to connect to all of the required jump host servers.  This
-    should be called before attempting to run any of the SSH device tasks, such as
-    login or backup.
+    Starts connecting to all of the required jump host servers concurrently.
+    The device tasks can be started without waiting for the jump hosts; a
+    device that requires a jump host waits only on that jump host using
+    `JumpHost.wait_connected`.
 
     Returns
     -------
-    True if all required jump host servers are connected.
-    False otherwise; check log errors for details.
+    A future whose result is True if all required jump host servers are
+    connected, False otherwise; check log errors for details.
     """
     log = get_logger()
-    ok = True
 
-    for jh in JumpHost.available:
+    async def connect_jh(jh: JumpHost):
         try:
             await jh.connect()
             log.info(f"JUMPHOST: connected to {jh.name}")
+            return True
 
-        except (asyncio.TimeoutError, asyncssh.Error) as exc:
+        except (asyncio.TimeoutError, asyncssh.Error, OSError) as exc:
             errmsg = str(exc) or exc.__class__.__name__
             log.error(f"JUMPHOST: connect to {jh.name} failed: {errmsg}")
-            ok = False
+            return False
+
+    for jh in JumpHost.available:
+        jh.connecting = asyncio.ensure_future(connect_jh(jh))
+
+    async def all_connected():
+        return all(await asyncio.gather(*(jh.connecting for jh in JumpHost.available)))
 
-    return ok
+    return asyncio.ensure_future(all_connected())
+
+
+async def close_jumphosts():
+    """ This coroutine is used to close all of the required jump hosts """
+    await asyncio.gather(*(jh.close() for jh in JumpHost.available))
+
+
+async def connect_jumphosts():
+    """
+    This coroutine is used to connect to all of the required jump host servers,
+    concurrently, and wait for them to complete.
+
+    Returns
+    -------
+    True if all required jump host servers are connected.
+    False otherwise; check log errors for details.
+    """
+    return await start_jumphosts()
+
+
+def route_key(inv_rec: dict) -> Tuple:
+    """
+    Returns the key of the inventory record in the routing table; the host
+    and the ipaddr, so that records with the same host name but a different
+    ipaddr, and so possibly a different jump host, each have their own route.
+    """
+    return inv_rec.get("host"), inv_rec.get("ipaddr")
 
 
 def get_jumphost(inv_rec: dict) -> Optional[JumpHost]:
@@ -194,4 +399,9 @@ def get_jumphost(inv_rec: dict) -> Optional[JumpHost]:
     for the given inventory record.  If this record does not require the
     use of a jumphost, then return None.
     """
-    return first(jh for jh in JumpHost.available if jh.filter(inv_rec))
+    try:
+        return JumpHost.routes[route_key(inv_rec)]
+
+    except KeyError:
+        # the record was not part of the inventory used to init the routes.
+        return first(jh for jh in JumpHost.available if jh.filter(inv_rec))
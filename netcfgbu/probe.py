@@ -1,6 +1,9 @@
 """
-This module contains the probe coroutine used to validate that a target device
-has a given port open.
+This module contains the probe coroutines used to validate that a target device
+has a given port open, or that the port is an SSH server.  Each probe uses a
+file descriptor while the connection is in progress, so the number of
+concurrent probes is limited to a budget derived from the process open files
+limit (RLIMIT_NOFILE).
 """
 
 # -----------------------------------------------------------------------------
@@ -9,7 +12,32 @@ has a given port open.
 
 import asyncio
 
-__all__ = ["probe"]
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from . import consts
+
+__all__ = ["probe", "probe_ssh_banner", "probe_fd_budget", "NoSSHBanner"]
+
+# the number of file descriptors reserved for other uses, for example the log
+# files, the inventory file, and the asyncio event loop.
+
+FD_RESERVED = 64
+
+# the maximum number of lines the server may send before the SSH identification
+# string, per RFC 4253 section 4.2.
+
+BANNER_MAX_LINES = 20
+
+
+class NoSSHBanner(ConnectionError):
+    """ The port is open, but the server did not send an SSH identification """
 
 
 # -----------------------------------------------------------------------------
@@ -45,7 +73,12 @@ async def probe(host, timeout: int, port=22, raise_exc=False) -> bool:
     coro = loop.create_connection(asyncio.BaseProtocol, host=host, port=port)
 
     try:
-        await asyncio.wait_for(coro, timeout=timeout)
+        transport, _ = await asyncio.wait_for(coro, timeout=timeout)
+
+        # the connection is only used to determine that the port is open,
+        # close it immediately so that the file descriptor is released.
+
+        transport.close()
         return True
 
     except asyncio.TimeoutError:
@@ -53,3 +86,81 @@ async def probe(host, timeout: int, port=22, raise_exc=False) -> bool:
             raise
 
     return False
+
+
+async def probe_ssh_banner(
+    host, timeout: int, port=22, banner_timeout=consts.DEFAULT_PROBE_BANNER_TIMEOUT
+) -> str:
+    """
+    Coroutine used to determine if a host port is an SSH server, by reading the
+    SSH identification string, for example "SSH-2.0-OpenSSH_8.2p1 Ubuntu".
+    This confirms that the SSH server is responding, rather than only that the
+    port accepts connections, for example via a load balancer or by a hung
+    sshd process.
+
+    Parameters
+    ----------
+    host: str
+        The host name or IP address
+
+    timeout: int
+        The connect timeout in seconds.
+
+    port: int
+        The port to check, defaults to SSH(22)
+
+    banner_timeout: int
+        The timeout in seconds to receive the SSH identification once connected.
+
+    Returns
+    -------
+    str - the server software version and any comments from the SSH
+    identification string, for example "OpenSSH_8.2p1 Ubuntu".
+
+    Raises
+    ------
+    asyncio.TimeoutError
+        When the connect or the SSH identification exceeds the timeout.
+
+    NoSSHBanner
+        When the server does not send an SSH identification string.
+    """
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, port), timeout=timeout
+    )
+
+    async def read_banner():
+        for _ in range(BANNER_MAX_LINES):
+            if not (line := await reader.readline()):
+                break
+
+            if line.startswith(b"SSH-"):
+                ident = line.decode("utf-8", errors="replace").strip()
+                proto_version, _, software = ident[4:].partition("-")
+                if proto_version not in ("2.0", "1.99"):
+                    raise NoSSHBanner(f"unsupported SSH version: {ident}")
+                return software
+
+        raise NoSSHBanner("no SSH identification")
+
+    try:
+        return await asyncio.wait_for(read_banner(), timeout=banner_timeout)
+
+    finally:
+        writer.close()
+
+
+def probe_fd_budget(max_probes: int) -> int:
+    """
+    Returns the number of probes that can be in progress at once; no more
+    than `max_probes`, and no more than the process open files soft limit less
+    the number reserved for other uses.
+    """
+    if not resource:  # pragma: no cover
+        return max_probes
+
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return max_probes
+
+    return max(min(max_probes, soft_limit - FD_RESERVED), 1)
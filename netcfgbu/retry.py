@@ -0,0 +1,107 @@
+"""
+This module contains the code used to retry the backup of a host when it fails
+with a transient error, for example a timeout or a connection reset by a busy
+device.  The retry policy is defined for each OS name, and the delay before
+each retry increases exponentially with a random jitter; so that the retries
+of many hosts that failed together are spread out.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Optional, Dict, Tuple, Type
+import random
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from .config_model import AppConfig, RetrySpec, get_error_class
+from .os_specs import get_os_spec
+from .scheduler import RetryFn
+from .logger import get_logger
+
+__all__ = ["get_error_class", "RetryPolicy", "make_retry"]
+
+
+# -----------------------------------------------------------------------------
+#
+#                               CODE BEGINS
+#
+# -----------------------------------------------------------------------------
+
+
+class RetryPolicy(object):
+    """
+    A RetryPolicy decides if, and after what delay, a failed attempt is
+    retried.  The delay starts at the backoff value and doubles for each
+    attempt, up to the max backoff; the jitter reduces the delay by up to
+    that fraction of the delay, at random.
+    """
+
+    def __init__(self, spec: RetrySpec):
+        self.attempts = spec.attempts
+        self.backoff = spec.backoff
+        self.max_backoff = spec.max_backoff
+        self.jitter = spec.jitter
+        self.errors: Tuple[Type[Exception], ...] = tuple(
+            get_error_class(name) for name in spec.errors
+        )
+
+    def delay(self, exc: Exception, attempt: int) -> Optional[float]:
+        """
+        Returns the delay before the next attempt, or None if the failed
+        attempt is not retried.
+
+        Parameters
+        ----------
+        exc:
+            The exception raised by the failed attempt.
+
+        attempt:
+            The number of attempts made, including the failed attempt.
+        """
+        if attempt >= self.attempts or not isinstance(exc, self.errors):
+            return None
+
+        backoff = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return backoff * (1 - self.jitter * random.random())
+
+
+def make_retry(app_cfg: AppConfig, attempts: Dict[str, int]) -> Optional[RetryFn]:
+    """
+    Returns the scheduler retry function that uses the retry policy of each
+    inventory record OS name; or None if none of the OS names retry.
+
+    Parameters
+    ----------
+    app_cfg:
+        The app config.
+
+    attempts:
+        The retry function updates this dict with the number of attempts
+        made for each host that is retried.
+    """
+    os_specs = (app_cfg.os_name or {}).values()
+    if not any(os_spec.retry.attempts > 1 for os_spec in os_specs):
+        return None
+
+    policies = dict()
+    log = get_logger()
+
+    def retry(rec, exc, attempt):
+        os_name = rec["os_name"]
+        if not (policy := policies.get(os_name)):
+            policy = policies[os_name] = RetryPolicy(get_os_spec(rec, app_cfg).retry)
+
+        if (delay := policy.delay(exc, attempt)) is not None:
+            attempts[rec["host"]] = attempt + 1
+            log.warning(
+                f"RETRY: {rec['host']} attempt {attempt} failed "
+                f"({exc.__class__.__name__}), retry in {delay:.1f}s"
+            )
+
+        return delay
+
+    return retry
@@ -0,0 +1,345 @@
+"""
+This module contains the scheduler used to execute a coroutine for each of the
+inventory records using a fixed number of workers.  This is used in place of
+creating a task for every inventory record up front, so that the memory used
+is bounded by the number of workers rather than by the size of the inventory.
+
+The scheduler also supports keyed limits, for example the number of concurrent
+sessions through a given jump host, or to a given site.  An item whose key is
+at its limit is set aside so that the workers continue to process other items
+rather than waiting on the busy key.
+
+The items can be provided by an async iterable, so that the results of one
+scheduler can be pipelined into another; for example the reachable hosts
+found by the probe are backed up as they are found.
+
+An item whose task fails can be retried, as decided by the retry function.
+The item is re-queued once its retry delay expires, rather than holding a
+worker while it waits.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from collections import Counter, defaultdict, deque, abc
+import asyncio
+
+__all__ = ["as_completed", "KeyLimitFn", "RetryFn"]
+
+
+# -----------------------------------------------------------------------------
+#
+#                               CODE BEGINS
+#
+# -----------------------------------------------------------------------------
+
+
+# A KeyLimitFn is called with an item and returns the tuple (key, limit) when
+# the item is subject to the limit, or None otherwise.
+
+KeyLimitFn = Callable[[Any], Optional[Tuple[Hashable, int]]]
+
+# A RetryFn is called with an item, the exception raised by its task, and the
+# number of attempts made; and returns the delay in seconds before the item is
+# retried, or None if the item is not retried.
+
+RetryFn = Callable[[Any, Exception, int], Optional[float]]
+
+_DONE = object()
+_PENDING = object()
+
+
+class _Scheduler(object):
+    """
+    Maintains the state of the items waiting to be processed by the workers.
+    """
+
+    def __init__(
+        self,
+        items: Union[Iterable, AsyncIterable],
+        limits: Sequence[KeyLimitFn],
+        max_deferred,
+    ):
+        self.exhausted = False
+        self.limits = limits
+        self.in_use = Counter()
+        self.ready = deque()
+        self.deferred = defaultdict(deque)
+        self.deferred_n = 0
+        self.max_deferred = max_deferred
+        self.changed = asyncio.Condition()
+
+        # the scheduler is not done until the items waiting to be retried
+        # have been retried.  The attempts are the number of attempts made
+        # for each item being retried.
+
+        self.attempts = dict()
+        self.retry_timers = set()
+
+        # an async iterable of items is consumed by the feed coroutine into
+        # the bounded fed deque, from which the workers pull the items.
+
+        if isinstance(items, abc.AsyncIterable):
+            self.iter_items = None
+            self.aiter_items = items
+            self.fed = deque()
+            self.feeding = True
+            self.feed_exc = None
+        else:
+            self.iter_items = iter(items)
+            self.aiter_items = None
+
+    async def feed(self):
+        """ consume the async iterable of items into the fed deque """
+        try:
+            async for item in self.aiter_items:
+                async with self.changed:
+                    while len(self.fed) >= self.max_deferred:
+                        await self.changed.wait()
+
+                    self.fed.append(item)
+                    self.changed.notify_all()
+
+        except Exception as exc:
+            self.feed_exc = exc
+
+        finally:
+            async with self.changed:
+                self.feeding = False
+                self.changed.notify_all()
+
+    def _pull(self):
+        """
+        Returns the next item from the items, or _PENDING if the next item has
+        not yet been fed.  Raises StopIteration when there are no more items.
+        """
+        if self.iter_items is not None:
+            return next(self.iter_items)
+
+        if self.fed:
+            self.changed.notify_all()
+            return self.fed.popleft()
+
+        if self.feed_exc:
+            raise self.feed_exc
+
+        if self.feeding:
+            return _PENDING
+
+        raise StopIteration
+
+    def _item_keys(self, item) -> List[Tuple[Hashable, int]]:
+        return [key_limit for fn in self.limits if (key_limit := fn(item))]
+
+    def _admit(self, item, keys) -> bool:
+        """
+        Returns True if the item can be processed now, and if so uses the item
+        keys.  Otherwise the item is deferred on the first busy key.
+        """
+        for key, limit in keys:
+            if self.in_use[key] >= limit:
+                self.deferred[key].append((item, keys))
+                self.deferred_n += 1
+                return False
+
+        for key, _ in keys:
+            self.in_use[key] += 1
+
+        return True
+
+    def _next_ready(self):
+        while self.ready:
+            item, keys = self.ready.popleft()
+            if self._admit(item, keys):
+                return item, keys
+
+        while not self.exhausted and self.deferred_n < self.max_deferred:
+            try:
+                item = self._pull()
+            except StopIteration:
+                self.exhausted = True
+                break
+
+            if item is _PENDING:
+                break
+
+            if self._admit(item, keys := self._item_keys(item)):
+                return item, keys
+
+        return None
+
+    async def next_item(self):
+        """
+        Returns the next item and keys that can be processed, waiting if
+        necessary for a busy key to be released, or for the next item to be
+        fed.  Returns _DONE when there are no more items.
+        """
+        async with self.changed:
+            while True:
+                if next_item := self._next_ready():
+                    return next_item
+
+                if self.exhausted and not (self.deferred_n or self.retry_timers):
+                    return _DONE
+
+                await self.changed.wait()
+
+    async def release(self, keys):
+        """
+        Release the keys used by a completed item, making the items deferred
+        on those keys ready for processing.
+        """
+        for key, _ in keys:
+            self.in_use[key] -= 1
+            if deferred := self.deferred.get(key):
+                self.ready.append(deferred.popleft())
+                self.deferred_n -= 1
+                if not deferred:
+                    del self.deferred[key]
+
+        async with self.changed:
+            self.changed.notify_all()
+
+    def retry_later(self, item, keys, attempt: int, delay: float):
+        """ Re-queue the item, for its next attempt, after the delay """
+        self.attempts[id(item)] = attempt + 1
+
+        def requeue():
+            self.retry_timers.discard(timer)
+            self.ready.append((item, keys))
+            asyncio.ensure_future(self.notify())
+
+        timer = asyncio.get_running_loop().call_later(delay, requeue)
+        self.retry_timers.add(timer)
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+
+async def as_completed(
+    items: Union[Iterable, AsyncIterable],
+    task_fn: Callable[[Any], Awaitable],
+    workers: int,
+    limits: Optional[Sequence[KeyLimitFn]] = None,
+    retry: Optional[RetryFn] = None,
+) -> AsyncIterable[Tuple[Any, asyncio.Future]]:
+    """
+    This async generator is used to execute the `task_fn` coroutine function
+    for each of the items using a fixed number of workers.  Each worker pulls
+    the next item from the items iterable only when it is ready to execute it,
+    so the items can be provided lazily, for example by a generator.
+
+    Parameters
+    ----------
+    items:
+        An iterable of items, for example inventory records; or an async
+        iterable, for example the records produced by another scheduler.
+
+    task_fn:
+        A function that is called with an item and returns an awaitable, for
+        example a coroutine.
+
+    workers:
+        The maximum number of items processed concurrently.
+
+    limits:
+        An optional list of KeyLimitFn functions.  An item is only processed
+        when each of its keys is used by fewer than the key limit of items.
+
+    retry:
+        An optional RetryFn function, called when the task for an item raises
+        an exception.  When the function returns a delay the item is retried
+        after the delay, and is not yielded until its last attempt completes.
+
+    Yields
+    ------
+    Tuple[item, asyncio.Future]
+        The item and a completed future, in the order in which the items
+        completed.  The Caller should use `future.result()` to obtain the
+        return value of the task or raise the exception it raised.
+
+    Examples
+    --------
+        async for rec, task in as_completed(inventory, probe_host, workers=100):
+            try:
+                probe_ok = task.result()
+            except OSError as exc:
+                ...
+    """
+    loop = asyncio.get_running_loop()
+    sched = _Scheduler(items, limits=limits or [], max_deferred=workers)
+    feed_task = sched.aiter_items and asyncio.ensure_future(sched.feed())
+
+    # the completed queue is bounded so that the workers do not get ahead of
+    # the Caller consuming the results.
+
+    completed = asyncio.Queue(maxsize=workers)
+
+    async def worker():
+        try:
+            while (next_item := await sched.next_item()) is not _DONE:
+                item, keys = next_item
+                attempt = sched.attempts.pop(id(item), 1)
+                fut = loop.create_future()
+                try:
+                    fut.set_result(await task_fn(item))
+
+                except asyncio.CancelledError:
+                    raise
+
+                except Exception as exc:
+                    if retry and (delay := retry(item, exc, attempt)) is not None:
+                        sched.retry_later(item, keys, attempt, delay)
+                        await sched.release(keys)
+                        continue
+
+                    fut.set_exception(exc)
+
+                await sched.release(keys)
+                await completed.put((item, fut))
+
+        except Exception as exc:
+            # the items iterable raised an exception, pass it to the Caller.
+            await completed.put((_DONE, exc))
+            return
+
+        await completed.put((_DONE, None))
+
+    worker_tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+    running = len(worker_tasks)
+
+    try:
+        while running:
+            item, fut = await completed.get()
+            if item is _DONE:
+                running -= 1
+                if fut is not None:
+                    raise fut
+                continue
+
+            yield item, fut
+
+    finally:
+        for task in worker_tasks:
+            task.cancel()
+
+        for timer in sched.retry_timers:
+            timer.cancel()
+
+        if feed_task:
+            feed_task.cancel()
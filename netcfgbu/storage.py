@@ -0,0 +1,605 @@
+"""
+This module contains the code used to store the device configuration content
+into the configs directory.
+"""
+
+# -----------------------------------------------------------------------------
+# System Imports
+# -----------------------------------------------------------------------------
+
+from typing import Optional, Set, List, Tuple, Dict, Callable, Union
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+import asyncio
+import codecs
+import filecmp
+import os
+import re
+import shutil
+
+# -----------------------------------------------------------------------------
+# Public Imports
+# -----------------------------------------------------------------------------
+
+import aiofiles
+import aiofiles.os
+
+# -----------------------------------------------------------------------------
+# Private Imports
+# -----------------------------------------------------------------------------
+
+from .config_model import LinterSpec, StorageSpec
+from . import consts
+
+__all__ = [
+    "get_cache_dir",
+    "remove_temp_files",
+    "ConfigStreamWriter",
+    "save_content",
+    "save_counts",
+    "set_durability",
+    "setup_storage",
+    "BulkWriter",
+    "get_writer",
+    "close_writer",
+    "when_saved",
+    "sync_configs",
+]
+
+# the number of config files "changed" and "unchanged" by the saves of this
+# run; a config file is only written when its content has changed so that the
+# file modification time, and the vcs, reflect only actual changes.
+
+save_counts = Counter()
+
+# the durability policy used when saving config files:
+#   "none" - the config files are not fsync'd.
+#   "file" - each config file, and its directory, is fsync'd when saved.
+#   "batch" - the config files saved are fsync'd, with one fsync of each
+#             directory, by `sync_configs` at the end of the run.
+
+_durability = consts.DEFAULT_STORAGE_DURABILITY
+_unsynced: Set[Path] = set()
+
+# the BulkWriter used by `save_content`, and the size of its queue.
+
+_writer: Optional["BulkWriter"] = None
+_write_queue = consts.DEFAULT_STORAGE_WRITE_QUEUE
+
+# the cache directory within the configs directory, which is ignored by the
+# vcs; the temporary files are written into it.  The _temp_dirs are the cache
+# directories known to exist.
+
+CACHE_DIRNAME = ".netcfgbu"
+_temp_dirs: Set[Path] = set()
+
+
+# -----------------------------------------------------------------------------
+#
+#                               CODE BEGINS
+#
+# -----------------------------------------------------------------------------
+
+
+def set_durability(durability: str):
+    """ Set the durability policy used when saving config files """
+    global _durability
+    _durability = durability
+    _unsynced.clear()
+
+
+def setup_storage(storage: StorageSpec, configs_dir=None) -> int:
+    """
+    Setup the saving of config files as defined by the storage spec.  When the
+    configs directory is given, the temporary files left behind by an
+    interrupted run are removed; returns the number removed.
+    """
+    global _write_queue
+    set_durability(storage.durability)
+    _write_queue = storage.write_queue
+    _discard_writer()
+
+    return remove_temp_files(configs_dir) if configs_dir else 0
+
+
+def _fsync_path(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_configs() -> int:
+    """
+    When using the "batch" durability policy, fsync the config files saved
+    since the last call, and then each of their directories once.  Returns
+    the number of config files synced.
+    """
+    saved_files = list(_unsynced)
+    _unsynced.clear()
+
+    for save_file in saved_files:
+        try:
+            _fsync_path(save_file)
+        except FileNotFoundError:
+            continue
+
+    for save_dir in {save_file.parent for save_file in saved_files}:
+        _fsync_path(save_dir)
+
+    return len(saved_files)
+
+
+def get_cache_dir(configs_dir) -> Path:
+    """
+    Returns the cache directory within the configs directory, creating the
+    directory if it does not exist.
+    """
+    cache_dir = Path(configs_dir) / CACHE_DIRNAME
+    if not cache_dir.is_dir():
+        cache_dir.mkdir(parents=True)
+        cache_dir.joinpath(".gitignore").write_text("*\n")
+
+    return cache_dir
+
+
+def _temp_file(save_file: Path) -> Path:
+    """
+    Returns the temporary file used to write the save-file content.  The
+    temporary file is within the cache directory, so that it is ignored by the
+    vcs, and on the same filesystem as the save-file so that the rename is
+    atomic.  The cache directory is not created if the save-file directory
+    does not exist, so that writing the temporary file fails.
+    """
+    temp_dir = save_file.parent / CACHE_DIRNAME
+    if temp_dir not in _temp_dirs and save_file.parent.is_dir():
+        get_cache_dir(save_file.parent)
+        _temp_dirs.add(temp_dir)
+
+    return temp_dir / f"{save_file.name}.tmp"
+
+
+def remove_temp_files(configs_dir) -> int:
+    """
+    Remove the temporary files left behind by an interrupted run, returning
+    the number removed.
+    """
+    configs_dir = Path(configs_dir)
+    temp_files = chain(
+        configs_dir.joinpath(CACHE_DIRNAME).glob("*.cfg.tmp"),
+        configs_dir.glob(".*.cfg.tmp"),
+    )
+    removed = 0
+
+    for temp_file in temp_files:
+        try:
+            temp_file.unlink()
+            removed += 1
+        except FileNotFoundError:
+            continue
+
+    return removed
+
+
+def _copy_mode(save_file: Path, temp_file: Path):
+    """ copy the mode of the existing save-file, if any, to the temporary file """
+    try:
+        shutil.copymode(save_file, temp_file)
+    except FileNotFoundError:
+        pass
+
+
+def _fsync_file(temp_file: Path):
+    """ fsync the written temporary file, if required by the durability policy """
+    if _durability == "file":
+        _fsync_path(temp_file)
+
+
+def _same_content(save_file: Path, content: Union[bytes, Path]) -> bool:
+    """
+    Returns True if the save-file exists with the same content as the bytes,
+    or as the file, given.
+    """
+    try:
+        if isinstance(content, Path):
+            return filecmp.cmp(content, save_file, shallow=False)
+
+        if save_file.stat().st_size != len(content):
+            return False
+
+        with open(save_file, mode="rb") as ifile:
+            return ifile.read() == content
+
+    except FileNotFoundError:
+        return False
+
+
+def _count_save(save_file: Path, changed: bool):
+    """ account for the save-file written, or not, by a save """
+    save_counts["changed" if changed else "unchanged"] += 1
+    if changed and _durability == "batch":
+        _unsynced.add(save_file)
+
+
+def _write_file(save_file: Path, content: Union[bytes, Path]) -> bool:
+    """
+    Write the content into the save-file, unless the save-file already has the
+    same content; returns True if the save-file was written, False otherwise.
+
+    The content is either the bytes, which are written into a temporary file,
+    or the temporary file already written by a ConfigStreamWriter.  The
+    temporary file is then renamed to the save-file, an atomic operation, so
+    that the save-file is never left partially written.  The temporary file is
+    removed when it is not renamed.
+    """
+    from_file = isinstance(content, Path)
+    temp_file = content if from_file else None
+
+    try:
+        if _same_content(save_file, content):
+            if from_file:
+                temp_file.unlink()
+            return False
+
+        if not from_file:
+            temp_file = _temp_file(save_file)
+            with open(temp_file, mode="wb") as ofile:
+                ofile.write(content)
+
+        _fsync_file(temp_file)
+        _copy_mode(save_file, temp_file)
+        os.replace(temp_file, save_file)
+
+    except BaseException:
+        if temp_file and temp_file.exists():
+            temp_file.unlink()
+        raise
+
+    return True
+
+
+def _write_batch(batch: List[Tuple[Path, Union[bytes, Path]]]) -> List:
+    """
+    Write the batch of save-file contents, returning for each either the
+    `_write_file` result or the exception raised.  When using the "file"
+    durability policy, each directory is fsync'd once for the batch.
+    """
+    results = list()
+
+    for save_file, content in batch:
+        try:
+            results.append(_write_file(save_file, content))
+        except Exception as exc:
+            results.append(exc)
+
+    if _durability == "file":
+        written = (save_file for (save_file, _), res in zip(batch, results) if res)
+        for save_dir in {save_file.parent for save_file in written}:
+            _fsync_path(save_dir)
+
+    return results
+
+
+class BulkWriter(object):
+    """
+    A BulkWriter is used to write the config files using a single dedicated
+    thread, rather than a round-trip to the default thread pool for each
+    file operation.  A save is queued, and returns once queued, so that the
+    device tasks do not wait on the disk; the writer thread writes all of the
+    queued saves as one batch.  The queue is bounded; a save waits for space
+    in the queue so that the config content waiting to be written does not
+    grow without limit when the disk is slower than the devices.
+
+    The errors of the saves are collected into the `errors` list, and are
+    available once the writer has been flushed.  The Caller that needs to know
+    when a save-file is written uses `when_saved`.
+
+    The BulkWriter must be created within the event loop that uses it.
+    """
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self.loop = asyncio.get_running_loop()
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="netcfgbu-writer"
+        )
+        self._space = asyncio.Semaphore(max_queue)
+        self._queue = deque()
+        self._draining = None
+
+        # max_depth is the largest number of saves waiting to be written;
+        # batches is the number of batches the saves were written in.
+
+        self.max_depth = 0
+        self.batches = 0
+        self.saves = 0
+        self.errors: List[Tuple[Path, Exception]] = list()
+
+        # the number of saves queued, and not yet written, for each save-file;
+        # and the callbacks waiting for those saves.
+
+        self._pending = Counter()
+        self._callbacks: Dict[Path, List[Callable]] = dict()
+
+    async def save(self, save_file: Path, content: bytes):
+        """
+        Queue the save of the content into the save-file, waiting only for
+        space in the queue.  The save-file is not written if it already has the
+        same content.
+        """
+        await self._space.acquire()
+        self._queue.append((save_file, content))
+        self._pending[save_file] += 1
+        self.max_depth = max(self.max_depth, len(self._queue))
+
+        if not self._draining:
+            self._draining = asyncio.ensure_future(self._drain())
+
+    def when_saved(self, save_file: Path, callback: Callable):
+        """
+        Call the callback once the queued saves of the save-file are written,
+        with the exception of the failed save or None; the callback is called
+        immediately when there are no such saves.
+        """
+        if not self._pending[save_file]:
+            callback(None)
+            return
+
+        self._callbacks.setdefault(save_file, list()).append(callback)
+
+    async def flush(self):
+        """ Wait for the queued saves to be written """
+        while draining := self._draining:
+            await draining
+
+    def _done(self, save_file: Path, res):
+        """ account for the result of the save, and release its queue space """
+        self._space.release()
+        self.saves += 1
+
+        if isinstance(res, Exception):
+            self.errors.append((save_file, res))
+        else:
+            _count_save(save_file, res)
+
+        self._pending[save_file] -= 1
+        if self._pending[save_file]:
+            return
+
+        del self._pending[save_file]
+        exc = res if isinstance(res, Exception) else None
+        for callback in self._callbacks.pop(save_file, ()):
+            callback(exc)
+
+    async def _drain(self):
+        batch = list()
+
+        try:
+            while self._queue:
+                batch = list(self._queue)
+                self._queue.clear()
+
+                results = await self.loop.run_in_executor(
+                    self._executor, _write_batch, batch
+                )
+
+                self.batches += 1
+                for (save_file, _), res in zip(batch, results):
+                    self._done(save_file, res)
+
+                batch = list()
+
+        except Exception as exc:
+            # the writer thread is not usable; fail the saves waiting on it
+            # rather than leaving them waiting forever.
+
+            for save_file, _ in chain(batch, self._queue):
+                self._done(save_file, exc)
+            self._queue.clear()
+
+        finally:
+            self._draining = None
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def report(self) -> str:
+        """ returns the queue depth and batch counts for reporting """
+        return (
+            f"max depth {self.max_depth}/{self.max_queue}, "
+            f"{self.saves} saves in {self.batches} batches"
+        )
+
+
+def get_writer() -> BulkWriter:
+    """
+    Returns the BulkWriter used by `save_content`, creating it if needed for
+    the running event loop.
+    """
+    global _writer
+
+    if _writer is None or _writer.loop is not asyncio.get_running_loop():
+        _discard_writer()
+        _writer = BulkWriter(max_queue=_write_queue)
+
+    return _writer
+
+
+def _discard_writer():
+    """ close the BulkWriter, if one was used, without waiting for its saves """
+    global _writer
+
+    if writer := _writer:
+        _writer = None
+        writer.close()
+
+
+async def close_writer() -> Optional[BulkWriter]:
+    """
+    Flush and close the BulkWriter, if one was used, returning it so that the
+    Caller can examine its `errors` and `report()`; otherwise returns None.
+    """
+    global _writer
+
+    if not (writer := _writer):
+        return None
+
+    await writer.flush()
+    _writer = None
+    writer.close()
+    return writer
+
+
+def when_saved(save_file: Path, callback: Callable):
+    """
+    Call the callback once the save-file is written by the BulkWriter, with the
+    exception of the failed save or None; the callback is called immediately
+    when the save-file is not waiting to be written.
+    """
+    if writer := _writer:
+        writer.when_saved(Path(save_file), callback)
+    else:
+        callback(None)
+
+
+async def save_content(save_file: Path, content: bytes):
+    """
+    Queue the save of the content into the save-file.  The save-file is only
+    written if its content has changed; the outcome is counted in the
+    `save_counts`, and an error is collected by the BulkWriter.
+
+    The content is written by the BulkWriter, into a temporary file that is
+    then renamed to the save-file; so that an interrupted run does not leave a
+    truncated save-file.
+    """
+    await get_writer().save(Path(save_file), content)
+
+
+class ConfigStreamWriter(object):
+    """
+    A ConfigStreamWriter is used to store the configuration content into the
+    save-file as chunks of the device output arrive, rather than first
+    collecting the entire content into memory.  Each chunk is decoded, has the
+    carriage-returns removed, and is linted line-by-line; so that the peak
+    memory used is bounded to the chunk size and the last partial line.
+
+    The content is written into a temporary file in the cache directory of the
+    save-file directory, and then renamed to the save-file only when the
+    content has been completely written, and differs from any existing
+    save-file.  If an exception occurs the temporary file is removed and any
+    existing save-file is left unchanged.
+
+    The resulting file content is the same as produced by the non-streaming
+    use of `linter.lint_content`.
+
+    Examples
+    --------
+        async with ConfigStreamWriter(save_file, lint_spec) as ostream:
+            await ostream.write(chunk)
+    """
+
+    def __init__(self, save_file: Path, lint_spec: Optional[LinterSpec] = None):
+        self.save_file = Path(save_file)
+        self.temp_file = _temp_file(self.save_file)
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._ofile = None
+
+        # _line is the partial last line of content; _content_pos is the
+        # number of characters of content processed; _pos is the number of
+        # bytes written into the temporary file.
+
+        self._line = ""
+        self._content_pos = 0
+        self._pos = 0
+
+        starts_after = lint_spec and lint_spec.config_starts_after
+        self._start_re = starts_after and re.compile(f"^{starts_after}.*$")
+        self._started = not self._start_re
+
+        self._ends_at = lint_spec and lint_spec.config_ends_at
+        self._end_pos = None
+        self.changed: Optional[bool] = None
+
+    async def __aenter__(self):
+        self._ofile = await aiofiles.open(self.temp_file, mode="wb")
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            await self._ofile.close()
+            await aiofiles.os.remove(self.temp_file)
+            return
+
+        await self._write_lines([self._line + self._decoder.decode(b"", final=True)])
+
+        if self._end_pos is not None:
+            await self._truncate(self._end_pos)
+
+        await self._ofile.write(b"\n")
+        await self._ofile.close()
+
+        # the temporary file is renamed to the save-file as are the saves of
+        # the BulkWriter, as a batch of one.
+
+        (res,) = await asyncio.get_running_loop().run_in_executor(
+            None, _write_batch, [(self.save_file, self.temp_file)]
+        )
+        if isinstance(res, Exception):
+            raise res
+
+        self.changed = res
+        _count_save(self.save_file, res)
+
+    async def write(self, data: bytes):
+        """
+        Write the chunk of device output to the save-file.  Only the complete
+        lines are processed; the last partial line is retained until the next
+        chunk arrives.
+        """
+        text = self._decoder.decode(data).replace("\r", "")
+        lines = (self._line + text).split("\n")
+        self._line = lines.pop()
+        await self._write_lines(lines, newline=True)
+
+    async def _truncate(self, pos: int):
+        await self._ofile.seek(pos)
+        await self._ofile.truncate()
+        self._pos = pos
+
+    async def _write_lines(self, lines, newline=False):
+        obuf = bytearray()
+        eol = "\n" if newline else ""
+
+        for line in lines:
+
+            # the linter ends-at marker uses the last occurance of the marker
+            # that is found at the start of a line, and the content ends at
+            # the prior newline.
+
+            if self._ends_at and self._content_pos > 1:
+                if line.startswith(self._ends_at):
+                    self._end_pos = max(0, self._pos + len(obuf) - 1)
+
+            self._content_pos += len(line) + len(eol)
+
+            # the linter starts-after marker uses the first line matching the
+            # marker; all content upto and including that line is discarded.
+
+            if not self._started and self._start_re.match(line):
+                self._started = True
+                obuf.clear()
+                await self._truncate(0)
+                if self._end_pos is not None:
+                    self._end_pos = 0
+                continue
+
+            obuf += (line + eol).encode("utf-8")
+
+        if obuf:
+            await self._ofile.write(obuf)
+            self._pos += len(obuf)
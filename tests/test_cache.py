@@ -0,0 +1,193 @@
+from io import StringIO
+
+import pytest  # noqa
+from asynctest import CoroutineMock  # noqa
+
+import asyncssh
+
+from netcfgbu import cache
+from netcfgbu import os_specs
+from netcfgbu.config import load
+from netcfgbu.connectors import BasicSSHConnector
+
+
+def test_cache_pass_cache_dir(tmpdir):
+    cache_dir = cache.get_cache_dir(tmpdir)
+    assert cache_dir.is_dir()
+    assert cache_dir.joinpath(".gitignore").read_text() == "*\n"
+
+
+def test_cache_pass_credential_hints(tmpdir):
+    usernames = ["user1", "user2", "user3"]
+
+    cred_hints = cache.CredentialHints.load(tmpdir)
+    assert cred_hints.get("switch1", usernames) is None
+
+    cred_hints.record("switch1", None, 2, "user3")
+    cred_hints.record("switch2", None, 0, "user1")
+    cred_hints.save()
+
+    # the secrets are never stored, only the index and username.
+    content = cred_hints.filepath.read_text()
+    assert "password" not in content
+
+    cred_hints = cache.CredentialHints.load(tmpdir)
+    assert cred_hints.get("switch1", usernames) == 2
+    assert cred_hints.get("switch2", usernames) == 0
+
+    # a hint whose username no longer matches the configured credential is
+    # not used.
+
+    assert cred_hints.get("switch1", ["user1", "user2", "other"]) is None
+    assert "switch1" not in cred_hints.hints
+
+    # a hint that is denied is a miss, and is removed when no credential is
+    # accepted.
+
+    cred_hints.record("switch2", 0, None, None)
+    assert "switch2" not in cred_hints.hints
+
+    assert cred_hints.hits == 0
+    assert cred_hints.misses == 1
+    assert cred_hints.report() == "0/1 hits (0%), 1 without a hint"
+
+
+def test_cache_pass_credential_hints_corrupt(tmpdir):
+    cache_dir = cache.get_cache_dir(tmpdir)
+    cache_dir.joinpath(cache.CredentialHints.FILENAME).write_text("{not-json")
+
+    cred_hints = cache.CredentialHints.load(tmpdir)
+    assert cred_hints.hints == {}
+
+
+CONFIG_CREDS = """
+[defaults]
+    configs_dir = "{configs_dir}"
+    credentials.username = "user1"
+    credentials.password = "password1"
+
+[[credentials]]
+    username = "user2"
+    password = "password2"
+
+[[credentials]]
+    username = "user3"
+    password = "password3"
+
+[cache]
+    credentials = true
+"""
+
+
+@pytest.mark.asyncio
+async def test_cache_pass_login_hint(tmpdir, netcfgbu_envars, monkeypatch):
+    """
+    Test the use-case where the host accepts only the third credential; the
+    next run tries the third credential first.
+    """
+    app_cfg = load(fileio=StringIO(CONFIG_CREDS.format(configs_dir=tmpdir)))
+    rec = {"host": "switch1", "os_name": "dummy"}
+
+    async def fake_connect(**conn_args):
+        if conn_args["username"] != "user3":
+            raise asyncssh.PermissionDenied(reason="nope")
+        return conn_args["username"]
+
+    mock_connect = CoroutineMock(side_effect=fake_connect)
+    monkeypatch.setattr(asyncssh, "connect", mock_connect)
+
+    cred_hints = cache.setup_credential_hints(app_cfg)
+    assert BasicSSHConnector._credential_hints is cred_hints
+
+    assert await os_specs.make_host_connector(rec, app_cfg).login() == "user3"
+    assert mock_connect.call_count == 3
+    cred_hints.save()
+
+    mock_connect.reset_mock()
+    cred_hints = cache.setup_credential_hints(app_cfg)
+
+    assert await os_specs.make_host_connector(rec, app_cfg).login() == "user3"
+    assert mock_connect.call_count == 1
+    assert cred_hints.report() == "1/1 hits (100%), 0 without a hint"
+
+    BasicSSHConnector.set_credential_hints(None)
+
+
+def test_cache_pass_credential_hints_default(tmpdir, netcfgbu_envars):
+    """
+    Test the use-case where the credentials cache is not configured; as with
+    the other caches it is not used.
+    """
+    config = CONFIG_CREDS.replace("credentials = true", "")
+    app_cfg = load(fileio=StringIO(config.format(configs_dir=tmpdir)))
+
+    assert app_cfg.cache.credentials is False
+    assert cache.setup_credential_hints(app_cfg) is None
+    assert not tmpdir.join(".netcfgbu", cache.CredentialHints.FILENAME).exists()
+
+
+def test_cache_pass_reachability_backoff(tmpdir):
+    reach = cache.ReachabilityCache.load(tmpdir, ttl=60, max_backoff=300)
+    assert reach.retry_after("switch1", now=1000) is None
+
+    # the back-off period doubles for each consecutive failure, up to the max
+    # back-off.
+
+    for failures, backoff in ((1, 60), (2, 120), (3, 240), (4, 300)):
+        reach.record("switch1", reachable=False, now=1000)
+        assert reach.hosts["switch1"]["failures"] == failures
+        assert reach.retry_after("switch1", now=1000) == 1000 + backoff
+        assert reach.retry_after("switch1", now=1000 + backoff) is None
+
+    reach.save()
+    reach = cache.ReachabilityCache.load(tmpdir, ttl=60, max_backoff=300)
+    assert reach.retry_after("switch1", now=1000) == 1300
+
+    # a reachable host is no longer skipped.
+
+    reach.record("switch1", reachable=True)
+    assert reach.retry_after("switch1", now=1000) is None
+    assert "switch1" not in reach.hosts
+
+
+def test_cache_pass_reachability_filter(tmpdir):
+    reach = cache.ReachabilityCache.load(tmpdir, ttl=60, max_backoff=300)
+    reach.record("switch2", reachable=False)
+
+    recs = [dict(host=f"switch{n}") for n in range(1, 4)]
+    assert [rec["host"] for rec in reach.filter(recs)] == ["switch1", "switch3"]
+    assert reach.skipped == 1
+
+
+def test_cache_pass_run_journal(tmpdir):
+    """
+    Test the use-case where the run was interrupted while writing the
+    journal; the partial line is ignored, and a host that failed after it
+    completed is not skipped.
+    """
+    journal = cache.RunJournal.start(tmpdir)
+    journal.record("switch1", ok=True)
+    journal.record("switch2", ok=True)
+    journal.record("switch2", ok=False)
+    journal.close()
+
+    with journal.filepath.open("a") as ofile:
+        ofile.write('{"host": "switch3", "o')
+
+    journal = cache.RunJournal.start(tmpdir, resume=True)
+    assert journal.completed == {"switch1"}
+
+    recs = [dict(host=f"switch{n}") for n in range(1, 4)]
+    assert [rec["host"] for rec in journal.filter(recs)] == ["switch2", "switch3"]
+    assert journal.skipped == 1
+
+    journal.record("switch3", ok=True)
+    journal.close()
+
+    journal = cache.RunJournal.start(tmpdir, resume=True)
+    assert journal.completed == {"switch1", "switch3"}
+    journal.close()
+
+    journal = cache.RunJournal.start(tmpdir)
+    journal.close()
+    assert journal.filepath.read_text() == ""
@@ -0,0 +1,367 @@
+import asyncio
+from collections import Counter
+import csv
+import json
+
+import pytest
+import asyncssh
+from click.testing import CliRunner
+from unittest.mock import Mock
+from asynctest import CoroutineMock
+from netcfgbu.cli import backup
+from netcfgbu.config import load
+from netcfgbu import config_model
+from netcfgbu import jumphosts
+from netcfgbu import storage
+from netcfgbu.cli.report import Report
+
+
+@pytest.fixture(autouse=True)
+def _always(netcfgbu_envars, files_dir, monkeypatch):
+    test_inv = files_dir.joinpath("test-small-inventory.csv")
+    monkeypatch.setenv("NETCFGBU_INVENTORY", str(test_inv))
+
+
+def test_cli_backup_pass_concurrency(monkeypatch):
+    mock_backup = Mock()
+    monkeypatch.setattr(backup, "exec_backup", mock_backup)
+
+    runner = CliRunner()
+    res = runner.invoke(backup.cli_backup, obj={})
+    assert res.exit_code == 0
+
+    app_cfg = mock_backup.mock_calls[0].kwargs["app_cfg"]
+    assert app_cfg.concurrency.max_startups == 100
+    assert app_cfg.concurrency.max_getconfigs == 500
+
+    res = runner.invoke(
+        backup.cli_backup, ["--batch", "10", "--max-startups", "5"], obj={}
+    )
+    assert res.exit_code == 0
+
+    app_cfg = mock_backup.mock_calls[1].kwargs["app_cfg"]
+    assert app_cfg.concurrency.max_startups == 5
+    assert app_cfg.concurrency.max_getconfigs == 10
+
+    # the options are not limited below the values the config file accepts.
+
+    res = runner.invoke(
+        backup.cli_backup, ["--batch", "2000", "--max-startups", "1000"], obj={}
+    )
+    assert res.exit_code == 0
+
+    app_cfg = mock_backup.mock_calls[2].kwargs["app_cfg"]
+    assert app_cfg.concurrency.max_startups == 1000
+    assert app_cfg.concurrency.max_getconfigs == 2000
+
+
+def test_cli_backup_pass_probe_first(monkeypatch, capsys, tmpdir):
+    """
+    Test the use-case where the hosts are probed first; only the reachable
+    hosts are backed up, and the unreachable hosts are reported.
+    """
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+    monkeypatch.chdir(tmpdir)
+
+    async def fake_probe(host, **kwargs):
+        if host == "switch2":
+            raise asyncio.TimeoutError()
+        return True
+
+    mock_connector = Mock(conn_args={})
+    mock_connector.backup_config = CoroutineMock(return_value=True)
+
+    monkeypatch.setattr(backup, "probe", CoroutineMock(side_effect=fake_probe))
+    monkeypatch.setattr(
+        backup, "make_host_connector", Mock(return_value=mock_connector)
+    )
+    monkeypatch.setattr(backup, "stop_aiologging", Mock())
+
+    app_cfg = load()
+    inventory_recs = [dict(host=f"switch{n}", os_name="eos") for n in range(1, 7)]
+
+    backup.exec_backup(app_cfg, inventory_recs, probe_first=True)
+
+    assert mock_connector.backup_config.call_count == 5
+    output = capsys.readouterr().out
+    assert "TOTAL=6, OK=5, FAIL=1" in output
+    assert "UNREACHABLE=1" in output
+    assert "UNREACHABLE: TIMEOUT" in output
+
+
+@pytest.mark.asyncio
+async def test_cli_backup_pass_reachable_hosts(monkeypatch):
+    """
+    Test the use-case where the probed inventory includes jump host records,
+    and a record that cannot be probed; the jump host records are yielded
+    without waiting on the probes, and the bad record is reported.
+    """
+    monkeypatch.setattr(jumphosts.JumpHost, "routes", {})
+    monkeypatch.setattr(jumphosts.JumpHost, "available", [])
+
+    async def slow_probe(host, **kwargs):
+        await asyncio.sleep(0.05)
+        return True
+
+    monkeypatch.setattr(backup, "probe", CoroutineMock(side_effect=slow_probe))
+
+    inventory_recs = [
+        dict(host="switch1.nyc1", os_name="eos"),
+        dict(host="switch2.nyc1", os_name="eos"),
+        dict(host="switch1.dc1", os_name="eos"),
+        dict(host="switch2.dc1", os_name="eos"),
+        dict(host="switch3.nyc1"),
+    ]
+    jh_spec = config_model.JumphostSpec(proxy="1.2.3.4", include=["host=.*dc1"])
+    jumphosts.init_jumphosts(jumphost_specs=[jh_spec], inventory=inventory_recs)
+
+    app_cfg = load()
+    app_cfg.concurrency.max_probes = 1
+    report = Report()
+
+    found = [
+        rec["host"]
+        async for rec in backup.reachable_hosts(app_cfg, inventory_recs, report)
+    ]
+
+    assert found == ["switch1.dc1", "switch2.dc1", "switch1.nyc1", "switch2.nyc1"]
+    assert backup.probe.call_count == 2
+
+    ((bad_rec, exc),) = report.task_results[False]
+    assert bad_rec["host"] == "switch3.nyc1"
+    assert isinstance(exc, KeyError)
+
+
+def test_cli_backup_pass_reachability(monkeypatch, capsys, tmpdir):
+    """
+    Test the use-case where the reachability cache is enabled; the hosts that
+    refused the connection, or timed out connecting, are skipped by the next
+    run, unless the cache is ignored.  The host that timed out after it
+    connected is not skipped.
+    """
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+    monkeypatch.chdir(tmpdir)
+
+    async def fake_backup(rec):
+        if rec["host"] == "switch2":
+            raise ConnectionRefusedError()
+        if rec["host"] in ("switch3", "switch4"):
+            raise asyncio.TimeoutError()
+        return True
+
+    def fake_connector(rec, app_cfg):
+        conn = None if rec["host"] in ("switch2", "switch4") else Mock()
+        return Mock(conn=conn, backup_config=lambda: fake_backup(rec))
+
+    mock_log = Mock()
+    monkeypatch.setattr(backup, "make_host_connector", fake_connector)
+    monkeypatch.setattr(backup, "stop_aiologging", Mock())
+    monkeypatch.setattr(backup, "get_logger", Mock(return_value=mock_log))
+
+    app_cfg = load()
+    app_cfg.cache.reachability_ttl = 3600
+    inventory_recs = [dict(host=f"switch{n}", os_name="eos") for n in range(1, 5)]
+
+    backup.exec_backup(app_cfg, inventory_recs)
+    assert "TOTAL=4, OK=1, FAIL=3" in capsys.readouterr().out
+
+    backup.exec_backup(app_cfg, inventory_recs)
+    output = capsys.readouterr().out
+    assert "TOTAL=2, OK=1, FAIL=1" in output
+    assert "SKIPPED=2" in output
+
+    # the skipped hosts are not included in the total of the DONE messages.
+
+    done_msgs = [
+        call.args[0] for call in mock_log.info.mock_calls if "DONE" in call.args[0]
+    ]
+    assert done_msgs[-1].startswith("DONE (2/2)")
+
+    backup.exec_backup(app_cfg, inventory_recs, ignore_reachability=True)
+    assert "TOTAL=4, OK=1, FAIL=3" in capsys.readouterr().out
+
+
+def test_cli_backup_pass_resume(monkeypatch, capsys, tmpdir):
+    """
+    Test the use-case where the backup is resumed; only the hosts not backed
+    up successfully by the prior run are backed up.
+    """
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+    monkeypatch.chdir(tmpdir)
+
+    failing = {"switch2", "switch3"}
+
+    async def fake_backup(rec):
+        if rec["host"] in failing:
+            raise RuntimeError("config failed")
+        return True
+
+    def fake_connector(rec, app_cfg):
+        return Mock(backup_config=lambda: fake_backup(rec))
+
+    monkeypatch.setattr(backup, "make_host_connector", fake_connector)
+    monkeypatch.setattr(backup, "stop_aiologging", Mock())
+
+    app_cfg = load()
+    inventory_recs = [dict(host=f"switch{n}", os_name="eos") for n in range(1, 5)]
+
+    backup.exec_backup(app_cfg, inventory_recs)
+    assert "TOTAL=4, OK=2, FAIL=2" in capsys.readouterr().out
+
+    failing.remove("switch2")
+    backup.exec_backup(app_cfg, inventory_recs, resume=True)
+    output = capsys.readouterr().out
+    assert "TOTAL=2, OK=1, FAIL=1" in output
+    assert "RESUMED=2" in output
+
+    backup.exec_backup(app_cfg, inventory_recs, resume=True)
+    output = capsys.readouterr().out
+    assert "TOTAL=1, OK=0, FAIL=1" in output
+    assert "RESUMED=3" in output
+
+    # a run that is not resumed starts a new journal.
+
+    backup.exec_backup(app_cfg, inventory_recs)
+    assert "TOTAL=4, OK=3, FAIL=1" in capsys.readouterr().out
+
+
+def test_cli_backup_pass_retry(monkeypatch, capsys, tmpdir):
+    """
+    Test the use-case where the os_name retry policy is used; the host that
+    fails transiently is retried, and the attempts are included in the
+    failures.csv file.
+    """
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+    monkeypatch.chdir(tmpdir)
+
+    attempts = Counter()
+
+    async def fake_backup(rec):
+        attempts[rec["host"]] += 1
+        if rec["host"] == "switch3" or attempts[rec["host"]] < 2:
+            raise ConnectionResetError()
+        return True
+
+    def fake_connector(rec, app_cfg):
+        return Mock(backup_config=lambda: fake_backup(rec))
+
+    monkeypatch.setattr(backup, "make_host_connector", fake_connector)
+    monkeypatch.setattr(backup, "stop_aiologging", Mock())
+
+    app_cfg = load()
+    app_cfg.os_name = {
+        "eos": config_model.OSNameSpec(retry={"attempts": 3, "backoff": 0.01})
+    }
+    inventory_recs = [dict(host=f"switch{n}", os_name="eos") for n in range(1, 4)]
+
+    backup.exec_backup(app_cfg, inventory_recs)
+    assert "TOTAL=3, OK=2, FAIL=1" in capsys.readouterr().out
+    assert attempts == {"switch1": 2, "switch2": 2, "switch3": 3}
+
+    with open("failures.csv") as ifile:
+        failures = list(csv.DictReader(ifile))
+
+    assert [(rec["host"], rec["attempts"]) for rec in failures] == [("switch3", "3")]
+
+
+class FakeConn(object):
+    def __init__(self, run):
+        self.run = run
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+def test_cli_backup_pass_retry_get_config(monkeypatch, capsys, tmpdir):
+    """
+    Test the use-case where the get-config fails after the connector has
+    logged in; the failure is retried by the os_name retry policy.
+    """
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+    monkeypatch.chdir(tmpdir)
+
+    runs = Counter()
+
+    async def fake_connect(host, **conn_args):
+        async def run(command):
+            runs[host] += 1
+            if host == "switch2":
+                raise asyncio.TimeoutError()
+            if runs[host] < 2:
+                raise ConnectionResetError()
+            return Mock(stdout=f"{command}\nhostname {host}\n")
+
+        return FakeConn(run)
+
+    monkeypatch.setattr(asyncssh, "connect", CoroutineMock(side_effect=fake_connect))
+    monkeypatch.setattr(backup, "stop_aiologging", Mock())
+
+    app_cfg = load()
+    app_cfg.os_name = {
+        "eos": config_model.OSNameSpec(retry={"attempts": 3, "backoff": 0.01})
+    }
+    inventory_recs = [dict(host=f"switch{n}", os_name="eos") for n in range(1, 3)]
+
+    backup.exec_backup(app_cfg, inventory_recs)
+    assert "TOTAL=2, OK=1, FAIL=1" in capsys.readouterr().out
+    assert runs == {"switch1": 2, "switch2": 3}
+    assert tmpdir.join("switch1.cfg").read() == "hostname switch1\n\n"
+
+
+def test_cli_backup_fail_save(monkeypatch, capsys, tmpdir):
+    """
+    Test the use-case where the config file of a host cannot be written; the
+    host is reported as failed once the writer is closed, and is not skipped
+    by a resumed run.
+    """
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+    monkeypatch.chdir(tmpdir)
+
+    async def fake_connect(host, **conn_args):
+        async def run(command):
+            return Mock(stdout=f"{command}\nhostname {host}\n")
+
+        return FakeConn(run)
+
+    write_file = storage._write_file
+
+    def fake_write_file(save_file, content):
+        if save_file.stem == "switch2":
+            raise OSError("No space left on device")
+        return write_file(save_file, content)
+
+    monkeypatch.setattr(asyncssh, "connect", CoroutineMock(side_effect=fake_connect))
+    monkeypatch.setattr(storage, "_write_file", fake_write_file)
+    monkeypatch.setattr(backup, "stop_aiologging", Mock())
+
+    app_cfg = load()
+    inventory_recs = [dict(host=f"switch{n}", os_name="eos") for n in range(1, 4)]
+
+    backup.exec_backup(app_cfg, inventory_recs)
+    output = capsys.readouterr().out
+    assert "TOTAL=3, OK=2, FAIL=1" in output
+    assert "No space left on device" in output
+
+    # the hosts are journaled as backed up only once their config file is
+    # written.
+
+    journal = tmpdir.join(".netcfgbu", "backup-journal.jsonl").read()
+    entries = [json.loads(line) for line in journal.splitlines()]
+    assert sorted((e["host"], e["ok"]) for e in entries) == [
+        ("switch1", True),
+        ("switch2", False),
+        ("switch3", True),
+    ]
+
+    monkeypatch.setattr(storage, "_write_file", write_file)
+    backup.exec_backup(app_cfg, inventory_recs, resume=True)
+    assert "TOTAL=1, OK=1, FAIL=0" in capsys.readouterr().out
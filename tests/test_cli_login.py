@@ -0,0 +1,31 @@
+from unittest.mock import Mock
+
+import pytest
+from click.testing import CliRunner
+
+from netcfgbu.cli import login
+
+
+@pytest.fixture(autouse=True)
+def _always(netcfgbu_envars, files_dir, monkeypatch):
+    test_inv = files_dir.joinpath("test-small-inventory.csv")
+    monkeypatch.setenv("NETCFGBU_INVENTORY", str(test_inv))
+
+
+def test_cli_login_pass_concurrency(monkeypatch):
+    """
+    Test that the --batch and --max-startups options have the same meaning as
+    for the backup command.
+    """
+    mock_login = Mock()
+    monkeypatch.setattr(login, "exec_test_login", mock_login)
+
+    runner = CliRunner()
+    res = runner.invoke(
+        login.cli_login, ["--batch", "10", "--max-startups", "5"], obj={}
+    )
+    assert res.exit_code == 0
+
+    app_cfg = mock_login.mock_calls[0].args[0]
+    assert app_cfg.concurrency.max_getconfigs == 10
+    assert app_cfg.concurrency.max_startups == 5
@@ -51,3 +51,20 @@ def test_cli_probe_fail_exec(monkeypatch, log_vcr):
     assert res.exit_code == 0
     logs = log_vcr.handlers[0].records[1:]
     assert all("FAIL" in log.msg for log in logs)
+
+
+def test_cli_probe_pass_banner(monkeypatch, log_vcr, tmpdir):
+    mock_probe = CoroutineMock(return_value="OpenSSH_8.2p1")
+    monkeypatch.setattr(probe, "probe_ssh_banner", mock_probe)
+    monkeypatch.setattr(probe, "get_logger", Mock(return_value=log_vcr))
+    monkeypatch.chdir(tmpdir)
+
+    runner = CliRunner()
+    res = runner.invoke(probe.cli_check, ["--banner"], obj={})
+    assert res.exit_code == 0
+    logs = log_vcr.handlers[0].records[1:]
+    assert all("OpenSSH_8.2p1 PASS" in log.msg for log in logs)
+
+    banners = tmpdir.join(probe.BANNERS_FILENAME).readlines()
+    assert len(banners) == 7
+    assert banners[1].strip() == "switch1,eos,OpenSSH_8.2p1"
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest  # noqa
+import asyncssh
+
+from netcfgbu import concurrency
+from netcfgbu import config_model
+from netcfgbu import jumphosts
+from netcfgbu.connectors import BasicSSHConnector
+
+
+def make_limiter(**kwargs):
+    params = dict(
+        name="TEST",
+        initial=4,
+        min_limit=2,
+        max_limit=8,
+        latency=1,
+        failure_rate=0.5,
+        sample_size=4,
+    )
+    params.update(kwargs)
+    return concurrency.AdaptiveLimiter(**params)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_pass_bounded():
+    limiter = make_limiter(latency=0)
+    running = 0
+    max_running = 0
+
+    async def task():
+        nonlocal running, max_running
+        async with limiter:
+            running += 1
+            max_running = max(running, max_running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+    await asyncio.gather(*[task() for _ in range(20)])
+    assert max_running == 4
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_pass_increase():
+    """
+    Test the use-case where the operations complete within the latency
+    threshold; the limit increases up to the max limit.
+    """
+    limiter = make_limiter()
+
+    for _ in range(5):
+        async with limiter:
+            pass
+
+    assert limiter.limit == 5
+
+    for _ in range(100):
+        async with limiter:
+            pass
+
+    assert limiter.limit == 8
+    assert limiter.report() == "8 (lowest=4, highest=8)"
+
+
+@pytest.mark.asyncio
+async def test_concurrency_pass_decrease():
+    """
+    Test the use-case where the operations fail; the limit is halved down to
+    the min limit, and other exceptions do not change the limit.
+    """
+    limiter = make_limiter(initial=8)
+
+    for _ in range(8):
+        with pytest.raises(OSError):
+            async with limiter:
+                raise OSError()
+
+    assert limiter.limit == 8
+
+    for _ in range(8):
+        with pytest.raises(asyncio.TimeoutError):
+            async with limiter:
+                raise asyncio.TimeoutError()
+
+    assert limiter.limit == 4
+
+    for _ in range(8):
+        with pytest.raises(asyncio.TimeoutError):
+            async with limiter:
+                raise asyncio.TimeoutError()
+
+    assert limiter.limit == 2
+    assert limiter.lowest == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrency_pass_wakeup_on_increase():
+    """
+    Test the use-case where tasks are waiting on the limiter, and are
+    cancelled; the limiter must remain usable.
+    """
+    limiter = make_limiter(initial=2)
+    await limiter.acquire()
+    await limiter.acquire()
+
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    limiter.release()
+    await asyncio.wait_for(limiter.acquire(), timeout=1)
+    assert limiter.in_flight == 2
+
+
+def test_concurrency_pass_setup(monkeypatch):
+    monkeypatch.setattr(BasicSSHConnector, "_max_startups_sem4", None)
+
+    spec = config_model.ConcurrencySpec()
+    assert concurrency.setup_startups_limiter(spec) is None
+    assert isinstance(BasicSSHConnector._max_startups_sem4, asyncio.Semaphore)
+
+    spec = config_model.ConcurrencySpec(adaptive={"max_startups": 200})
+    limiter = concurrency.setup_startups_limiter(spec, max_startups=50)
+    assert BasicSSHConnector._max_startups_sem4 is limiter
+    assert limiter.limit == 50
+    assert limiter.max_limit == 200
+    assert asyncssh.PermissionDenied in limiter.failure_exc
+
+
+def test_concurrency_fail_adaptive_minmax():
+    with pytest.raises(ValueError):
+        config_model.ConcurrencySpec(adaptive={"min_startups": 20, "max_startups": 10})
+
+
+def test_concurrency_pass_session_limits(monkeypatch):
+    jh_spec = config_model.JumphostSpec(
+        proxy="1.2.3.4", include=["host=.*dc1"], max_sessions=5
+    )
+    inventory = [
+        dict(host="switch1.dc1", site="dc1"),
+        dict(host="switch1.nyc1", site="nyc1"),
+        dict(host="switch2.nyc1", site=""),
+    ]
+    jumphosts.init_jumphosts(jumphost_specs=[jh_spec], inventory=inventory)
+
+    spec = config_model.ConcurrencySpec(site_field="site", max_site_getconfigs=2)
+    jh_limit, site_limit = concurrency.make_session_limits(spec)
+
+    assert jh_limit(inventory[0]) == (("jumphost", "1.2.3.4"), 5)
+    assert jh_limit(inventory[1]) is None
+    assert site_limit(inventory[0]) == (("site", "dc1"), 2)
+    assert site_limit(inventory[1]) == (("site", "nyc1"), 2)
+    assert site_limit(inventory[2]) is None
+
+    jumphosts.JumpHost.available = []
+    assert concurrency.make_session_limits(config_model.ConcurrencySpec()) == []
+
+
+def test_concurrency_fail_site_limits():
+    with pytest.raises(ValueError):
+        config_model.ConcurrencySpec(site_field="site")
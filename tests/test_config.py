@@ -9,6 +9,7 @@ import toml
 
 from netcfgbu.config import load
 from netcfgbu import config_model
+from netcfgbu import consts
 
 
 def test_config_onlyenvars_pass(monkeypatch, netcfgbu_envars):
@@ -282,3 +283,25 @@ def test_vcs_fail_config(tmpdir):
 
     errs = excinfo.value.errors()
     assert errs[0]["msg"].startswith("Only one of")
+
+
+def test_config_storage(netcfgbu_envars, request):
+    app_cfg = load()
+    assert app_cfg.storage.streaming is False
+
+    abs_filepath = request.fspath.dirname + "/files/test-config-storage.toml"
+    app_cfg = load(filepath=abs_filepath)
+    assert app_cfg.storage.streaming is True
+
+
+def test_config_concurrency(netcfgbu_envars, request):
+    app_cfg = load()
+    assert app_cfg.concurrency.max_startups == consts.DEFAULT_MAX_STARTUPS
+    assert app_cfg.concurrency.max_getconfigs == consts.DEFAULT_MAX_GETCONFIGS
+
+    abs_filepath = request.fspath.dirname + "/files/test-config-concurrency.toml"
+    app_cfg = load(filepath=abs_filepath)
+    assert app_cfg.concurrency.max_startups == 20
+    assert app_cfg.concurrency.max_getconfigs == 200
+    assert app_cfg.concurrency.adaptive.max_startups == 300
+    assert app_cfg.concurrency.adaptive.latency == 5
@@ -1,6 +1,15 @@
+from io import StringIO
+import io
+from unittest.mock import Mock
+
 import pytest  # noqa
+from asynctest import CoroutineMock  # noqa
 
+from netcfgbu import cache
 from netcfgbu import connectors
+from netcfgbu import os_specs
+from netcfgbu import storage
+from netcfgbu.config import load
 
 
 def test_connectors_pass():
@@ -19,3 +28,198 @@ def test_connectors_pass_named():
 def test_connectors_fail_named(tmpdir):
     with pytest.raises(ModuleNotFoundError):
         connectors.get_connector_class(str(tmpdir))
+
+
+class FakeStdout(object):
+    """ mimics the asyncssh process stdout reader for a fixed byte stream """
+
+    def __init__(self, content: bytes, chunk_size=None):
+        self._content = content
+        self._chunk_size = chunk_size
+        self._at = 0
+
+    async def read(self, n):
+        n = min(n, self._chunk_size or n)
+        chunk = self._content[self._at : self._at + n]
+        self._at += n
+        return chunk
+
+
+def make_fake_connector(content: bytes, chunk_size=None):
+    rec = {"host": "dummy", "os_name": "dummy"}
+    conn = os_specs.make_host_connector(rec, load())
+    conn.process = Mock()
+    conn.process.stdout = FakeStdout(content, chunk_size=chunk_size)
+    return conn
+
+
+def make_fake_config(size: int) -> bytes:
+    line = b"interface Ethernet1/1\r\n   description some-link-description\r\n"
+    return line * (size // len(line))
+
+
+@pytest.mark.asyncio
+async def test_connectors_pass_read_until_prompt(netcfgbu_envars):
+    config = make_fake_config(64 * 1024)
+    conn = make_fake_connector(config + b"switch1#")
+
+    output = await conn.read_until_prompt()
+    assert output == config[:-1]
+    assert conn._cur_prompt == b"switch1#"
+
+
+@pytest.mark.asyncio
+async def test_connectors_pass_read_until_prompt_split(netcfgbu_envars):
+    """
+    Test the use-case where the prompt arrives split across multiple reads,
+    and the prompt-like text in the body of the output is not matched.
+    """
+    config = b"hostname switch1\r\nswitch1#\r\n" + make_fake_config(1024)
+    conn = make_fake_connector(config + b"switch1#", chunk_size=5)
+
+    output = await conn.read_until_prompt()
+    assert output == config[:-1]
+    assert conn._cur_prompt == b"switch1#"
+
+
+class CountingPattern(object):
+    """ counts the bytes of output given to the prompt pattern to examine """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.examined = 0
+
+    def match(self, output, pos=0):
+        self.examined += len(output) - pos
+        return self.pattern.match(output, pos)
+
+
+@pytest.mark.asyncio
+async def test_connectors_pass_read_until_prompt_linear(netcfgbu_envars):
+    """
+    Test the prompt reader with a synthetic multi-megabyte stream to ensure
+    that the output given to the prompt pattern does not grow with the size
+    of the output; that is the output read so far is not searched again.
+    """
+
+    async def examined(size):
+        stream = make_fake_config(size) + b"switch1#"
+        conn = make_fake_connector(stream)
+        conn.PROMPT_PATTERN = CountingPattern(conn.PROMPT_PATTERN)
+        assert await conn.read_until_prompt() == stream[: -len(b"switch1#") - 1]
+        return conn.PROMPT_PATTERN.examined
+
+    line_len = len(make_fake_config(1024).split(b"\n")[0]) + 1
+
+    # only the last, partial, line of each chunk is examined; a reader that
+    # searched all of the output for each chunk would examine ~8MB * 1024.
+
+    small = await examined(512 * 1024)
+    large = await examined(8 * 1024 * 1024)
+    assert small <= (512 * 1024 // io.DEFAULT_BUFFER_SIZE + 1) * line_len
+    assert large <= (8 * 1024 * 1024 // io.DEFAULT_BUFFER_SIZE + 1) * line_len
+
+
+@pytest.mark.asyncio
+async def test_connectors_pass_run_command_stream(netcfgbu_envars, tmpdir):
+    """
+    Test the use-case where the command output is streamed to the config file;
+    the result must be the same as the non-streaming save_config.
+    """
+    command = "show running-config"
+    config = make_fake_config(64 * 1024)
+    stream = (command + "\r\n").encode() + config + b"switch1#"
+
+    conn = make_fake_connector(stream)
+    conn.process.stdin = Mock()
+    conn.app_cfg.defaults.configs_dir = tmpdir
+    conn.config = await conn.run_command(command)
+    await conn.save_config()
+    await storage.get_writer().flush()
+    expected = tmpdir.join("dummy.cfg").read()
+    tmpdir.join("dummy.cfg").remove()
+
+    conn = make_fake_connector(stream, chunk_size=100)
+    conn.process.stdin = Mock()
+    conn.app_cfg.defaults.configs_dir = tmpdir
+
+    async with conn.open_config_stream() as ostream:
+        assert await conn.run_command(command, ostream=ostream) is None
+
+    assert conn.config is None
+    assert tmpdir.join("dummy.cfg").read() == expected
+
+
+class FakeConn(object):
+    """ mimics the asyncssh connection to a device, in exec mode """
+
+    def __init__(self, outputs: dict):
+        self.outputs = outputs
+        self.commands = list()
+
+    async def run(self, command):
+        self.commands.append(command)
+        return Mock(stdout=self.outputs[command])
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+CONFIG_CHANGE_CHECK = """
+[os_name.dummy]
+    change_check = "show last-change"
+"""
+
+
+@pytest.mark.asyncio
+async def test_connectors_pass_change_check(netcfgbu_envars, tmpdir, monkeypatch):
+    """
+    Test the use-case where the os-spec defines the change-check command; the
+    configuration is only retrieved when the change-check output changes.
+    """
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+    app_cfg = load(fileio=StringIO(CONFIG_CHANGE_CHECK))
+    change_checks = cache.setup_change_checks(app_cfg)
+    rec = {"host": "switch1", "os_name": "dummy"}
+
+    outputs = {
+        "show last-change": "changed at 10:00",
+        "show running-config": "show running-config\nhostname switch1",
+    }
+
+    async def run_backup():
+        fake_conn = FakeConn(outputs)
+        conn = os_specs.make_host_connector(rec, app_cfg)
+        conn.conn = fake_conn
+        monkeypatch.setattr(conn, "login", CoroutineMock(return_value=fake_conn))
+        assert await conn.backup_config() is True
+        await storage.get_writer().flush()
+        return fake_conn.commands
+
+    get_config = ["show last-change", "show running-config"]
+
+    assert await run_backup() == get_config
+    assert await run_backup() == ["show last-change"]
+    assert change_checks.skipped == 1
+
+    outputs["show last-change"] = "changed at 11:00"
+    assert await run_backup() == get_config
+
+    # the config file is retrieved if it does not exist.
+
+    tmpdir.join("switch1.cfg").remove()
+    assert await run_backup() == get_config
+    assert tmpdir.join("switch1.cfg").read() == "hostname switch1\n"
+
+    change_checks.save()
+    assert "switch1" in cache.ChangeChecks.load(tmpdir).digests
+    connectors.BasicSSHConnector.set_change_checks(None)
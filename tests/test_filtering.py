@@ -1,7 +1,10 @@
-import pytest  # noqa
-from netcfgbu.filtering import create_filter
+import ipaddress
 import csv
 
+import pytest  # noqa
+from netcfgbu import filtering
+from netcfgbu.filtering import create_filter, compile_filters, PrefixIndex, parse_ip
+
 
 def test_filtering_pass_include():
     """
@@ -331,3 +334,308 @@ def test_filtering_ipaddr_regex_fallback():
     assert filter_fn(dict(ipaddr="10.10.10.1", host="switch1.nyc1")) is True
     assert filter_fn(dict(ipaddr="10.10.10.10", host="switch1.nyc1")) is False
     assert filter_fn(dict(ipaddr="10.10.10.12", host="switch1.nyc1")) is False
+
+
+def test_filtering_pass_same_field_include():
+    """
+    Test the use-case where there are many limits on the same field; each of
+    the limits must match.
+    """
+    filter_fn = create_filter(
+        constraints=["host=sw.*", "host=.*nyc1", "host=(?P<name>\\w+)\\..*"],
+        field_names=["host"],
+        include=True,
+    )
+
+    assert filter_fn(dict(host="switch1.nyc1")) is True
+    assert filter_fn(dict(host="SWITCH1.NYC1")) is True
+    assert filter_fn(dict(host="switch1.dc1")) is False
+    assert filter_fn(dict(host="router1.nyc1")) is False
+
+
+def test_filtering_pass_same_field_exclude():
+    """
+    Test the use-case where there are many excludes on the same field,
+    including those that cannot be merged; any of the excludes must match.
+    """
+    for constraints in (
+        ["host=sw.*", "host=.*dc1"],
+        ["host=(?P<x>sw).*", "host=(?P<x>.*)dc1"],
+        ["host=(s)\\1.*", "host=.*dc1"],
+    ):
+        filter_fn = create_filter(
+            constraints=constraints, field_names=["host"], include=False
+        )
+        assert filter_fn(dict(host="router1.nyc1")) is True
+        assert filter_fn(dict(host="router1.dc1")) is False
+
+
+def test_filtering_pass_same_field_alternation():
+    """
+    Test the use-case where an expression on a field with many limits uses an
+    alternation; each branch must match the whole value.
+    """
+    recs = [dict(host="sw1.nyc1"), dict(host="rtr.sw2"), dict(host="sw3.dc1")]
+
+    filter_fn = create_filter(
+        constraints=["host=sw1|.*sw2", "host=.*"], field_names=["host"], include=True
+    )
+    assert [filter_fn(rec) for rec in recs] == [False, True, False]
+
+    filter_fn = create_filter(
+        constraints=["host=sw1|.*sw2", "host=.*dc1"],
+        field_names=["host"],
+        include=False,
+    )
+    assert [filter_fn(rec) for rec in recs] == [True, False, False]
+
+    filter_fn = create_filter(
+        constraints=["host=sw1|.*sw2"], field_names=["host"], include=True
+    )
+    assert [filter_fn(rec) for rec in recs] == [False, True, False]
+
+
+def test_filtering_pass_ipaddr_many():
+    recs = [dict(ipaddr="10.10.0.2"), dict(ipaddr="10.20.0.2"), dict(ipaddr="fd::1")]
+    constraints = ["ipaddr=10.0.0.0/8", "ipaddr=10.10.0.0/16"]
+
+    filter_fn = create_filter(constraints, field_names=["ipaddr"], include=True)
+    assert [filter_fn(rec) for rec in recs] == [True, False, False]
+
+    filter_fn = create_filter(constraints, field_names=["ipaddr"], include=False)
+    assert [filter_fn(rec) for rec in recs] == [False, False, True]
+
+
+def test_filtering_pass_compiled(tmpdir):
+    """
+    Test the filtering of a synthetic 20k-row inventory CSV with a dozen
+    constraints; the compiled filter must produce the same records as calling
+    each filter for each record, using one matcher for each field.
+    """
+    filepath = tmpdir.join("inventory.csv")
+    sites = ["nyc1", "dc1", "sfo1", "lon1", "tyo1"]
+    os_names = ["eos", "ios", "nxos", "iosxr", "junos"]
+
+    with open(filepath, "w") as ofile:
+        csv_wr = csv.writer(ofile)
+        csv_wr.writerow(["host", "ipaddr", "os_name", "site"])
+        for n in range(20_000):
+            site = sites[n % 5]
+            csv_wr.writerow(
+                [
+                    f"switch{n}.{site}",
+                    f"10.{n // 65536}.{(n // 256) % 256}.{n % 256}",
+                    os_names[(n // 5) % 5],
+                    site,
+                ]
+            )
+
+    field_names = ["host", "ipaddr", "os_name", "site"]
+    constraints = {
+        True: ["host=switch.*", "host=.*[0-9]\\..*", "os_name=(eos|ios|nxos)"]
+        + ["site=(nyc1|dc1|sfo1)"]
+        + ["ipaddr=10.0.0.0/8", "ipaddr=10.0.0.0/9"],
+        False: ["host=.*7", "host=.*99", "os_name=junos", "site=lon1"]
+        + ["ipaddr=10.1.0.0/16", "ipaddr=10.2.0.0/24"],
+    }
+
+    with open(filepath) as ifile:
+        recs = list(csv.DictReader(ifile))
+
+    for include, include_constraints in constraints.items():
+        filter_fn = create_filter(include_constraints, field_names, include=include)
+        op_filters = filter_fn.op_filters
+
+        def reference_fn(rec):
+            matches = (op_fn(rec) for op_fn in op_filters)
+            return all(matches) if include else not any(matches)
+
+        expected = list(filter(reference_fn, recs))
+        filtered = list(filter(filter_fn, recs))
+
+        assert filtered == expected
+        assert 0 < len(filtered) < len(recs)
+        assert len(compile_filters(op_filters, include)) == len(field_names)
+
+
+def test_filtering_pass_txt_filecontents(tmpdir):
+    """
+    Test use-case where the constraint is a plain text file of host names;
+    the comments and blank lines are ignored.
+    """
+    tmpfile = tmpdir.join("maintenance.txt")
+    tmpfile.write("# hosts in maintenance\nswitch1.nyc1\n\n  switch2.dc1  # rma\n")
+
+    filter_fn = create_filter(constraints=[f"@{tmpfile}"], field_names=["host"])
+    assert filter_fn.op_filters[0].values == {"switch1.nyc1", "switch2.dc1"}
+
+    assert filter_fn(dict(host="switch1.nyc1")) is True
+    assert filter_fn(dict(host="switch2.dc1")) is True
+    assert filter_fn(dict(host="# hosts")) is False
+
+
+def test_filtering_pass_field_filecontents(tmpdir):
+    """
+    Test use-case where the file constraint is used with a field name other
+    than host, for both CSV and text files.
+    """
+    csv_file = tmpdir.join("sites.csv")
+    csv_file.write("site,region\nnyc1,east\ndc1,east\n")
+
+    txt_file = tmpdir.join("sites.txt")
+    txt_file.write("nyc1\ndc1\n")
+
+    recs = [dict(host="switch1", site="nyc1"), dict(host="switch2", site="sfo1")]
+
+    for filepath in (csv_file, txt_file):
+        filter_fn = create_filter(
+            constraints=[f"site=@{filepath}"], field_names=["host", "site"]
+        )
+        assert [filter_fn(rec) for rec in recs] == [True, False]
+
+        filter_fn = create_filter(
+            constraints=[f"site=@{filepath}"],
+            field_names=["host", "site"],
+            include=False,
+        )
+        assert [filter_fn(rec) for rec in recs] == [False, True]
+
+    with pytest.raises(ValueError) as excinfo:
+        create_filter(constraints=[f"host=@{csv_file}"], field_names=["host", "site"])
+
+    assert "does not contain host content as expected" in excinfo.value.args[0]
+
+
+def test_filtering_pass_file_many(tmpdir):
+    """
+    Test a 20k host file filter against a 60k host inventory; the number of
+    host name comparisons must not grow with the number of hosts in the file,
+    only one for each matching record.
+    """
+
+    class HostName(str):
+        compares = 0
+
+        def __eq__(self, other):
+            HostName.compares += 1
+            return str.__eq__(self, other)
+
+        __hash__ = str.__hash__
+
+    inventory = [dict(host=HostName(f"switch{n}")) for n in range(60_000)]
+
+    for hosts_n in (200, 20_000):
+        tmpfile = tmpdir.join(f"maintenance-{hosts_n}.txt")
+        tmpfile.write("\n".join(f"switch{n * 3}" for n in range(hosts_n)))
+        filter_fn = create_filter([f"@{tmpfile}"], field_names=["host"])
+
+        HostName.compares = 0
+        assert len(list(filter(filter_fn, inventory))) == hosts_n
+        assert HostName.compares == hosts_n
+
+
+def test_filtering_pass_prefix_index():
+    networks = [
+        ipaddress.ip_network(net)
+        for net in ("10.0.0.0/8", "10.20.0.0/16", "10.20.0.0/16", "2620:10::/32")
+    ]
+    index = PrefixIndex(networks)
+    assert index.count == 3
+
+    assert index.match_count(*parse_ip("10.20.1.1")) == 2
+    assert index.match_count(*parse_ip("10.30.1.1")) == 1
+    assert index.contains(*parse_ip("2620:10:abcd::1")) is True
+    assert index.contains(*parse_ip("2620:11::1")) is False
+    assert index.contains(*parse_ip("192.168.1.1")) is False
+
+    with pytest.raises(ValueError):
+        parse_ip("10.20.1")
+
+
+def test_filtering_pass_ip_not_address():
+    """
+    Test the use-case where a record ipaddr is empty, or not an IP address;
+    the record does not match the IP filters.
+    """
+    recs = [dict(ipaddr="10.20.1.1"), dict(ipaddr=""), dict(ipaddr="switch1")]
+
+    filter_fn = create_filter(["ipaddr=10.0.0.0/8"], field_names=["ipaddr"])
+    assert [filter_fn(rec) for rec in recs] == [True, False, False]
+
+    filter_fn = create_filter(
+        ["ipaddr=10.0.0.0/8"], field_names=["ipaddr"], include=False
+    )
+    assert [filter_fn(rec) for rec in recs] == [False, True, True]
+
+
+def test_filtering_pass_prefixes_file(tmpdir):
+    """
+    Test use-case where the ipaddr field is matched against a text file of
+    prefixes, for both IPv4 and IPv6 addresses.
+    """
+    tmpfile = tmpdir.join("prefixes.txt")
+    tmpfile.write("# lab prefixes\n10.20.0.0/16\n10.30.1.0/24\n2620:10:abcd::/48\n")
+
+    recs = [
+        dict(ipaddr="10.20.5.1"),
+        dict(ipaddr="10.30.2.1"),
+        dict(ipaddr="2620:10:abcd::10"),
+        dict(ipaddr="2620:10:abce::10"),
+        dict(ipaddr=""),
+        dict(ipaddr="switch1"),
+    ]
+
+    # a record whose ipaddr is empty, or not an IP address, does not match.
+
+    filter_fn = create_filter([f"ipaddr=@{tmpfile}"], field_names=["ipaddr"])
+    assert filter_fn.op_filters[0].index.count == 3
+    assert [filter_fn(rec) for rec in recs] == [True, False, True, False, False, False]
+
+    filter_fn = create_filter(
+        [f"ipaddr=@{tmpfile}"], field_names=["ipaddr"], include=False
+    )
+    assert [filter_fn(rec) for rec in recs] == [False, True, False, True, True, True]
+
+
+def test_filtering_pass_prefixes_many(monkeypatch):
+    """
+    Test the exclude of many prefixes; the number of set membership tests for
+    each record must not grow with the number of prefixes, only with the
+    number of distinct prefix lengths.
+    """
+
+    class NetworkSet(set):
+        tests = 0
+
+        def __contains__(self, item):
+            NetworkSet.tests += 1
+            return set.__contains__(self, item)
+
+    class CountingPrefixIndex(PrefixIndex):
+        def __init__(self, networks):
+            super().__init__(networks)
+            for entries in self._index.values():
+                entries[:] = [(mask, NetworkSet(nets)) for mask, nets in entries]
+
+    monkeypatch.setattr(filtering, "PrefixIndex", CountingPrefixIndex)
+    inventory = [dict(ipaddr=f"10.{n % 256}.{n // 256}.1") for n in range(20_000)]
+
+    for prefix_n in (2, 100):
+        constraints = [f"ipaddr=10.{n}.0.0/16" for n in range(0, prefix_n * 2, 2)]
+        constraints += [f"ipaddr=10.{n}.{n}.0/24" for n in range(1, prefix_n * 2, 2)]
+        filter_fn = create_filter(constraints, field_names=["ipaddr"], include=False)
+
+        # a record is excluded by the /16 prefixes of the even second octets,
+        # and the /24 prefixes of the odd second octets equal to the third.
+
+        def excluded(rec):
+            _, second, third, _ = map(int, rec["ipaddr"].split("."))
+            if second >= prefix_n * 2:
+                return False
+            return second % 2 == 0 or second == third
+
+        expected = [rec for rec in inventory if not excluded(rec)]
+
+        NetworkSet.tests = 0
+        assert list(filter(filter_fn, inventory)) == expected
+        assert NetworkSet.tests <= len(inventory) * 2
@@ -1,6 +1,12 @@
+from pathlib import Path
+import tracemalloc
+from unittest.mock import Mock
+import csv
+
 import pytest  # noqa
 from first import first
 
+from netcfgbu import cache
 from netcfgbu import inventory
 from netcfgbu import config
 
@@ -84,3 +90,165 @@ def test_inventory_fail_build_noscript(request, netcfgbu_envars):
     found = first([line for line in exc_errmsgs if "inventory.0.script" in line])
     assert found
     assert "field required" in found
+
+
+def write_inventory(filepath, count):
+    with open(filepath, "w") as ofile:
+        csv_wr = csv.writer(ofile)
+        csv_wr.writerow(["host", "ipaddr", "os_name"])
+        csv_wr.writerow(["# a comment line", "", ""])
+        for n in range(count):
+            csv_wr.writerow(
+                [f"switch{n}.nyc1", f"10.{n // 256 % 256}.{n % 256}.1", "eos"]
+            )
+
+
+def test_inventory_pass_cache(tmpdir, monkeypatch, netcfgbu_envars):
+    """
+    Test the use-case where the inventory cache is enabled; the records are
+    the same as those loaded from the CSV file, the cache is reused, and is
+    rebuilt when the inventory file changes.
+    """
+    inventory_fpath = tmpdir.join("inventory.csv")
+    write_inventory(inventory_fpath, 100)
+    monkeypatch.setenv("NETCFGBU_INVENTORY", str(inventory_fpath))
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+
+    app_cfg = config.load()
+    limits = ["host=SWITCH1.*", "ipaddr=10.0.0.0/8"]
+    expected = inventory.load(app_cfg, limits=limits, excludes=["host=.*5.*"])
+    assert len(expected) == 10
+
+    app_cfg.cache.inventory = True
+    assert inventory.load(app_cfg) == inventory.load(app_cfg.copy(deep=True))
+    assert inventory.load(app_cfg, limits=limits, excludes=["host=.*5.*"]) == expected
+
+    # the cache is used; the CSV file is not read again.
+
+    build = Mock(side_effect=cache.InventoryCache.build)
+    monkeypatch.setattr(cache.InventoryCache, "build", build)
+    assert len(inventory.load(app_cfg)) == 100
+    assert build.call_count == 0
+
+    write_inventory(inventory_fpath, 50)
+    assert len(inventory.load(app_cfg)) == 50
+    assert build.call_count == 1
+
+
+def test_inventory_pass_select_rows(tmpdir):
+    inventory_fpath = tmpdir.join("inventory.csv")
+    write_inventory(inventory_fpath, 100)
+    inv_cache = cache.InventoryCache.build(Path(inventory_fpath))
+
+    assert inventory.select_rows(inv_cache, None) is None
+    assert inventory.select_rows(inv_cache, ["host=.*1", "ipaddr=10.0.1.1"]) is None
+    assert inventory.select_rows(inv_cache, ["host=switch9.nyc1"]) == [9] + list(
+        range(90, 100)
+    )
+    assert inventory.select_rows(inv_cache, ["host=sw.*", "host=switch42"]) == [42]
+
+
+def test_inventory_pass_cache_limits(tmpdir, monkeypatch, netcfgbu_envars):
+    """
+    Test the load of a 10k row inventory with, and without, the inventory
+    cache; with the cache, the CSV file is not parsed and only the records
+    found by the cache index are filtered by the limits.
+    """
+    inventory_fpath = tmpdir.join("inventory.csv")
+    write_inventory(inventory_fpath, 10_000)
+    monkeypatch.setenv("NETCFGBU_INVENTORY", str(inventory_fpath))
+    monkeypatch.setenv("NETCFGBU_CONFIGSDIR", str(tmpdir))
+
+    filtered = list()
+    create_filter = inventory.create_filter
+
+    def counting_create_filter(**kwargs):
+        filter_fn = create_filter(**kwargs)
+        return lambda rec: filtered.append(rec) or filter_fn(rec)
+
+    monkeypatch.setattr(inventory, "create_filter", counting_create_filter)
+
+    app_cfg = config.load()
+    limits = ["host=switch4242.nyc1"]
+
+    csv_recs = inventory.load(app_cfg, limits=limits)
+    assert len(filtered) == 10_000
+
+    app_cfg.cache.inventory = True
+    inventory.load(app_cfg)
+
+    build = Mock(side_effect=cache.InventoryCache.build)
+    monkeypatch.setattr(cache.InventoryCache, "build", build)
+    filtered.clear()
+
+    cached_recs = inventory.load(app_cfg, limits=limits)
+    assert cached_recs == csv_recs
+    assert len(filtered) == 1
+    assert build.call_count == 0
+
+
+def test_inventory_pass_record():
+    index = inventory.InventoryRecord.make_index(["host", "ipaddr", "os_name"])
+    rec_dict = dict(host="switch1", ipaddr="10.1.1.1", os_name="eos")
+    rec = inventory.InventoryRecord.from_dict(index, rec_dict)
+
+    assert rec["host"] == "switch1"
+    assert rec.get("ipaddr") == "10.1.1.1"
+    assert rec.get("site") is None
+    assert "os_name" in rec and "site" not in rec
+    assert list(rec.keys()) == ["host", "ipaddr", "os_name"]
+    assert rec == rec_dict
+    assert dict(rec, host="switch2") == dict(rec_dict, host="switch2")
+
+    with pytest.raises(KeyError):
+        rec["site"]
+
+    with pytest.raises(AttributeError):
+        rec.site = "dc1"
+
+
+def test_inventory_pass_record_benchmark(tmpdir, monkeypatch, netcfgbu_envars):
+    """
+    Benchmark the memory used by a 100k row inventory of InventoryRecord
+    against the same inventory of dict records.
+    """
+    inventory_fpath = tmpdir.join("inventory.csv")
+    with open(inventory_fpath, "w") as ofile:
+        csv_wr = csv.writer(ofile)
+        csv_wr.writerow(
+            ["host", "ipaddr", "os_name", "site", "role", "vendor", "model", "rack"]
+        )
+        for n in range(100_000):
+            site = f"site{n % 50}"
+            csv_wr.writerow(
+                [
+                    f"switch{n}.{site}",
+                    f"10.{n // 256 % 256}.{n % 256}.1",
+                    "eos",
+                    site,
+                    "leaf" if n % 8 else "spine",
+                    "arista",
+                    "DCS-7050SX",
+                    f"{site}-rack{n % 20}",
+                ]
+            )
+    monkeypatch.setenv("NETCFGBU_INVENTORY", str(inventory_fpath))
+
+    app_cfg = config.load()
+
+    def traced_size(load_fn):
+        tracemalloc.start()
+        try:
+            recs = load_fn()  # noqa
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    def load_dicts():
+        with inventory_fpath.open() as ifile:
+            return list(csv.DictReader(ifile))
+
+    dict_size = traced_size(load_dicts)
+    rec_size = traced_size(lambda: inventory.load(app_cfg))
+
+    assert rec_size < dict_size / 2
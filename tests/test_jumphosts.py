@@ -1,12 +1,15 @@
 import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from collections import Counter
+from time import monotonic
 from unittest.mock import Mock
 
 import pytest  # noqa
 from asynctest import CoroutineMock  # noqa
 
 import asyncssh
+from asyncssh.stream import SSHTCPStreamSession
 
 from netcfgbu import config_model
 from netcfgbu import jumphosts
@@ -20,12 +23,23 @@ def inventory(request):
     return list(CommentedCsvReader(inv_fp.open()))
 
 
+def make_fake_conn():
+    """ returns a fake SSH client connection that remains open until closed """
+    conn = Mock()
+    closed = asyncio.Event()
+    conn.close = closed.set
+    conn.wait_closed = closed.wait
+    return conn
+
+
 @pytest.fixture()
 def mock_asyncssh_connect(monkeypatch):
     monkeypatch.setattr(jumphosts, "asyncssh", Mock())
 
     jumphosts.asyncssh.Error = asyncssh.Error
-    jumphosts.asyncssh.connect = CoroutineMock()
+    jumphosts.asyncssh.connect = CoroutineMock(
+        side_effect=lambda **kwargs: make_fake_conn()
+    )
     return jumphosts.asyncssh.connect
 
 
@@ -137,3 +151,346 @@ async def test_jumphosts_fail_connect(
         log_recs[-1].msg
         == "JUMPHOST: connect to dummy-user@1.2.3.4:8022 failed: nooooope"
     )
+
+
+@pytest.mark.asyncio
+async def test_jumphosts_pass_connect_limits(inventory, mock_asyncssh_connect):
+    jh_spec = config_model.JumphostSpec(
+        proxy="1.2.3.4", exclude=["os_name=eos"], max_startups=10, max_sessions=20
+    )
+
+    jumphosts.init_jumphosts(jumphost_specs=[jh_spec], inventory=inventory)
+    jh: jumphosts.JumpHost = jumphosts.JumpHost.available[0]
+    assert jh.startups_sem4 is None
+    assert jh.max_sessions == 20
+
+    await jumphosts.connect_jumphosts()
+    assert isinstance(jh.startups_sem4, asyncio.Semaphore)
+    assert jh.startups_sem4._value == 10
+
+
+@pytest.mark.asyncio
+async def test_jumphosts_pass_connect_pool(inventory, mock_asyncssh_connect):
+    """
+    Test the use-case where the jump host uses a pool of connections; the
+    jump host is usable when at least one of the connections succeeds.
+    """
+    jh_spec = config_model.JumphostSpec(
+        proxy="1.2.3.4", exclude=["os_name=eos"], connections=3
+    )
+    jumphosts.init_jumphosts(jumphost_specs=[jh_spec], inventory=inventory)
+
+    mock_asyncssh_connect.side_effect = [
+        make_fake_conn(),
+        asyncio.TimeoutError(),
+        make_fake_conn(),
+    ]
+
+    assert await jumphosts.connect_jumphosts()
+    assert mock_asyncssh_connect.call_count == 3
+
+    jh: jumphosts.JumpHost = jumphosts.JumpHost.available[0]
+    assert jh.is_active
+    assert jh.loads == [0, 0, 0]
+
+
+# -----------------------------------------------------------------------------
+#                    Tests using a local asyncssh test server
+# -----------------------------------------------------------------------------
+
+
+class FakeJumpHostServer(asyncssh.SSHServer):
+    """ an SSH server that permits any user to open any TCP tunnel """
+
+    def begin_auth(self, username):
+        return False
+
+    def connection_requested(self, dest_host, dest_port, orig_host, orig_port):
+        return True
+
+
+async def echo_handler(reader, writer):
+    while data := await reader.read(65536):
+        writer.write(data)
+
+    writer.close()
+
+
+@asynccontextmanager
+async def local_jumphost(inventory, connections):
+    """
+    Provides a jump host, using a pool of `connections`, to a local asyncssh
+    server and the port of a local TCP echo server behind it.
+    """
+    echo_server = await asyncio.start_server(echo_handler, "127.0.0.1", 0)
+    ssh_server = await asyncssh.listen(
+        "127.0.0.1",
+        0,
+        server_host_keys=[asyncssh.generate_private_key("ssh-rsa")],
+        server_factory=FakeJumpHostServer,
+    )
+
+    ssh_port = ssh_server.sockets[0].getsockname()[1]
+    echo_port = echo_server.sockets[0].getsockname()[1]
+
+    jh_spec = config_model.JumphostSpec(
+        proxy=f"tester@127.0.0.1:{ssh_port}",
+        exclude=["os_name=eos"],
+        connections=connections,
+    )
+
+    jumphosts.init_jumphosts(jumphost_specs=[jh_spec], inventory=inventory)
+    jh: jumphosts.JumpHost = jumphosts.JumpHost.available[0]
+
+    try:
+        await jh.connect()
+        yield jh, echo_port
+
+    finally:
+        for conn in jh._conns:
+            if conn:
+                conn.close()
+
+        ssh_server.close()
+        echo_server.close()
+
+
+async def open_tunnel(jh, port):
+    """ returns the reader, writer streams of a TCP tunnel through the jump host """
+    chan, session = await jh.tunnel.create_connection(
+        SSHTCPStreamSession, "127.0.0.1", port
+    )
+    return asyncssh.SSHReader(session, chan), asyncssh.SSHWriter(session, chan)
+
+
+async def measure_throughput(jh, port, tunnels, size) -> float:
+    """ returns the bytes per second echoed through the given number of tunnels """
+
+    async def echo(reader, writer):
+        writer.write(b"x" * size)
+        received = 0
+        while received < size:
+            received += len(await reader.read(65536))
+
+        writer.close()
+
+    streams = [await open_tunnel(jh, port) for _ in range(tunnels)]
+    started = monotonic()
+    await asyncio.gather(*(echo(reader, writer) for reader, writer in streams))
+    return size * tunnels / (monotonic() - started)
+
+
+@pytest.mark.asyncio
+async def test_jumphosts_pass_pool_least_loaded(inventory):
+    """
+    Test the use-case where the tunnels are distributed across the pool
+    connections least-loaded-first, and released when the tunnels close.
+    """
+    async with local_jumphost(inventory, connections=3) as (jh, echo_port):
+        streams = [await open_tunnel(jh, echo_port) for _ in range(7)]
+        assert sorted(jh.loads) == [2, 2, 3]
+
+        for _, writer in streams[:4]:
+            writer.close()
+
+        await asyncio.sleep(0.1)
+        assert sum(jh.loads) == 3
+        assert max(jh.loads) - min(jh.loads) <= 1
+
+        assert await measure_throughput(jh, echo_port, tunnels=6, size=100_000) > 0
+
+
+@pytest.mark.asyncio
+async def test_jumphosts_pass_pool_reconnect(inventory):
+    """
+    Test the use-case where a pool connection is closed; the connection is
+    reconnected and the tunnels continue to be opened.
+    """
+    async with local_jumphost(inventory, connections=2) as (jh, echo_port):
+        dead_conn = jh._conns[0]
+        dead_conn.close()
+        await dead_conn.wait_closed()
+        await asyncio.sleep(0)
+
+        assert jh._conns[0] is None
+        assert jh.is_active
+
+        reader, writer = await open_tunnel(jh, echo_port)
+        writer.write(b"hello")
+        assert await reader.read(5) == b"hello"
+
+        await asyncio.sleep(0.1)
+        assert jh._conns[0] is not None
+        assert jh._conns[0] is not dead_conn
+
+        # when all of the connections are closed, the next use waits for the
+        # reconnect.
+
+        for conn in jh._conns:
+            conn.close()
+            await conn.wait_closed()
+
+        await asyncio.sleep(0)
+        assert not jh.is_active
+
+        reader, writer = await open_tunnel(jh, echo_port)
+        writer.write(b"again")
+        assert await reader.read(5) == b"again"
+
+
+@pytest.mark.asyncio
+async def test_jumphosts_pass_pool_close(inventory, mock_asyncssh_connect):
+    """
+    Test the use-case where a pool member is reconnected while its tunnels
+    are open; the load of the new connection starts at zero, and is not
+    released by the tunnels of the old connection.  Closing the jump host
+    cancels its background tasks.
+    """
+    jh_spec = config_model.JumphostSpec(proxy="1.2.3.4", exclude=["os_name=eos"])
+    jumphosts.init_jumphosts(jumphost_specs=[jh_spec], inventory=inventory)
+    jh: jumphosts.JumpHost = jumphosts.JumpHost.available[0]
+    await jh.connect()
+
+    chan_closed = asyncio.Event()
+    chan = Mock(wait_closed=chan_closed.wait)
+    old_conn = jh._conns[0]
+    old_conn.create_connection = CoroutineMock(return_value=(chan, Mock()))
+
+    await jh.create_connection(None, "1.1.1.1", 22)
+    assert jh.loads == [1]
+
+    await jh._connect_member(0)
+    assert jh._conns[0] is not old_conn
+    assert jh.loads == [0]
+
+    chan_closed.set()
+    await asyncio.sleep(0)
+    assert jh.loads == [0]
+
+    assert jh._tasks
+    await jumphosts.close_jumphosts()
+    assert not jh._tasks
+    assert not jh.is_active
+
+
+def test_jumphosts_pass_routes(inventory):
+    """
+    Test that the routing table built by init_jumphosts results in the same
+    jump host routing decisions as running the jump host filters.
+    """
+    jh_specs = [
+        config_model.JumphostSpec(proxy="1.1.1.1", include=["os_name=eos"]),
+        config_model.JumphostSpec(
+            proxy="2.2.2.2", include=["host=.*"], exclude=["os_name=nxos"]
+        ),
+        config_model.JumphostSpec(proxy="3.3.3.3", include=["os_name=nxos"]),
+    ]
+
+    jumphosts.init_jumphosts(jumphost_specs=jh_specs, inventory=inventory)
+    assert set(jumphosts.JumpHost.routes) == {
+        (rec["host"], rec.get("ipaddr")) for rec in inventory
+    }
+
+    for rec in inventory:
+        expected = next(
+            (
+                jh.name
+                for spec in jh_specs
+                if (jh := jumphosts.JumpHost(spec, rec.keys())).filter(rec)
+            ),
+            None,
+        )
+        assert getattr(jumphosts.get_jumphost(rec), "name", None) == expected
+
+    # a record not in the inventory used to build the routing table is routed
+    # using the jump host filters.
+
+    rec = dict(inventory[0], host="not-in-inventory")
+    assert jumphosts.get_jumphost(rec) is jumphosts.get_jumphost(inventory[0])
+
+
+def test_jumphosts_pass_routes_same_host():
+    """
+    Test the use-case where two inventory records have the same host name but
+    a different ipaddr, that use different jump hosts; each record keeps its
+    own route.
+    """
+    inventory = [
+        dict(host="switch1", ipaddr="10.1.1.1", os_name="eos"),
+        dict(host="switch1", ipaddr="10.2.1.1", os_name="eos"),
+    ]
+    jh_specs = [
+        config_model.JumphostSpec(proxy="1.1.1.1", include=["ipaddr=10.1.0.0/16"]),
+        config_model.JumphostSpec(proxy="2.2.2.2", include=["ipaddr=10.2.0.0/16"]),
+    ]
+
+    jumphosts.init_jumphosts(jumphost_specs=jh_specs, inventory=inventory)
+    assert [jumphosts.get_jumphost(rec).name for rec in inventory] == [
+        "1.1.1.1",
+        "2.2.2.2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_jumphosts_pass_connect_concurrent(inventory, mock_asyncssh_connect):
+    """
+    Test the use-case where the jump hosts are connected concurrently; a
+    device waits only on its own jump host, and fails fast when its jump host
+    could not connect.
+    """
+    jh_specs = [
+        config_model.JumphostSpec(proxy="slow", include=["os_name=eos"]),
+        config_model.JumphostSpec(proxy="fast", include=["os_name=ios"]),
+        config_model.JumphostSpec(proxy="fails", include=["os_name=nxos"]),
+    ]
+    slow_ready = asyncio.Event()
+
+    async def fake_connect(host, **kwargs):
+        if host == "slow":
+            await slow_ready.wait()
+        elif host == "fails":
+            raise asyncssh.Error(code=10, reason="nooooope")
+        return make_fake_conn()
+
+    mock_asyncssh_connect.side_effect = fake_connect
+
+    jumphosts.init_jumphosts(jumphost_specs=jh_specs, inventory=inventory)
+    slow_jh, fast_jh, fails_jh = jumphosts.JumpHost.available
+
+    all_connected = jumphosts.start_jumphosts()
+
+    await fast_jh.wait_connected()
+    assert fast_jh.tunnel is fast_jh
+
+    await fails_jh.wait_connected()
+    with pytest.raises(RuntimeError):
+        _ = fails_jh.tunnel
+
+    assert not slow_jh.connecting.done()
+
+    slow_ready.set()
+    await slow_jh.wait_connected()
+    assert slow_jh.tunnel is slow_jh
+    assert await all_connected is False
+
+
+def test_jumphosts_pass_prefixes_file(tmpdir):
+    """
+    Test the use-case where the jump host includes the hosts whose ipaddr is
+    within the prefixes listed in a text file.
+    """
+    prefixes = tmpdir.join("prefixes.txt")
+    prefixes.write("10.1.0.0/16\n2620:10::/32\n")
+
+    inventory = [
+        dict(host="switch1", ipaddr="10.1.2.3"),
+        dict(host="switch2", ipaddr="10.2.2.3"),
+        dict(host="switch3", ipaddr="2620:10::3"),
+    ]
+    jh_spec = config_model.JumphostSpec(
+        proxy="1.1.1.1", include=[f"ipaddr=@{prefixes}"]
+    )
+    jumphosts.init_jumphosts(jumphost_specs=[jh_spec], inventory=inventory)
+
+    routed = [bool(jumphosts.get_jumphost(rec)) for rec in inventory]
+    assert routed == [True, False, True]
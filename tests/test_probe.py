@@ -1,4 +1,5 @@
 import asyncio
+import os
 from unittest.mock import Mock
 
 from asynctest import CoroutineMock  # noqa
@@ -12,13 +13,15 @@ from netcfgbu.consts import DEFAULT_PROBE_TIMEOUT
 async def test_probe_pass(monkeypatch):
     mock_asyncio = Mock()
     mock_asyncio.TimeoutError = asyncio.TimeoutError
-    mock_wait_for = CoroutineMock()
+    mock_transport = Mock()
+    mock_wait_for = CoroutineMock(return_value=(mock_transport, Mock()))
 
     mock_asyncio.wait_for = mock_wait_for
     monkeypatch.setattr(probe, "asyncio", mock_asyncio)
 
     ok = await probe.probe(host="1.2.3.4", timeout=DEFAULT_PROBE_TIMEOUT)
     assert ok is True
+    assert mock_transport.close.called
 
 
 @pytest.mark.asyncio
@@ -55,3 +58,107 @@ async def test_probe_pass_raises_timeout(monkeypatch):
 
     with pytest.raises(asyncio.TimeoutError):
         await probe.probe(host="1.2.3.4", timeout=DEFAULT_PROBE_TIMEOUT, raise_exc=True)
+
+
+def test_probe_pass_fd_budget(monkeypatch):
+    monkeypatch.setattr(probe.resource, "getrlimit", Mock(return_value=(1024, 4096)))
+    assert probe.probe_fd_budget(2000) == 1024 - probe.FD_RESERVED
+    assert probe.probe_fd_budget(100) == 100
+
+    monkeypatch.setattr(
+        probe.resource,
+        "getrlimit",
+        Mock(return_value=(probe.resource.RLIM_INFINITY,) * 2),
+    )
+    assert probe.probe_fd_budget(2000) == 2000
+
+
+def open_fd_count():
+    return len(os.listdir("/proc/self/fd"))
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="requires procfs")
+@pytest.mark.asyncio
+async def test_probe_pass_many():
+    """
+    Test many probes against a farm of local listeners; the probes must not
+    leave any file descriptors open.  The listeners accept the connections
+    and then wait, as does a hung sshd, so that any connection the probe
+    leaves open remains open.
+    """
+    from netcfgbu import scheduler
+
+    loop = asyncio.get_running_loop()
+    farm = [
+        await loop.create_server(asyncio.Protocol, "127.0.0.1", 0, backlog=1024)
+        for _ in range(20)
+    ]
+    ports = [server.sockets[0].getsockname()[1] for server in farm]
+
+    count = 5_000
+    workers = probe.probe_fd_budget(200)
+
+    def probe_port(index):
+        return probe.probe("127.0.0.1", port=ports[index % len(ports)], timeout=10)
+
+    fd_before = open_fd_count()
+    passed = 0
+
+    async for _, task in scheduler.as_completed(range(count), probe_port, workers):
+        passed += task.result()
+
+    await asyncio.sleep(0.1)
+
+    for server in farm:
+        server.close()
+
+    assert passed == count
+    assert open_fd_count() <= fd_before + 5
+
+
+async def start_banner_server(banner: bytes):
+    """
+    starts a local server that sends the banner to each connection and then
+    closes it; or when there is no banner, waits as does a hung sshd.
+    """
+
+    async def send_banner(reader, writer):
+        if not banner:
+            await reader.read()
+
+        writer.write(banner)
+        writer.close()
+
+    server = await asyncio.start_server(send_banner, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+@pytest.mark.asyncio
+async def test_probe_pass_ssh_banner():
+    banner = b"Welcome to switch1\r\nSSH-2.0-OpenSSH_8.2p1 Ubuntu-4ubuntu0.1\r\n"
+    server, port = await start_banner_server(banner)
+
+    software = await probe.probe_ssh_banner("127.0.0.1", port=port, timeout=1)
+    assert software == "OpenSSH_8.2p1 Ubuntu-4ubuntu0.1"
+    server.close()
+
+
+@pytest.mark.asyncio
+async def test_probe_fail_ssh_banner():
+    """
+    Test the use-cases where the port is open, but the server is not a usable
+    SSH server; silent, not SSH, or an unsupported SSH version.
+    """
+    server, port = await start_banner_server(b"")
+    with pytest.raises(asyncio.TimeoutError):
+        await probe.probe_ssh_banner(
+            "127.0.0.1", port=port, timeout=1, banner_timeout=0.1
+        )
+    server.close()
+
+    for banner in (b"HTTP/1.1 400 Bad Request\r\n\r\n", b"SSH-1.5-OldSSH\r\n"):
+        server, port = await start_banner_server(banner)
+        task = probe.probe_ssh_banner("127.0.0.1", port=port, timeout=1)
+        with pytest.raises(probe.NoSSHBanner):
+            await asyncio.wait_for(task, timeout=1)
+        server.close()
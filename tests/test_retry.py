@@ -0,0 +1,51 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest  # noqa
+import asyncssh
+
+from netcfgbu import config_model
+from netcfgbu import retry
+
+
+def test_retry_pass_error_class():
+    assert retry.get_error_class("TimeoutError") is asyncio.TimeoutError
+    assert retry.get_error_class("ConnectionLost") is asyncssh.ConnectionLost
+    assert retry.get_error_class("ConnectionResetError") is ConnectionResetError
+
+
+def test_retry_fail_error_class():
+    with pytest.raises(ValueError):
+        config_model.RetrySpec(errors=["NoSuchError"])
+
+
+def test_retry_pass_policy(monkeypatch):
+    monkeypatch.setattr(retry.random, "random", Mock(return_value=1.0))
+
+    spec = config_model.RetrySpec(attempts=5, backoff=2, max_backoff=10, jitter=0.5)
+    policy = retry.RetryPolicy(spec)
+
+    # the delay doubles for each attempt up to the max backoff, reduced by the
+    # jitter.
+
+    delays = [policy.delay(asyncio.TimeoutError(), attempt) for attempt in range(1, 6)]
+    assert delays == [1, 2, 4, 5, None]
+
+    # only the retryable errors are retried.
+
+    assert policy.delay(ConnectionResetError(), 1) == 1
+    assert policy.delay(asyncssh.PermissionDenied(reason="nope"), 1) is None
+
+
+def test_retry_pass_make_retry():
+    app_cfg = Mock(os_name={"eos": config_model.OSNameSpec()})
+    assert retry.make_retry(app_cfg, {}) is None
+
+    app_cfg.os_name["ios"] = config_model.OSNameSpec(retry={"attempts": 2})
+    attempts = dict()
+    retry_fn = retry.make_retry(app_cfg, attempts)
+
+    assert retry_fn(dict(host="sw1", os_name="eos"), OSError(), 1) is None
+    assert 0 < retry_fn(dict(host="sw2", os_name="ios"), OSError(), 1) <= 5
+    assert retry_fn(dict(host="sw2", os_name="ios"), OSError(), 2) is None
+    assert attempts == {"sw2": 2}
@@ -0,0 +1,253 @@
+import asyncio
+from collections import Counter
+import tracemalloc
+
+import pytest  # noqa
+
+from netcfgbu import scheduler
+from netcfgbu.aiofut import as_completed
+
+
+async def fake_task(item):
+    await asyncio.sleep(0)
+    return item * 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_pass_results():
+    results = {
+        item: task.result()
+        async for item, task in scheduler.as_completed(range(100), fake_task, 10)
+    }
+    assert results == {item: item * 2 for item in range(100)}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_pass_exceptions():
+    """
+    Test the use-case where some of the tasks raise an exception; the exception
+    is raised by the future result and does not stop the other items.
+    """
+
+    async def fails_odd(item):
+        if item % 2:
+            raise asyncio.TimeoutError()
+        return item
+
+    failed = set()
+    passed = set()
+
+    async for item, task in scheduler.as_completed(range(10), fails_odd, 3):
+        try:
+            passed.add(task.result())
+        except asyncio.TimeoutError:
+            failed.add(item)
+
+    assert passed == {0, 2, 4, 6, 8}
+    assert failed == {1, 3, 5, 7, 9}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_pass_bounded():
+    """
+    Test that no more than the number of workers are running at once, and
+    that the items are consumed lazily.
+    """
+    running = 0
+    max_running = 0
+    pulled = 0
+
+    def iter_items():
+        nonlocal pulled
+        for item in range(50):
+            pulled += 1
+            yield item
+
+    async def track_task(item):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(running, max_running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return item
+
+    done = 0
+    async for _, task in scheduler.as_completed(iter_items(), track_task, 5):
+        done += 1
+        assert pulled <= done + 5 + 5
+
+    assert done == 50
+    assert max_running == 5
+
+
+@pytest.mark.asyncio
+async def test_scheduler_fail_items():
+    """
+    Test the use-case where the items iterable raises an exception.
+    """
+
+    def iter_items():
+        yield 1
+        raise ValueError("bad inventory")
+
+    with pytest.raises(ValueError):
+        async for _ in scheduler.as_completed(iter_items(), fake_task, 2):
+            pass
+
+
+async def peak_memory(coro):
+    tracemalloc.start()
+    try:
+        await coro
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+async def run_aiofut(count):
+    async for task in as_completed(fake_task(item) for item in range(count)):
+        task.result()
+
+
+async def run_scheduler(count):
+    async for _, task in scheduler.as_completed(range(count), fake_task, 100):
+        task.result()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_pass_benchmark():
+    """
+    Benchmark the peak memory of the scheduler against the aiofut.as_completed
+    at 1k/10k/50k fake tasks.  The scheduler memory must be bounded by the
+    number of workers, and not grow with the number of tasks.
+    """
+    counts = (1_000, 10_000, 50_000)
+    aiofut_peaks = [await peak_memory(run_aiofut(count)) for count in counts]
+    sched_peaks = [await peak_memory(run_scheduler(count)) for count in counts]
+
+    for aiofut_peak, sched_peak in zip(aiofut_peaks, sched_peaks):
+        assert sched_peak < aiofut_peak
+
+    # the aiofut memory grows with the number of tasks, the scheduler does not.
+    assert aiofut_peaks[-1] > aiofut_peaks[0] * 10
+    assert sched_peaks[-1] < sched_peaks[0] * 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_pass_key_limits():
+    """
+    Test the use-case where the items are subject to keyed limits; the items
+    for a busy key are set aside so that other items continue to be processed.
+    """
+    items = [("site1", n) for n in range(6)] + [("site2", n) for n in range(6)]
+    running = Counter()
+    max_running = Counter()
+    completed = list()
+
+    def site_limit(item):
+        return item[0], 2 if item[0] == "site1" else 4
+
+    async def track_task(item):
+        site, _ = item
+        running[site] += 1
+        max_running[site] = max(running[site], max_running[site])
+        await asyncio.sleep(0.01 if site == "site1" else 0.001)
+        running[site] -= 1
+        return item
+
+    async for item, task in scheduler.as_completed(
+        items, track_task, 6, limits=[site_limit]
+    ):
+        completed.append(task.result())
+
+    assert sorted(completed) == sorted(items)
+    assert max_running["site1"] == 2
+    assert max_running["site2"] == 4
+
+    # the site2 items were not held up behind the site1 items
+    assert completed[-1][0] == "site1"
+    assert [site for site, _ in completed[:6]].count("site2") == 6
+
+
+@pytest.mark.asyncio
+async def test_scheduler_pass_async_items():
+    """
+    Test the use-case where the items are provided by an async iterable, for
+    example the results of another scheduler; the items are processed as they
+    arrive and the async iterable is consumed no further ahead than the number
+    of workers.
+    """
+    produced = 0
+    consumed = 0
+
+    async def aiter_items():
+        nonlocal produced
+        for item in range(50):
+            await asyncio.sleep(0)
+            produced += 1
+            yield item
+
+    async def track_task(item):
+        nonlocal consumed
+        assert produced - consumed <= 5 + 5 + 1
+        await asyncio.sleep(0.001)
+        consumed += 1
+        return item * 2
+
+    results = {
+        item: task.result()
+        async for item, task in scheduler.as_completed(aiter_items(), track_task, 5)
+    }
+    assert results == {item: item * 2 for item in range(50)}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_fail_async_items():
+    async def aiter_items():
+        yield 1
+        raise ValueError("bad inventory")
+
+    with pytest.raises(ValueError):
+        async for _ in scheduler.as_completed(aiter_items(), fake_task, 2):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_scheduler_pass_retry():
+    """
+    Test the use-case where the failed items are retried; a worker is not
+    held while an item waits for its retry, and the item is yielded once its
+    last attempt completes.
+    """
+    attempts = Counter()
+    started = list()
+
+    async def flaky_task(item):
+        attempts[item] += 1
+        started.append(item)
+        if item == 0 or (item == 1 and attempts[item] < 3):
+            raise ConnectionResetError()
+        return item
+
+    def retry(item, exc, attempt):
+        assert isinstance(exc, ConnectionResetError)
+        assert attempt == attempts[item]
+        return 0.01 if attempt < 3 else None
+
+    results = dict()
+    async for item, task in scheduler.as_completed(
+        range(5), flaky_task, 1, retry=retry
+    ):
+        try:
+            results[item] = task.result()
+        except ConnectionResetError as exc:
+            results[item] = exc
+
+    assert isinstance(results.pop(0), ConnectionResetError)
+    assert results == {1: 1, 2: 2, 3: 3, 4: 4}
+    assert attempts == {0: 3, 1: 3, 2: 1, 3: 1, 4: 1}
+
+    # the single worker continued with the other items while the retries of
+    # the first items waited.
+
+    assert started[:5] == [0, 1, 2, 3, 4]
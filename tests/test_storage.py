@@ -0,0 +1,360 @@
+from pathlib import Path
+import asyncio
+import os
+import threading
+
+import pytest  # noqa
+
+from netcfgbu import config_model
+from netcfgbu import linter
+from netcfgbu import storage
+from netcfgbu.storage import ConfigStreamWriter
+
+
+def make_device_output(files_dir):
+    """ return the config content as it would be sent by the device CLI """
+    good_content = files_dir.joinpath("test-content-config.txt").read_text()
+    content = (
+        "!Command: show running-config\n"
+        "!Time: Sat Jun 27 17:54:17 2020\n"
+        + good_content
+        + "\n! end-test-marker\n"
+        + "! trailing content"
+    )
+    return content.replace("\n", "\r\n").encode("utf-8")
+
+
+async def save_content(save_file, content: bytes):
+    """ save the content, and wait for the writer to write it """
+    await storage.save_content(save_file, content)
+    await storage.get_writer().flush()
+
+
+async def stream_to_file(save_file, output: bytes, chunk_size, lint_spec=None):
+    async with ConfigStreamWriter(save_file, lint_spec=lint_spec) as ostream:
+        for offset in range(0, len(output), chunk_size):
+            await ostream.write(output[offset : offset + chunk_size])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+async def test_storage_pass_stream_linted(files_dir, tmpdir, chunk_size):
+    """
+    Test the use-case where the streamed content is linted, and the result
+    must be the same as the non-streaming linter regardless of how the
+    content is chunked.
+    """
+    lint_spec = config_model.LinterSpec(
+        config_starts_after="!Time:", config_ends_at="! end-test-marker"
+    )
+    output = make_device_output(files_dir)
+    save_file = tmpdir.join("switch1.cfg")
+
+    await stream_to_file(save_file, output, chunk_size, lint_spec=lint_spec)
+
+    content = output.decode("utf-8").replace("\r", "")
+    expected = linter.lint_content(content, lint_spec) + "\n"
+    assert save_file.read_text("utf-8") == expected
+    assert expected == files_dir.joinpath("test-content-config.txt").read_text() + "\n"
+    assert not tmpdir.join(".netcfgbu", "switch1.cfg.tmp").exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "lint_spec",
+    [
+        None,
+        config_model.LinterSpec(config_starts_after="no-such-marker"),
+        config_model.LinterSpec(config_ends_at="no-such-marker"),
+        config_model.LinterSpec(config_ends_at="!Command"),
+        config_model.LinterSpec(
+            config_starts_after="! end-test-marker", config_ends_at="!Time"
+        ),
+    ],
+)
+async def test_storage_pass_stream_lint_edges(files_dir, tmpdir, lint_spec):
+    output = make_device_output(files_dir)
+    save_file = tmpdir.join("switch1.cfg")
+
+    await stream_to_file(save_file, output, 5, lint_spec=lint_spec)
+
+    content = output.decode("utf-8").replace("\r", "")
+    if lint_spec:
+        content = linter.lint_content(content, lint_spec)
+
+    assert save_file.read_text("utf-8") == content + "\n"
+
+
+@pytest.mark.asyncio
+async def test_storage_pass_stream_multibyte(tmpdir):
+    """
+    Test the use-case where a multibyte character is split across chunks.
+    """
+    output = "banner motd ^Ünïcødé^\r\nend".encode("utf-8")
+    save_file = tmpdir.join("switch1.cfg")
+
+    await stream_to_file(save_file, output, 1)
+    assert save_file.read_text("utf-8") == "banner motd ^Ünïcødé^\nend\n"
+
+
+@pytest.mark.asyncio
+async def test_storage_fail_stream_exception(tmpdir):
+    """
+    Test the use-case where the stream fails before completion; the existing
+    config file must be left unchanged and the temporary file removed.
+    """
+    save_file = tmpdir.join("switch1.cfg")
+    save_file.write("previous config\n")
+
+    with pytest.raises(RuntimeError):
+        async with ConfigStreamWriter(save_file) as ostream:
+            await ostream.write(b"partial config\r\n")
+            raise RuntimeError("connection lost")
+
+    assert save_file.read() == "previous config\n"
+    assert not tmpdir.join(".netcfgbu", "switch1.cfg.tmp").exists()
+
+
+@pytest.mark.asyncio
+async def test_storage_pass_unchanged(tmpdir):
+    """
+    Test the use-case where the content is the same as the existing config
+    file; the file is not re-written, and the save is counted as unchanged.
+    """
+    save_file = Path(tmpdir.join("switch1.cfg"))
+    storage.save_counts.clear()
+
+    await save_content(save_file, b"hostname switch1\n")
+    assert storage.save_counts == {"changed": 1}
+    os.utime(save_file, (0, 0))
+
+    await save_content(save_file, b"hostname switch1\n")
+    assert storage.save_counts == {"changed": 1, "unchanged": 1}
+    assert save_file.stat().st_mtime == 0
+
+    await stream_to_file(save_file, b"hostname switch1", 4)
+    assert save_file.stat().st_mtime == 0
+    assert not tmpdir.join(".netcfgbu", "switch1.cfg.tmp").exists()
+
+    assert storage.save_counts == {"changed": 1, "unchanged": 2}
+
+
+@pytest.mark.asyncio
+async def test_storage_pass_changed(tmpdir):
+    save_file = Path(tmpdir.join("switch1.cfg"))
+    save_file.write_text("hostname switch1\n")
+    storage.save_counts.clear()
+
+    await save_content(save_file, b"hostname switch2\n")
+    assert save_file.read_text() == "hostname switch2\n"
+
+    async with ConfigStreamWriter(save_file) as ostream:
+        await ostream.write(b"hostname switch3")
+
+    assert ostream.changed is True
+    assert save_file.read_text() == "hostname switch3\n"
+    assert storage.save_counts == {"changed": 2}
+
+
+@pytest.mark.asyncio
+async def test_storage_fail_save_content_exception(tmpdir, monkeypatch):
+    """
+    Test the use-case where the save is interrupted while writing the content;
+    the existing config file must be left unchanged, and the error is
+    collected by the writer, or raised by the stream writer.
+    """
+    save_file = Path(tmpdir.join("switch1.cfg"))
+    save_file.write_text("previous config\n")
+
+    def disk_full(ofile):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(storage, "_fsync_file", disk_full)
+
+    await save_content(save_file, b"new config\n")
+    ((err_file, exc),) = storage.get_writer().errors
+    assert err_file == save_file and isinstance(exc, OSError)
+
+    assert save_file.read_text() == "previous config\n"
+    assert not tmpdir.join(".netcfgbu", "switch1.cfg.tmp").exists()
+    await storage.close_writer()
+
+    # the stream writer saves through the same path.
+
+    with pytest.raises(OSError):
+        await stream_to_file(save_file, b"new config", chunk_size=4)
+
+    assert save_file.read_text() == "previous config\n"
+    assert not tmpdir.join(".netcfgbu", "switch1.cfg.tmp").exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("durability", ["none", "file", "batch"])
+async def test_storage_pass_durability(tmpdir, monkeypatch, durability):
+    synced = list()
+    monkeypatch.setattr(storage, "_fsync_path", synced.append)
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd))
+
+    storage.set_durability(durability)
+    try:
+        for name in ("switch1", "switch2"):
+            save_file = Path(tmpdir.join(f"{name}.cfg"))
+            await save_content(save_file, f"hostname {name}\n".encode())
+
+        async with ConfigStreamWriter(tmpdir.join("switch3.cfg")) as ostream:
+            await ostream.write(b"hostname switch3")
+
+        synced_n = storage.sync_configs()
+
+    finally:
+        storage.set_durability("none")
+
+    if durability == "none":
+        assert synced == [] and synced_n == 0
+
+    elif durability == "file":
+        # each file and its directory is synced when saved.
+        assert len(synced) == 6 and synced_n == 0
+        assert synced.count(Path(tmpdir)) == 3
+
+    else:
+        # the files are synced at the end, with one directory sync.
+        assert synced_n == 3
+        assert len(synced) == 4
+        assert synced[-1] == Path(tmpdir)
+
+
+def test_storage_fail_durability():
+    with pytest.raises(ValueError):
+        config_model.StorageSpec(durability="always")
+
+
+@pytest.mark.asyncio
+async def test_storage_pass_bulk_writer(tmpdir, monkeypatch):
+    """
+    Test the use-case where many saves are made while the disk is slow; the
+    saves return once queued, until the queue is full, and are written in
+    batches by the writer thread when the writer is closed.
+    """
+    storage.setup_storage(config_model.StorageSpec(write_queue=10))
+    storage.save_counts.clear()
+
+    disk_ready = threading.Event()
+    write_batch = storage._write_batch
+
+    def slow_write_batch(batch):
+        disk_ready.wait()
+        return write_batch(batch)
+
+    monkeypatch.setattr(storage, "_write_batch", slow_write_batch)
+
+    async def save(n):
+        save_file = Path(tmpdir.join(f"switch{n}.cfg"))
+        await storage.save_content(save_file, f"hostname switch{n}\n".encode())
+
+    # the saves do not wait on the disk until the queue is full.
+
+    await asyncio.wait_for(asyncio.gather(*[save(n) for n in range(10)]), timeout=1)
+    blocked = asyncio.ensure_future(save(10))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    disk_ready.set()
+    await asyncio.gather(blocked, *[save(n) for n in range(11, 100)])
+
+    writer = await storage.close_writer()
+    assert tmpdir.join("switch42.cfg").read() == "hostname switch42\n"
+    assert writer.saves == 100
+    assert writer.batches < 100
+    assert writer.max_depth == 10
+    assert writer.errors == []
+
+    assert await storage.close_writer() is None
+    assert storage.save_counts == {"changed": 100}
+
+
+@pytest.mark.asyncio
+async def test_storage_fail_bulk_writer(tmpdir):
+    """
+    Test the use-case where one save in a batch fails; the error is collected
+    for that save only.
+    """
+    storage.setup_storage(config_model.StorageSpec())
+    storage.save_counts.clear()
+
+    bad_file = Path(tmpdir.join("no-such-dir", "switch1.cfg"))
+    good_file = Path(tmpdir.join("switch2.cfg"))
+
+    await storage.save_content(bad_file, b"hostname switch1\n")
+    await storage.save_content(good_file, b"hostname switch2\n")
+
+    writer = await storage.close_writer()
+    ((err_file, exc),) = writer.errors
+    assert err_file == bad_file and isinstance(exc, FileNotFoundError)
+    assert writer.batches == 1
+    assert storage.save_counts == {"changed": 1}
+
+
+@pytest.mark.asyncio
+async def test_storage_pass_when_saved(tmpdir):
+    """
+    Test the use-case where the Caller waits for the save-file to be written;
+    the callback is called once the queued save is written, with the error
+    of a failed save.
+    """
+    storage.setup_storage(config_model.StorageSpec())
+
+    good_file = Path(tmpdir.join("switch1.cfg"))
+    bad_file = Path(tmpdir.join("no-such-dir", "switch2.cfg"))
+    saved = dict()
+
+    storage.when_saved(good_file, lambda exc: saved.setdefault("none", exc))
+    assert saved == {"none": None}
+
+    await storage.save_content(good_file, b"hostname switch1\n")
+    await storage.save_content(bad_file, b"hostname switch2\n")
+    storage.when_saved(good_file, lambda exc: saved.setdefault("good", exc))
+    storage.when_saved(bad_file, lambda exc: saved.setdefault("bad", exc))
+    assert "good" not in saved
+
+    await storage.close_writer()
+    assert saved["good"] is None and good_file.exists()
+    assert isinstance(saved["bad"], FileNotFoundError)
+
+
+def test_storage_pass_temp_files(tmpdir):
+    """
+    Test the use-case where a prior run was interrupted; the temporary files
+    it left behind are removed by the storage setup.  The temporary files
+    are within the cache directory, ignored by the vcs.
+    """
+    save_file = Path(tmpdir.join("switch1.cfg"))
+    temp_file = storage._temp_file(save_file)
+    assert temp_file.parent == storage.get_cache_dir(tmpdir)
+
+    temp_file.write_text("partial config")
+    tmpdir.join(".switch2.cfg.tmp").write("partial config")
+
+    assert storage.setup_storage(config_model.StorageSpec(), tmpdir) == 2
+    assert not temp_file.exists()
+    assert not tmpdir.join(".switch2.cfg.tmp").exists()
+
+
+@pytest.mark.asyncio
+async def test_storage_pass_file_mode(tmpdir):
+    """
+    Test the use-case where the existing config file has a file mode; the
+    mode is kept when the config file is replaced.
+    """
+    save_file = Path(tmpdir.join("switch1.cfg"))
+    save_file.write_text("hostname switch1\n")
+    save_file.chmod(0o640)
+
+    await save_content(save_file, b"hostname switch2\n")
+    assert save_file.stat().st_mode & 0o777 == 0o640
+
+    async with ConfigStreamWriter(save_file) as ostream:
+        await ostream.write(b"hostname switch3")
+
+    assert save_file.stat().st_mode & 0o777 == 0o640
+    assert save_file.read_text() == "hostname switch3\n"